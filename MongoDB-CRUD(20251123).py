@@ -5,28 +5,947 @@
 # Work In Progress - Code isn't entirely stable.
 # 開発中 - コードは完全に安定していません。
 
-from pymongo import MongoClient, errors, ASCENDING, DESCENDING
+from pymongo import MongoClient, errors, monitoring, ASCENDING, DESCENDING
 from pymongo.collection import Collection
 from pymongo.database import Database
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+    except ImportError:
+        AsyncMongoClient = None
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+import bson
+from bson import json_util
+from bson.raw_bson import RawBSONDocument
+from bson.son import SON
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import argparse
+import asyncio
+import copy
+import csv
+import gzip
+import inspect
+import io
 import json
+import math
+import os
 import re
-from typing import Dict, List, Any, Optional, Union
+import sys
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple, Union
 from enum import Enum
 
+# Documents fetched per getMore round trip when streaming cursors
+DEFAULT_BATCH_SIZE = 100
+# Print a running count every N streamed documents
+PROGRESS_INTERVAL = 1000
+# Documents per page in keyset pagination
+DEFAULT_PAGE_SIZE = 20
+# File holding saved aggregation pipelines
+DEFAULT_PIPELINE_LIBRARY = "~/.mongodb_crud_pipelines.json"
+# Benchmark defaults: document size (bytes), seconds per workload, documents seeded
+DEFAULT_BENCH_DOC_SIZE = 256
+DEFAULT_BENCH_DURATION = 5.0
+DEFAULT_BENCH_SEED_DOCS = 10000
+# Documents sharing a "group" value (read/update workloads touch one group per op)
+BENCH_GROUP_SIZE = 100
+# Requests per bulk_write in the bulk workloads
+BENCH_BULK_SIZE = 100
+# Relative ops/sec drop or p95 growth reported as a regression against a baseline
+BENCH_REGRESSION_THRESHOLD = 0.10
+# Smallest latency bucket (ms) and growth factor between buckets for command metrics
+METRICS_BUCKET_BASE_MS = 0.05
+METRICS_BUCKET_RATIO = 2 ** 0.25
+# Latency percentiles reported by command metrics
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
+# Filter operators the index advisor treats as equality matches
+EQUALITY_OPERATORS = frozenset({'$eq', '$in'})
+# Explain warns when more documents than this are examined per result
+EXPLAIN_RATIO_WARNING = 10
+# Counting stops here when previewing large matches ("10000+")
+COUNT_PREVIEW_CAP = 10000
+# Ways to report total matches: skip, stop at the cap, full scan, or full scan off-thread
+COUNT_MODES = ('off', 'capped', 'exact', 'background')
+# Documents per insert_many call when importing files
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+# Documents per bulk_write call in chunked update/delete
+DEFAULT_CHUNK_SIZE = 1000
+# Seconds between replication lag checks while a chunked write is paused
+LAG_POLL_INTERVAL = 5.0
+# Adaptive write throttle: seconds between adjustments (and serverStatus polls), the
+# per-document latency multiple of the best seen and the lock queue depth that trigger
+# a back-off, and the lowest fraction of the configured rate it backs off to
+THROTTLE_ADJUST_INTERVAL = 1.0
+THROTTLE_LATENCY_RATIO = 3.0
+THROTTLE_QUEUE_DEPTH = 10
+THROTTLE_MIN_FACTOR = 0.05
+# Terminal output is written in chunks of about this many characters
+RENDER_BUFFER_SIZE = 1 << 16
+# Longest time rendered output waits in the buffer (seconds)
+RENDER_FLUSH_INTERVAL = 0.1
+# Table output: characters per cell, and columns shown when none are chosen
+DEFAULT_COLUMN_WIDTH = 20
+TABLE_MAX_COLUMNS = 6
+# Write buffer for export files
+EXPORT_BUFFER_SIZE = 1 << 20
+# Seconds between resume token saves while watching change streams
+RESUME_SAVE_INTERVAL = 1.0
+# Longest wait (seconds) between background change stream retries after transient errors
+WATCH_MAX_BACKOFF = 60.0
+# Operations in flight at once for the async engine
+DEFAULT_ASYNC_CONCURRENCY = 32
+# Read cache defaults: entry lifetime (seconds), entry count and memory budget
+DEFAULT_CACHE_TTL = 60.0
+DEFAULT_CACHE_ENTRIES = 1000
+DEFAULT_CACHE_BYTES = 64 << 20
+# Distinct filter strings kept parsed by parse_filter
+FILTER_CACHE_SIZE = 1024
+# Distinct literal strings kept converted by parse_value
+VALUE_CACHE_SIZE = 4096
+
 class SortOrder(Enum):
     """Sort order enumeration"""
     ASC = 1
     DESC = -1
 
+# Precompiled patterns for value inference
+ISO_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}')
+LITERAL_VALUES = {'null': None, 'none': None, 'true': True, 'false': False}
+NUMERIC_START = frozenset('0123456789+-.')
+FLOAT_END = frozenset('0123456789.')
+
+
+@lru_cache(maxsize=VALUE_CACHE_SIZE)
+def infer_value(value: str) -> Any:
+    """
+    Classify a stripped input string and convert it in a single pass
+    
+    Dispatches on the first character so each value is tested only against
+    the rules that can match it. Results are memoized; callers must copy
+    list/dict results before modifying them (parse_value does this).
+    
+    Args:
+        value: Stripped string value
+        
+    Returns:
+        None, bool, int, float, datetime, ObjectId, list, dict or the string itself
+    """
+    if not value:
+        return value
+    first = value[0]
+    
+    if first in NUMERIC_START:
+        digits = value[1:] if first in '+-' else value
+        if digits.isdigit() and digits.isascii():
+            return int(value)
+        if len(value) >= 19 and value[4] == '-' and ISO_DATE_PATTERN.match(value):
+            try:
+                return datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        # Guards keep "-inf", "+nan" and "1_000" as strings
+        if value[-1] in FLOAT_END and '_' not in value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+        return value
+    
+    if len(value) <= 5:
+        literal = value.lower()
+        if literal in LITERAL_VALUES:
+            return LITERAL_VALUES[literal]
+    
+    if first == 'O' and value.startswith('ObjectId(') and value.endswith(')'):
+        oid = value[9:-1].strip('"\'')
+        if MongoDBCRUD.validate_object_id(oid):
+            return ObjectId(oid)
+    
+    if (first == '[' and value[-1] == ']') or (first == '{' and value[-1] == '}'):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    
+    return value
+
+
+# Converters for explicit type hints (CSV schemas, parse_value(type_hint=...))
+VALUE_CONVERTERS = {
+    'auto': lambda v: MongoDBCRUD.parse_value(v),
+    'str': str,
+    'string': str,
+    'int': int,
+    'long': int,
+    'float': float,
+    'double': float,
+    'bool': lambda v: v.strip().lower() in ('true', '1', 'yes', 'y'),
+    'date': lambda v: datetime.fromisoformat(v.strip().replace('Z', '+00:00')),
+    'objectid': lambda v: ObjectId(v.strip()),
+    'json': json.loads,
+}
+
+
+def available_compressors() -> List[str]:
+    """Wire compressors usable here; zstd and snappy need optional packages"""
+    compressors = []
+    try:
+        import zstandard  # noqa: F401
+        compressors.append('zstd')
+    except ImportError:
+        pass
+    try:
+        import snappy  # noqa: F401
+        compressors.append('snappy')
+    except ImportError:
+        pass
+    compressors.append('zlib')
+    return compressors
+
+
+class MongoDBConnectionManager:
+    """Cache of MongoClient instances keyed by URI and client options"""
+    
+    def __init__(self, client_factory=MongoClient):
+        """
+        Args:
+            client_factory: Callable building a client from a URI and options
+                            (e.g. mongomock.MongoClient for in-process runs)
+        """
+        self.client_factory = client_factory
+        self.clients: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], MongoClient] = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(uri: str, options: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+        """Build the cache key for a URI and its options (list and dict values become tuples)"""
+        def freeze(value: Any) -> Any:
+            if isinstance(value, dict):
+                return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+            if isinstance(value, (list, tuple, set)):
+                return tuple(freeze(item) for item in value)
+            return value
+        return uri, tuple(sorted((name, freeze(value)) for name, value in options.items()))
+    
+    def get_client(self, uri: str, **options) -> MongoClient:
+        """
+        Return the cached client for a URI and options, creating it on first use
+        
+        Args:
+            uri: MongoDB connection URI
+            **options: MongoClient keyword options (maxPoolSize, compressors, ...)
+            
+        Returns:
+            Shared MongoClient
+        """
+        key = self.make_key(uri, options)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                client = self.client_factory(uri, **options)
+                self.clients[key] = client
+            return client
+    
+    def discard(self, client: MongoClient):
+        """Close a client and drop it from the cache (e.g. after a failed connect)"""
+        with self.lock:
+            for key, cached in list(self.clients.items()):
+                if cached is client:
+                    del self.clients[key]
+        client.close()
+    
+    def close_all(self):
+        """Close every cached client"""
+        with self.lock:
+            clients = list(self.clients.values())
+            self.clients.clear()
+        for client in clients:
+            client.close()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Per-command client-side metrics collected from pymongo command events
+    
+    Latencies go into exponential buckets (each about 19% wider than the
+    previous), so recording is O(1) and percentiles are accurate to
+    within one bucket. Statistics are keyed by command name and namespace.
+    """
+    
+    def __init__(self, measure_bytes: bool = True):
+        """
+        Args:
+            measure_bytes: Encode commands and replies to count bytes sent
+                           and received (costs one BSON encode per event)
+        """
+        self.measure_bytes = measure_bytes
+        self.pending: Dict[Tuple[Any, int], Tuple[str, str, int]] = {}
+        self.stats: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+    
+    @staticmethod
+    def namespace_of(event: monitoring.CommandStartedEvent) -> str:
+        """Derive database.collection from a started command"""
+        command = event.command
+        target = command.get('collection') if event.command_name == 'getMore' else command.get(event.command_name)
+        return f"{event.database_name}.{target}" if isinstance(target, str) else event.database_name
+    
+    def started(self, event: monitoring.CommandStartedEvent):
+        sent = len(bson.encode(event.command)) if self.measure_bytes else 0
+        with self.lock:
+            self.pending[(event.connection_id, event.request_id)] = (
+                event.command_name, self.namespace_of(event), sent)
+    
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        reply = event.reply
+        cursor = reply.get('cursor')
+        returned = len(cursor.get('firstBatch', cursor.get('nextBatch', []))) if isinstance(cursor, dict) else 0
+        received = len(bson.encode(reply)) if self.measure_bytes else 0
+        self.record(event, received, returned, failed=bool(reply.get('writeErrors')))
+    
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.record(event, 0, 0, failed=True)
+    
+    def record(self, event: Any, received: int, returned: int, failed: bool):
+        """Fold a finished command into the statistics of its operation and namespace"""
+        elapsed_ms = event.duration_micros / 1000
+        bucket = max(0, int(math.log(elapsed_ms / METRICS_BUCKET_BASE_MS, METRICS_BUCKET_RATIO)) + 1
+                     ) if elapsed_ms > METRICS_BUCKET_BASE_MS else 0
+        with self.lock:
+            command_name, namespace, sent = self.pending.pop(
+                (event.connection_id, event.request_id), (event.command_name, event.database_name, 0))
+            stats = self.stats.get((command_name, namespace))
+            if stats is None:
+                stats = self.stats[(command_name, namespace)] = {
+                    "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "bytes_sent": 0,
+                    "bytes_received": 0, "docs_returned": 0, "buckets": {}}
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["bytes_sent"] += sent
+            stats["bytes_received"] += received
+            stats["docs_returned"] += returned
+            stats["buckets"][bucket] = stats["buckets"].get(bucket, 0) + 1
+    
+    @staticmethod
+    def percentile(buckets: Dict[int, int], count: int, fraction: float) -> float:
+        """Upper bound (ms) of the bucket holding the given fraction of samples"""
+        rank = fraction * count
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= rank:
+                return round(METRICS_BUCKET_BASE_MS * METRICS_BUCKET_RATIO ** bucket, 3)
+        return 0.0
+    
+    def reset(self):
+        """Drop all collected statistics"""
+        with self.lock:
+            self.stats.clear()
+            self.started_at = time.time()
+    
+    def summary(self) -> List[Dict[str, Any]]:
+        """
+        Per operation and namespace statistics, slowest total time first
+        
+        Returns:
+            List of dictionaries with op, namespace, count, errors, p50/p95/p99,
+            max and mean latency (ms), bytes sent/received and docs returned
+        """
+        with self.lock:
+            items = [(key, dict(stats, buckets=dict(stats["buckets"]))) for key, stats in self.stats.items()]
+        rows = []
+        for (command_name, namespace), stats in sorted(items, key=lambda item: -item[1]["total_ms"]):
+            rows.append({"op": command_name, "namespace": namespace,
+                         "count": stats["count"], "errors": stats["errors"],
+                         # A bucket bound may overshoot the slowest sample it holds
+                         **{f"p{int(q * 100)}_ms": min(self.percentile(stats["buckets"], stats["count"], q),
+                                                        round(stats["max_ms"], 3))
+                            for q in METRICS_QUANTILES},
+                         "max_ms": round(stats["max_ms"], 3),
+                         "mean_ms": round(stats["total_ms"] / stats["count"], 3),
+                         "total_ms": round(stats["total_ms"], 3),
+                         "bytes_sent": stats["bytes_sent"], "bytes_received": stats["bytes_received"],
+                         "docs_returned": stats["docs_returned"]})
+        return rows
+    
+    def print_summary(self, file=sys.stdout):
+        """Print the session summary as a table"""
+        rows = self.summary()
+        elapsed = time.time() - self.started_at
+        print(f"\n COMMAND METRICS ({sum(row['count'] for row in rows)} commands in {elapsed:.1f}s)", file=file)
+        if not rows:
+            print("No commands recorded", file=file)
+            return
+        print(f"  {'op':<16} {'namespace':<32} {'count':>7} {'err':>5} {'p50':>8} {'p95':>8} "
+              f"{'p99':>8} {'max':>8} {'sent':>10} {'recv':>10} {'docs':>8}", file=file)
+        for row in rows:
+            print(f"  {row['op']:<16} {row['namespace'][:32]:<32} {row['count']:>7} {row['errors']:>5} "
+                  f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} "
+                  f"{row['bytes_sent']:>10} {row['bytes_received']:>10} {row['docs_returned']:>8}", file=file)
+        print("  (latencies in ms)", file=file)
+    
+    def to_prometheus(self) -> str:
+        """Render the statistics in the Prometheus text exposition format"""
+        def labels(row: Dict[str, Any], **extra) -> str:
+            pairs = {"command": row["op"], "namespace": row["namespace"], **extra}
+            escaped = []
+            for name, value in pairs.items():
+                value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                escaped.append(f'{name}="{value}"')
+            return "{" + ",".join(escaped) + "}"
+        
+        rows = self.summary()
+        lines = ["# HELP mongodb_crud_command_duration_seconds Client-side command latency",
+                 "# TYPE mongodb_crud_command_duration_seconds summary"]
+        for row in rows:
+            for q in METRICS_QUANTILES:
+                lines.append(f"mongodb_crud_command_duration_seconds{labels(row, quantile=q)} "
+                             f"{row[f'p{int(q * 100)}_ms'] / 1000}")
+            lines.append(f"mongodb_crud_command_duration_seconds_sum{labels(row)} {row['total_ms'] / 1000}")
+            lines.append(f"mongodb_crud_command_duration_seconds_count{labels(row)} {row['count']}")
+        for name, field, help_text in (
+                ("errors", "errors", "Failed commands and commands with write errors"),
+                ("bytes_sent", "bytes_sent", "BSON bytes of commands sent"),
+                ("bytes_received", "bytes_received", "BSON bytes of replies received"),
+                ("documents_returned", "docs_returned", "Documents returned in cursor batches")):
+            lines.append(f"# HELP mongodb_crud_command_{name}_total {help_text}")
+            lines.append(f"# TYPE mongodb_crud_command_{name}_total counter")
+            for row in rows:
+                lines.append(f"mongodb_crud_command_{name}_total{labels(row)} {row[field]}")
+        return "\n".join(lines) + "\n"
+    
+    def export(self, path: str) -> str:
+        """
+        Write the statistics to a file
+        
+        Args:
+            path: Output path; .prom/.txt files get Prometheus text format, anything else JSON
+            
+        Returns:
+            Format written ('prometheus' or 'json')
+        """
+        prometheus = path.endswith(('.prom', '.txt'))
+        with open(path, 'w', encoding='utf-8') as output:
+            if prometheus:
+                output.write(self.to_prometheus())
+            else:
+                json.dump({"started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+                           "commands": self.summary()}, output, indent=2)
+        return 'prometheus' if prometheus else 'json'
+
+
+class QueryCache:
+    """LRU read cache with TTL, a memory budget and per-namespace invalidation"""
+    
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL, max_entries: int = DEFAULT_CACHE_ENTRIES,
+                 max_bytes: int = DEFAULT_CACHE_BYTES):
+        """
+        Initialize cache
+        
+        Args:
+            ttl: Seconds an entry stays valid (0 disables expiry)
+            max_entries: Maximum number of cached results
+            max_bytes: Approximate memory budget (BSON-encoded size of cached results)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Tuple[str, str, str], Tuple[float, int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(namespace: str, kind: str, query: Optional[Dict[str, Any]] = None,
+                 projection: Any = None, sort: Any = None, skip: int = 0, limit: int = 0,
+                 extra: Any = None) -> Tuple[str, str, str]:
+        """
+        Build a cache key from a read's namespace and parameters
+        
+        Top-level filter fields are sorted since their order never changes
+        what a query matches; nested documents keep their order because
+        embedded-document equality is order sensitive.
+        """
+        normalized = sorted((query or {}).items())
+        params = json_util.dumps([normalized, projection, sort, skip, limit, extra])
+        return namespace, kind, params
+    
+    @staticmethod
+    def estimate_size(value: Any) -> int:
+        """Approximate memory held by a cached result"""
+        try:
+            return len(bson.encode({"v": value}))
+        except Exception:
+            return sys.getsizeof(value)
+    
+    def get(self, key: Tuple[str, str, str]) -> Tuple[bool, Any]:
+        """
+        Look up a cached result
+        
+        Returns:
+            Tuple of (hit, private copy of the value)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl and entry[0] < time.monotonic():
+                self.remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            value = entry[2]
+        return True, copy.deepcopy(value)
+    
+    def put(self, key: Tuple[str, str, str], value: Any):
+        """Store a result, evicting least recently used entries to stay in budget"""
+        size = self.estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, size, copy.deepcopy(value))
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+    
+    def remove(self, key: Tuple[str, str, str]):
+        """Drop one entry (caller holds the lock)"""
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+    
+    def invalidate(self, namespace: Optional[str] = None):
+        """Drop every entry for a namespace, or everything when namespace is None"""
+        with self.lock:
+            keys = [key for key in self.entries if namespace is None or key[0] == namespace]
+            for key in keys:
+                self.remove(key)
+            if keys:
+                self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss statistics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries),
+                    "bytes": self.bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations}
+
+
+class WriteThrottle:
+    """
+    Token-bucket limit on documents/sec and bytes/sec shared by every write path
+    
+    Each bucket holds one second of budget and may go into debt, so a write
+    larger than the budget is sent at once and the writes after it wait the
+    debt off. In adaptive mode the rates are scaled by a factor that halves
+    when per-document write latency or the server's global lock queue rises,
+    and recovers by a tenth per second otherwise; with no rates set, adaptive
+    mode pauses after each write to hold writes to that fraction of the time.
+    """
+    
+    def __init__(self, docs_per_sec: float = 0.0, bytes_per_sec: float = 0.0, adaptive: bool = False):
+        """
+        Initialize throttle (all zero/False disables it)
+        
+        Args:
+            docs_per_sec: Documents written per second (0 for unlimited)
+            bytes_per_sec: BSON payload bytes sent per second (0 for unlimited)
+            adaptive: Back off on rising latency or serverStatus queue depth
+        """
+        self.lock = threading.Lock()
+        self.configure(docs_per_sec, bytes_per_sec, adaptive)
+    
+    def configure(self, docs_per_sec: float = 0.0, bytes_per_sec: float = 0.0, adaptive: bool = False):
+        """Replace the limits and reset budget, adaptive state and statistics"""
+        with self.lock:
+            self.docs_per_sec = max(0.0, docs_per_sec)
+            self.bytes_per_sec = max(0.0, bytes_per_sec)
+            self.adaptive = adaptive
+            self.tokens = {'docs': self.docs_per_sec, 'bytes': self.bytes_per_sec}
+            self.refilled = time.monotonic()
+            self.factor = 1.0
+            self.latency: Optional[float] = None
+            self.best_latency: Optional[float] = None
+            self.adjusted = 0.0
+            self.queue: Optional[int] = None
+            self.queue_unavailable = False
+            self.stats = {"writes": 0, "documents": 0, "bytes": 0, "waited": 0.0, "backoffs": 0}
+    
+    @property
+    def active(self) -> bool:
+        return bool(self.docs_per_sec or self.bytes_per_sec or self.adaptive)
+    
+    def reserve(self, docs: int, size: int) -> float:
+        """Take budget for a write; returns the seconds to wait before sending it"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.refilled = now - self.refilled, now
+            wait = 0.0
+            for name, rate, amount in (('docs', self.docs_per_sec, docs), ('bytes', self.bytes_per_sec, size)):
+                rate *= self.factor
+                if not rate:
+                    continue
+                self.tokens[name] = min(rate, self.tokens[name] + elapsed * rate) - amount
+                if self.tokens[name] < 0:
+                    wait = max(wait, -self.tokens[name] / rate)
+            return wait
+    
+    def queue_depth(self, collection: Collection) -> Optional[int]:
+        """Operations queued on the server's global lock, or None when serverStatus is unavailable"""
+        if self.queue_unavailable:
+            return None
+        try:
+            status = collection.database.client.admin.command('serverStatus', repl=0, metrics=0, locks=0)
+        except Exception:
+            # Never fail a write over a diagnostic; latency alone drives the back-off
+            self.queue_unavailable = True
+            return None
+        return status.get('globalLock', {}).get('currentQueue', {}).get('total', 0)
+    
+    def adjust(self, collection: Collection):
+        """Halve or grow the rate factor, at most once per THROTTLE_ADJUST_INTERVAL"""
+        now = time.monotonic()
+        if now - self.adjusted < THROTTLE_ADJUST_INTERVAL:
+            return
+        self.adjusted = now
+        self.queue = self.queue_depth(collection)
+        with self.lock:
+            slow = self.latency is not None and self.latency > self.best_latency * THROTTLE_LATENCY_RATIO
+            if slow or (self.queue or 0) > THROTTLE_QUEUE_DEPTH:
+                self.factor = max(THROTTLE_MIN_FACTOR, self.factor / 2)
+                self.stats['backoffs'] += 1
+            else:
+                self.factor = min(1.0, self.factor + 0.1)
+    
+    def settle(self, charged: int, affected: int, size: int, latency: float) -> float:
+        """Record a finished write; returns the adaptive pause owed when no rates are set"""
+        with self.lock:
+            if self.docs_per_sec and affected > charged:
+                # Documents the server reported beyond the up-front estimate are paid by later writes
+                self.tokens['docs'] -= affected - charged
+            self.stats['writes'] += 1
+            self.stats['documents'] += affected
+            self.stats['bytes'] += size
+            if not self.adaptive:
+                return 0.0
+            per_document = latency / max(affected, 1)
+            self.latency = per_document if self.latency is None else 0.8 * self.latency + 0.2 * per_document
+            self.best_latency = min(self.best_latency or self.latency, self.latency)
+            if self.docs_per_sec or self.bytes_per_sec or self.factor >= 1.0:
+                return 0.0
+            return latency * (1 / self.factor - 1)
+    
+    @contextmanager
+    def write(self, collection: Collection, payload: List[Any] = (), count: Optional[int] = None):
+        """
+        Wrap one write call: wait for budget, then charge what the write really touched
+        
+        Args:
+            collection: Collection written to (its client answers serverStatus polls)
+            payload: Documents or statements sent, measured for the bytes/sec limit
+            count: Documents charged up front (default: len(payload))
+            
+        Yields:
+            Dict whose 'affected' key the caller may set to the documents the
+            server reports, e.g. modified_count of an update_many
+        """
+        usage = {"affected": None}
+        if not self.active:
+            yield usage
+            return
+        
+        charged = len(payload) if count is None else count
+        size = len(bson.encode({"payload": list(payload)})) if self.bytes_per_sec and payload else 0
+        if self.adaptive:
+            self.adjust(collection)
+        wait = self.reserve(charged, size)
+        if wait:
+            time.sleep(wait)
+        started = time.perf_counter()
+        try:
+            yield usage
+        finally:
+            affected = charged if usage['affected'] is None else usage['affected']
+            pause = self.settle(charged, affected, size, time.perf_counter() - started)
+            if pause:
+                time.sleep(pause)
+            with self.lock:
+                self.stats['waited'] += wait + pause
+    
+    def summary(self) -> Dict[str, Any]:
+        """Limits, current adaptive state and totals since the last configure()"""
+        return dict(self.stats, waited=round(self.stats['waited'], 3),
+                    docs_per_sec=self.docs_per_sec, bytes_per_sec=self.bytes_per_sec,
+                    adaptive=self.adaptive, factor=round(self.factor, 3), queue=self.queue,
+                    latency_ms=round(self.latency * 1000, 3) if self.latency is not None else None)
+
+
+def invalidates_cache(method):
+    """Mark a MongoDBCRUD write method: cached reads of its namespace are dropped afterwards"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        namespace = self.collection.full_name
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.invalidate_cache(namespace)
+    return wrapper
+
+
+class IndexAdvisor:
+    """
+    Records the shape of every query issued in a session and recommends
+    compound indexes in equality-sort-range (ESR) order
+    
+    A shape is the set of equality fields, the sort keys and the set of
+    range fields of a filter; values are ignored, so repeated queries with
+    different values count towards the same shape.
+    """
+    
+    def __init__(self):
+        # namespace -> {(equality, sort, range): times seen}
+        self.shapes: Dict[str, Dict[Tuple[Tuple[str, ...], Tuple[Tuple[str, int], ...], Tuple[str, ...]], int]] = {}
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def shape_of(query: Optional[Dict[str, Any]], sort: Optional[List[Tuple[str, int]]] = None
+                 ) -> Tuple[Tuple[str, ...], Tuple[Tuple[str, int], ...], Tuple[str, ...]]:
+        """
+        Reduce a filter and sort to (equality fields, sort keys, range fields)
+        
+        $or, $nor, $expr and $text clauses are skipped since a single
+        compound index cannot serve them.
+        """
+        equality, ranges = set(), set()
+        pending = [query or {}]
+        while pending:
+            clause = pending.pop()
+            for field, condition in clause.items():
+                if field == '$and':
+                    pending.extend(condition)
+                elif field.startswith('$'):
+                    continue
+                elif not is_operator_document(condition) or set(condition) <= EQUALITY_OPERATORS:
+                    equality.add(field)
+                elif '$eq' in condition:
+                    equality.add(field)
+                else:
+                    ranges.add(field)
+        
+        # An equality match makes sorting on that field a no-op, and a sort
+        # key already bounds the range on the same field
+        sort_keys = tuple((field, int(order)) for field, order in (sort or []) if field not in equality)
+        sorted_fields = {field for field, _ in sort_keys}
+        return tuple(sorted(equality)), sort_keys, tuple(sorted(ranges - equality - sorted_fields))
+    
+    def record(self, namespace: str, query: Optional[Dict[str, Any]],
+               sort: Optional[List[Tuple[str, int]]] = None):
+        """Count one query against its namespace"""
+        shape = self.shape_of(query, sort)
+        if not any(shape):
+            return
+        with self.lock:
+            shapes = self.shapes.setdefault(namespace, {})
+            shapes[shape] = shapes.get(shape, 0) + 1
+    
+    def record_pipeline(self, namespace: str, pipeline: List[Dict[str, Any]]):
+        """Record the leading $match (and directly following $sort) of a pipeline"""
+        query, sort = {}, []
+        for stage in pipeline:
+            if '$match' in stage and not sort:
+                merge_filter(query, copy.deepcopy(stage['$match']))
+            elif '$sort' in stage:
+                sort = list(stage['$sort'].items())
+                break
+            else:
+                break
+        self.record(namespace, query, sort)
+    
+    @staticmethod
+    def index_fields(index_key: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        """Normalize an index key document to (field, direction) pairs"""
+        return [(field, int(order) if isinstance(order, (int, float)) else order)
+                for field, order in index_key.items()]
+    
+    @staticmethod
+    def serves(index_fields: List[Tuple[str, Any]], shape) -> bool:
+        """
+        Check whether an index answers a shape without a collection scan
+        or an in-memory sort
+        
+        Equality and range fields may appear in any order within their
+        segment; sort keys must match exactly or be fully reversed.
+        """
+        equality, sort_keys, ranges = shape
+        fields = [field for field, _ in index_fields]
+        position = len(equality)
+        if set(fields[:position]) != set(equality):
+            return False
+        if sort_keys:
+            segment = index_fields[position:position + len(sort_keys)]
+            reverse = [(field, -order) for field, order in sort_keys]
+            if segment != list(sort_keys) and segment != reverse:
+                return False
+            position += len(sort_keys)
+        return set(fields[position:position + len(ranges)]) == set(ranges)
+    
+    def advise(self, collection: Collection) -> Dict[str, Any]:
+        """
+        Compare the recorded shapes of a collection with its indexes
+        
+        Args:
+            collection: Collection whose shapes and indexes are compared
+            
+        Returns:
+            Dictionary with "shapes" (each with its serving index or
+            recommendation), "recommended" index keys, "redundant" prefix
+            indexes and "unused" indexes according to $indexStats
+        """
+        with self.lock:
+            shapes = dict(self.shapes.get(collection.full_name, {}))
+        indexes = {index['name']: index for index in collection.list_indexes()}
+        index_fields = {name: self.index_fields(index['key']) for name, index in indexes.items()}
+        
+        # Fields used often go first so recommendations share prefixes
+        frequency: Dict[str, int] = {}
+        for (equality, _, _), count in shapes.items():
+            for field in equality:
+                frequency[field] = frequency.get(field, 0) + count
+        
+        report_shapes, recommended = [], {}
+        for shape, count in sorted(shapes.items(), key=lambda item: -item[1]):
+            equality, sort_keys, ranges = shape
+            entry = {"equality": list(equality), "sort": [list(key) for key in sort_keys],
+                     "range": list(ranges), "count": count}
+            served_by = next((name for name, fields in index_fields.items() if self.serves(fields, shape)), None)
+            if served_by:
+                entry["served_by"] = served_by
+            else:
+                keys = ([(field, ASCENDING) for field in sorted(equality, key=lambda f: (-frequency[f], f))]
+                        + list(sort_keys) + [(field, ASCENDING) for field in ranges])
+                entry["recommend"] = [list(key) for key in keys]
+                recommended[tuple(keys)] = recommended.get(tuple(keys), 0) + count
+            report_shapes.append(entry)
+        
+        # A recommendation that is a prefix of a longer one is covered by it
+        for keys in list(recommended):
+            longer = [other for other in recommended if len(other) > len(keys) and other[:len(keys)] == keys]
+            if longer:
+                recommended[longer[0]] += recommended.pop(keys)
+        
+        redundant = []
+        for name, fields in index_fields.items():
+            if name == '_id_' or indexes[name].get('unique'):
+                continue
+            for other, other_fields in index_fields.items():
+                if other != name and len(other_fields) > len(fields) and other_fields[:len(fields)] == fields:
+                    redundant.append({"index": name, "prefix_of": other})
+                    break
+        
+        unused = []
+        try:
+            for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats['name'] != '_id_' and not stats.get('accesses', {}).get('ops'):
+                    unused.append(stats['name'])
+        except Exception:
+            pass  # $indexStats needs a real server and the indexStats privilege
+        
+        return {"shapes": report_shapes,
+                "recommended": [{"keys": [list(key) for key in keys], "queries": count}
+                                for keys, count in sorted(recommended.items(), key=lambda item: -item[1])],
+                "redundant": redundant,
+                "unused": sorted(unused)}
+
+
+def output_namespace(pipeline: List[Dict[str, Any]], database_name: str) -> Optional[str]:
+    """
+    Namespace written by a trailing $out or $merge stage
+    
+    Returns:
+        "db.collection" of the target, or None when the pipeline returns results
+    """
+    if not pipeline:
+        return None
+    stage = pipeline[-1]
+    if '$out' in stage:
+        target = stage['$out']
+    elif '$merge' in stage:
+        target = stage['$merge']
+        target = target.get('into') if isinstance(target, dict) else target
+    else:
+        return None
+    if isinstance(target, dict):
+        return f"{target.get('db', database_name)}.{target.get('coll')}"
+    return f"{database_name}.{target}"
+
+
+def raw_collection(collection: Collection) -> Collection:
+    """
+    View of a collection that returns RawBSONDocument results
+    
+    Raw documents keep the server's bytes and decode fields only on access,
+    so documents that are just moved (export, copy) are never decoded.
+    """
+    return collection.with_options(
+        codec_options=collection.codec_options.with_options(document_class=RawBSONDocument))
+
+
 class MongoDBCRUD:
     """MongoDB CRUD Operations Manager following official MongoDB patterns"""
     
+    # Default strategy for "Showing N of TOTAL" after a limited find
+    count_mode: str = 'capped'
+    # When on, find_many, count_documents and aggregate print an explain summary first
+    explain_enabled: bool = False
+    # Opt-in read cache shared by find_one, count_documents and distinct
+    cache: Optional[QueryCache] = None
+    # Background change stream invalidating the cache for other clients' writes
+    cache_watcher: Optional["ChangeStreamWatcher"] = None
+    # Terminal output format (see DocumentRenderer), table columns, and whether
+    # streamed reads decode lazily via RawBSONDocument
+    render_mode: str = 'pretty'
+    render_columns: Optional[List[str]] = None
+    raw_documents: bool = False
+    # File the aggregation builder saves named pipelines to
+    pipeline_library: str = DEFAULT_PIPELINE_LIBRARY
+    # Query shapes seen by any connection this session, for the index advisor
+    advisor: IndexAdvisor = IndexAdvisor()
+    # Write rate limit shared by every connection this session (off until configured)
+    throttle: WriteThrottle = WriteThrottle()
+    
     def __init__(self, connection_string: str = "mongodb://localhost:27017/", 
                  database_name: str = "mydatabase", 
-                 collection_name: str = "mycollection"):
+                 collection_name: str = "mycollection",
+                 quiet: bool = False,
+                 client_options: Optional[Dict[str, Any]] = None,
+                 manager: Optional[MongoDBConnectionManager] = None):
         """
         Initialize MongoDB connection
         
@@ -34,23 +953,95 @@ class MongoDBCRUD:
             connection_string: MongoDB connection URI
             database_name: Name of the database
             collection_name: Name of the collection
+            quiet: Report the connection on stderr instead of stdout
+            client_options: Extra MongoClient options (maxPoolSize, minPoolSize,
+                            maxIdleTimeMS, compressors, readPreference, ...)
+            manager: Connection manager to share clients through; without one
+                     this instance owns (and closes) its own client
         """
+        options = {"serverSelectionTimeoutMS": 5000, **(client_options or {})}
+        self.owns_client = manager is None
         try:
-            self.client = MongoClient(connection_string, serverSelectionTimeoutMS=5000)
+            if manager:
+                self.client = manager.get_client(connection_string, **options)
+            else:
+                self.client = MongoClient(connection_string, **options)
             # Test connection
             self.client.server_info()
             self.db: Database = self.client[database_name]
             self.collection: Collection = self.db[collection_name]
-            print(f"✓ Connected to MongoDB: {database_name}.{collection_name}")
-        except errors.ServerSelectionTimeoutError:
-            raise ConnectionError("Failed to connect to MongoDB. Ensure MongoDB is running.")
+            print(f"✓ Connected to MongoDB: {database_name}.{collection_name}",
+                  file=sys.stderr if quiet else sys.stdout)
         except Exception as e:
+            if hasattr(self, 'client'):
+                if manager:
+                    manager.discard(self.client)
+                else:
+                    self.client.close()
+                del self.client
+            if isinstance(e, errors.ServerSelectionTimeoutError):
+                raise ConnectionError("Failed to connect to MongoDB. Ensure MongoDB is running.")
             raise ConnectionError(f"MongoDB connection error: {e}")
     
+    def close(self):
+        """Close the client if this instance owns it"""
+        if getattr(self, 'owns_client', False) and hasattr(self, 'client'):
+            self.client.close()
+    
     def __del__(self):
         """Cleanup connection on object destruction"""
-        if hasattr(self, 'client'):
-            self.client.close()
+        self.close()
+    
+    def enable_cache(self, ttl: float = DEFAULT_CACHE_TTL, max_entries: int = DEFAULT_CACHE_ENTRIES,
+                     max_bytes: int = DEFAULT_CACHE_BYTES) -> QueryCache:
+        """Turn on the read cache for this instance"""
+        self.cache = QueryCache(ttl, max_entries, max_bytes)
+        return self.cache
+    
+    def disable_cache(self):
+        """Turn off and drop the read cache"""
+        self.stop_cache_watcher()
+        self.cache = None
+    
+    def start_cache_watcher(self):
+        """Invalidate the cache from a database-wide change stream in a background thread"""
+        self.stop_cache_watcher()
+        self.cache_watcher = ChangeStreamWatcher(self.db, cache=self.cache)
+        self.cache_watcher.start_background()
+    
+    def stop_cache_watcher(self):
+        """Stop the background change stream, if running"""
+        if self.cache_watcher:
+            self.cache_watcher.stop()
+            self.cache_watcher = None
+    
+    def invalidate_cache(self, namespace: Optional[str] = None):
+        """Drop cached reads for a namespace (default: the current collection)"""
+        if self.cache:
+            self.cache.invalidate(namespace or self.collection.full_name)
+    
+    def cached_read(self, kind: str, loader, query: Optional[Dict[str, Any]] = None, **params) -> Any:
+        """
+        Serve a read from the cache, running loader() on a miss
+        
+        Args:
+            kind: Read type (find_one, count_documents, distinct)
+            loader: Zero-argument callable performing the actual read
+            query: Query filter, part of the cache key
+            **params: projection, sort, skip, limit or extra key parts
+            
+        Returns:
+            Read result
+        """
+        if not self.cache:
+            return loader()
+        key = QueryCache.make_key(self.collection.full_name, kind, query, **params)
+        hit, value = self.cache.get(key)
+        if hit:
+            return value
+        value = loader()
+        self.cache.put(key, value)
+        return value
     
     @staticmethod
     def validate_object_id(oid: str) -> bool:
@@ -62,64 +1053,123 @@ class MongoDBCRUD:
             return False
     
     @staticmethod
-    def parse_value(value: str) -> Any:
+    def parse_value(value: str, type_hint: Optional[str] = None) -> Any:
         """
         Parse string value to appropriate Python/BSON type
         
         Args:
             value: String value to parse
+            type_hint: Optional type name from VALUE_CONVERTERS that skips inference
             
         Returns:
             Parsed value in appropriate type
         """
-        value = value.strip()
-        
-        # Handle null/None
-        if value.lower() in ['null', 'none']:
-            return None
-        
-        # Handle booleans
-        if value.lower() == 'true':
-            return True
-        if value.lower() == 'false':
-            return False
+        if type_hint and type_hint != 'auto':
+            converter = VALUE_CONVERTERS.get(type_hint)
+            if converter is None:
+                raise ValueError(f"Unknown type hint: {type_hint}")
+            return converter(value)
         
-        # Handle ObjectId
-        if value.startswith('ObjectId(') and value.endswith(')'):
-            oid = value[9:-1].strip('"\'')
-            if MongoDBCRUD.validate_object_id(oid):
-                return ObjectId(oid)
+        parsed = infer_value(value.strip())
+        # Cached containers are shared; hand out a private copy
+        if isinstance(parsed, (list, dict)):
+            return copy.deepcopy(parsed)
+        return parsed
+    
+    def renderer(self) -> "DocumentRenderer":
+        """Renderer for the current output settings"""
+        return DocumentRenderer(self.render_mode, self.render_columns)
+    
+    def show_document(self, document: Mapping):
+        """Print a single document in the current output format"""
+        renderer = self.renderer()
+        renderer.document(document)
+        renderer.flush()
+    
+    @property
+    def read_collection(self) -> Collection:
+        """Collection for streamed reads, decoding lazily when raw documents are on"""
+        return raw_collection(self.collection) if self.raw_documents else self.collection
+    
+    def stream_cursor(self, cursor, label: str = "Document",
+                      progress_every: int = PROGRESS_INTERVAL) -> Tuple[int, bool]:
+        """
+        Print documents from a cursor as they arrive from the server
         
-        # Handle dates in ISO format
-        if re.match(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}', value):
-            try:
-                return datetime.fromisoformat(value.replace('Z', '+00:00'))
-            except ValueError:
-                pass
+        The cursor is iterated lazily, so only the current batch is held in
+        memory. Rendered output is flushed whenever the batch runs out, before
+        the cursor blocks on the next getMore. Ctrl+C stops the stream and
+        closes the server-side cursor.
         
-        # Handle numbers
+        Args:
+            cursor: pymongo Cursor or CommandCursor
+            label: Heading used for each printed document
+            progress_every: Print a running count every N documents (0 to disable)
+            
+        Returns:
+            Tuple of (documents printed, whether the stream was aborted)
+        """
+        renderer = self.renderer()
+        count = 0
         try:
-            if '.' in value or 'e' in value.lower():
-                return float(value)
-            return int(value)
-        except ValueError:
-            pass
+            for doc in cursor:
+                count += 1
+                renderer.document(doc, f"{label} {count}")
+                if progress_every and count % progress_every == 0:
+                    renderer.write(f"\n... {count} {label.lower()}(s) so far\n")
+                if getattr(cursor, 'retrieved', None) == count:
+                    # Batch boundary: show everything before waiting on the server
+                    renderer.flush()
+        except KeyboardInterrupt:
+            cursor.close()
+            return count, True
+        finally:
+            renderer.flush()
+        return count, False
+    
+    @staticmethod
+    def prompt_export() -> Optional[Tuple["MongoDBExporter", str]]:
+        """
+        Ask whether results should be written to a file instead of printed
         
-        # Handle JSON arrays and objects
-        if (value.startswith('[') and value.endswith(']')) or \
-           (value.startswith('{') and value.endswith('}')):
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                pass
+        Returns:
+            Tuple of (exporter, path), or None to print to the terminal
+        """
+        path = input("\nExport results to file (.jsonl/.csv/.bson, add .gz to compress; "
+                     "press Enter to print): ").strip()
+        if not path:
+            return None
         
-        # Return as string
-        return value
+        fmt, compress = MongoDBExporter.detect_format(path)
+        fields = None
+        if fmt == 'csv':
+            fields_input = input("CSV fields, comma-separated (Enter for first document's keys): ").strip()
+            fields = [field.strip() for field in fields_input.split(',') if field.strip()] or None
+        return MongoDBExporter(fmt, fields=fields, compress=compress), path
+    
+    @staticmethod
+    def export_cursor(cursor, exporter: "MongoDBExporter", path: str):
+        """Write a cursor to a file and report throughput"""
+        try:
+            stats = exporter.write(cursor, path)
+        except KeyboardInterrupt:
+            cursor.close()
+            print(f"\n⚠ Export interrupted; {path} is incomplete")
+            return
+        except OSError as e:
+            print(f"✗ Error writing export file: {e}")
+            return
+        print(f"✓ Exported {stats['exported']} document(s) to {path} "
+              f"in {stats['elapsed']}s ({stats['docs_per_sec']} docs/sec)")
     
-    def build_query_filter(self) -> Dict[str, Any]:
+    def build_query_filter(self, record: bool = True) -> Dict[str, Any]:
         """
         Build MongoDB query filter with support for operators
         
+        Args:
+            record: Record the filter's shape for the index advisor; callers
+                    that add a sort record the shape themselves
+        
         Returns:
             Query filter dictionary
         """
@@ -132,61 +1182,27 @@ class MongoDBCRUD:
         print("  - field<value (less than)")
         print("  - field<=value (less than or equal)")
         print("  - field!=value (not equal)")
-        print("  - field~regex (regex match)")
+        print("  - field~regex or field~/regex/i (regex match, optional flags; inside ( ) quote a regex with an unmatched ')')")
         print("  - field:in:[val1,val2] (in array)")
+        print("  - field:nin:[val1,val2] (not in array)")
         print("  - field:exists:true/false (field exists)")
         print("  - _id=ObjectId (for document ID)")
+        print("Combine with ',' (and), '||' (or) and parentheses, e.g. age>=18, age<65")
+        print("Quote values containing ', field=', '&&' or '||', and field names with operator characters")
+        print("Conditions on separate lines are combined with AND")
         
         while True:
             condition = input("\nEnter condition (or press Enter to finish): ").strip()
             if not condition:
                 break
             
-            # Parse different operators
-            if ':in:' in condition:
-                field, values = condition.split(':in:', 1)
-                try:
-                    values_list = json.loads(values)
-                    query[field] = {"$in": values_list}
-                except json.JSONDecodeError:
-                    print("⚠ Invalid array format. Use JSON array: [val1, val2]")
-            elif ':exists:' in condition:
-                field, exists = condition.split(':exists:', 1)
-                query[field] = {"$exists": exists.lower() == 'true'}
-            elif '~' in condition:
-                field, pattern = condition.split('~', 1)
-                query[field] = {"$regex": pattern}
-            elif '>=' in condition:
-                field, value = condition.split('>=', 1)
-                query[field] = {"$gte": self.parse_value(value)}
-            elif '<=' in condition:
-                field, value = condition.split('<=', 1)
-                query[field] = {"$lte": self.parse_value(value)}
-            elif '>' in condition:
-                field, value = condition.split('>', 1)
-                query[field] = {"$gt": self.parse_value(value)}
-            elif '<' in condition:
-                field, value = condition.split('<', 1)
-                query[field] = {"$lt": self.parse_value(value)}
-            elif '!=' in condition:
-                field, value = condition.split('!=', 1)
-                query[field] = {"$ne": self.parse_value(value)}
-            elif '=' in condition:
-                field, value = condition.split('=', 1)
-                field = field.strip()
-                
-                # Special handling for _id
-                if field == '_id':
-                    if self.validate_object_id(value.strip()):
-                        query[field] = ObjectId(value.strip())
-                    else:
-                        print("⚠ Invalid ObjectId format")
-                        continue
-                else:
-                    query[field] = self.parse_value(value)
-            else:
-                print("⚠ Invalid condition format")
+            try:
+                merge_filter(query, parse_filter(condition))
+            except ValueError as e:
+                print(f"⚠ Invalid condition: {e}")
         
+        if record:
+            self.advisor.record(self.collection.full_name, query)
         return query
     
     def build_update_document(self) -> Dict[str, Any]:
@@ -214,37 +1230,13 @@ class MongoDBCRUD:
                 break
             
             try:
-                if ':' in operation and not '[]' in operation:  # $rename
-                    old_field, new_field = operation.split(':', 1)
-                    update.setdefault("$rename", {})[old_field.strip()] = new_field.strip()
-                elif '[]!=' in operation:  # $addToSet
-                    field, value = operation.split('[]!=', 1)
-                    update.setdefault("$addToSet", {})[field.strip()] = self.parse_value(value)
-                elif '[]=' in operation:  # $push
-                    field, value = operation.split('[]=', 1)
-                    update.setdefault("$push", {})[field.strip()] = self.parse_value(value)
-                elif '-=' in operation:  # $pull
-                    field, value = operation.split('-=', 1)
-                    update.setdefault("$pull", {})[field.strip()] = self.parse_value(value)
-                elif '+=' in operation:  # $inc
-                    field, value = operation.split('+=', 1)
-                    update.setdefault("$inc", {})[field.strip()] = self.parse_value(value)
-                elif '*=' in operation:  # $mul
-                    field, value = operation.split('*=', 1)
-                    update.setdefault("$mul", {})[field.strip()] = self.parse_value(value)
-                elif operation.endswith('!'):  # $unset
-                    field = operation[:-1].strip()
-                    update.setdefault("$unset", {})[field] = ""
-                elif '=' in operation:  # $set
-                    field, value = operation.split('=', 1)
-                    update.setdefault("$set", {})[field.strip()] = self.parse_value(value)
-                else:
-                    print("⚠ Invalid operation format")
+                merge_update(update, parse_update(operation))
             except ValueError as e:
                 print(f"⚠ Error parsing operation: {e}")
         
         return update
     
+    @invalidates_cache
     def insert_one(self):
         """Insert a single document"""
         print("\n➕ INSERT ONE DOCUMENT")
@@ -263,13 +1255,15 @@ class MongoDBCRUD:
             return
         
         try:
-            result = self.collection.insert_one(document)
+            with self.throttle.write(self.collection, [document]):
+                result = self.collection.insert_one(document)
             print(f"✓ Document inserted with _id: {result.inserted_id}")
         except errors.DuplicateKeyError as e:
             print(f"✗ Duplicate key error: {e}")
         except Exception as e:
             print(f"✗ Error inserting document: {e}")
     
+    @invalidates_cache
     def insert_many(self):
         """Insert multiple documents"""
         print("\n➕ INSERT MULTIPLE DOCUMENTS")
@@ -300,7 +1294,8 @@ class MongoDBCRUD:
         
         try:
             ordered = input("Use ordered insert? (y/n): ").lower().startswith('y')
-            result = self.collection.insert_many(documents, ordered=ordered)
+            with self.throttle.write(self.collection, documents):
+                result = self.collection.insert_many(documents, ordered=ordered)
             print(f"✓ Inserted {len(result.inserted_ids)} documents")
             print(f"   IDs: {result.inserted_ids}")
         except errors.BulkWriteError as e:
@@ -325,10 +1320,12 @@ class MongoDBCRUD:
                 projection[field] = 1 if include else 0
         
         try:
-            document = self.collection.find_one(query, projection or None)
+            document = self.cached_read('find_one',
+                                        lambda: self.collection.find_one(query, projection or None),
+                                        query, projection=projection or None)
             if document:
                 print("\n✓ Found document:")
-                print(json.dumps(document, default=str, indent=2))
+                self.show_document(document)
             else:
                 print("✗ No document found matching the query")
         except Exception as e:
@@ -337,7 +1334,7 @@ class MongoDBCRUD:
     def find_many(self):
         """Find multiple documents with options"""
         print("\n🔍 FIND MULTIPLE DOCUMENTS")
-        query = self.build_query_filter()
+        query = self.build_query_filter(record=False)
         
         # Projection
         projection = {}
@@ -350,6 +1347,10 @@ class MongoDBCRUD:
                 include = input(f"Include '{field}'? (y/n): ").lower().startswith('y')
                 projection[field] = 1 if include else 0
         
+        if input("\nBrowse page by page (keyset pagination)? (y/n): ").lower().startswith('y'):
+            self.browse_pages(query, projection)
+            return
+        
         # Sort
         sort = []
         if input("\nApply sorting? (y/n): ").lower().startswith('y'):
@@ -360,20 +1361,42 @@ class MongoDBCRUD:
                 order = input(f"Order for '{field}' (asc/desc): ").lower()
                 sort.append((field, ASCENDING if order == 'asc' else DESCENDING))
         
-        # Limit and Skip
+        # Limit, Skip and Batch size
         limit = 0
         skip = 0
+        batch_size = DEFAULT_BATCH_SIZE
         try:
             limit_input = input("\nLimit results (0 for no limit): ").strip()
             limit = int(limit_input) if limit_input else 0
             
             skip_input = input("Skip documents (0 for no skip): ").strip()
             skip = int(skip_input) if skip_input else 0
+            
+            batch_input = input(f"Batch size (default: {DEFAULT_BATCH_SIZE}): ").strip()
+            batch_size = int(batch_input) if batch_input else DEFAULT_BATCH_SIZE
         except ValueError:
             print("⚠ Invalid number, using defaults")
         
+        exporter = self.prompt_export()
+        
+        # Total matches are only reported for limited queries
+        count_mode = 'off'
+        if limit > 0 and not exporter:
+            count_mode = input(f"Total count (off/capped/exact/background, default: {self.count_mode}): "
+                               ).strip().lower() or self.count_mode
+            if count_mode not in COUNT_MODES:
+                print(f"⚠ Invalid mode, using {self.count_mode}")
+                count_mode = self.count_mode
+        
+        self.advisor.record(self.collection.full_name, query, sort)
+        self.show_explain('find', query=query, projection=projection or None, sort=sort,
+                          skip=skip, limit=limit)
+        
         try:
-            cursor = self.collection.find(query, projection or None)
+            # Raw BSON export writes the server's bytes without decoding them
+            source = (raw_collection(self.collection) if exporter and exporter[0].fmt == 'bson'
+                      else self.read_collection)
+            cursor = source.find(query, projection or None, batch_size=batch_size)
             
             if sort:
                 cursor = cursor.sort(sort)
@@ -382,24 +1405,179 @@ class MongoDBCRUD:
             if limit > 0:
                 cursor = cursor.limit(limit)
             
-            documents = list(cursor)
+            if exporter:
+                self.export_cursor(cursor, *exporter)
+                return
             
-            if documents:
-                print(f"\n✓ Found {len(documents)} document(s):")
-                for i, doc in enumerate(documents, 1):
-                    print(f"\n--- Document {i} ---")
-                    print(json.dumps(doc, default=str, indent=2))
+            # Start the full count alongside the query so results are not delayed
+            background = self.start_background_count(query) if count_mode == 'background' else None
+            
+            print("\n Streaming results (press Ctrl+C to stop)...")
+            count, aborted = self.stream_cursor(cursor)
+            
+            if count:
+                if aborted:
+                    print(f"\n⚠ Stopped after {count} document(s)")
+                else:
+                    print(f"\n✓ Found {count} document(s)")
                 
                 # Show total count if limited
-                if limit > 0:
-                    total = self.collection.count_documents(query)
-                    if total > len(documents):
-                        print(f"\n(Showing {len(documents)} of {total} total matches)")
-            else:
+                if count_mode != 'off' and not aborted:
+                    if background:
+                        total, label = self.wait_background_count(background)
+                    else:
+                        total, label = self.count_preview(query, count_mode)
+                    if total is not None and total > count:
+                        print(f"\n(Showing {count} of {label} total matches)")
+            elif not aborted:
                 print("✗ No documents found matching the query")
         except Exception as e:
             print(f"✗ Error finding documents: {e}")
     
+    def browse_pages(self, query: Dict[str, Any], projection: Dict[str, Any]):
+        """
+        Page through results by seeking past the last seen key
+        
+        Every page is fetched with a range condition on an indexed key, so
+        page 10,000 costs the same as page 1 (unlike skip).
+        """
+        sort_field = input("Page on field (must be indexed; default: _id): ").strip() or '_id'
+        order = input(f"Order for '{sort_field}' (asc/desc, default: asc): ").strip().lower()
+        try:
+            size_input = input(f"Page size (default: {DEFAULT_PAGE_SIZE}): ").strip()
+            page_size = int(size_input) if size_input else DEFAULT_PAGE_SIZE
+        except ValueError:
+            print("⚠ Invalid number, using default")
+            page_size = DEFAULT_PAGE_SIZE
+        
+        paginator = KeysetPaginator(self.collection, query, projection or None, sort_field,
+                                    DESCENDING if order == 'desc' else ASCENDING, page_size)
+        self.advisor.record(self.collection.full_name, query, paginator.sort)
+        command = 'n'
+        while True:
+            try:
+                if command == 'n':
+                    documents = paginator.next_page()
+                    if not documents:
+                        print("\n✗ No more documents" if paginator.page >= 0
+                              else "✗ No documents found matching the query")
+                elif command == 'p':
+                    documents = paginator.previous_page()
+                    if not documents:
+                        print("\n⚠ Already on the first page")
+                else:
+                    documents = []
+                
+                renderer = self.renderer()
+                for i, doc in enumerate(documents, 1):
+                    renderer.document(doc, f"Page {paginator.page + 1}, Document {i}")
+                renderer.flush()
+            except Exception as e:
+                print(f"✗ Error fetching page: {e}")
+                return
+            
+            command = input(f"\n[Page {paginator.page + 1}] (n)ext, (p)revious, (q)uit: ").strip().lower()[:1]
+            if command not in ('n', 'p'):
+                break
+    
+    def show_explain(self, kind: str, **params):
+        """Print an explain summary for a read when explain mode is on"""
+        if not self.explain_enabled:
+            return
+        try:
+            print_explain_summary(summarize_explain(explain_read(self.collection, kind, **params)))
+        except Exception as e:
+            print(f"⚠ Explain failed: {e}")
+    
+    def toggle_explain(self):
+        """Turn explain mode on or off"""
+        self.explain_enabled = not self.explain_enabled
+        state = "ON" if self.explain_enabled else "OFF"
+        print(f"✓ Explain mode {state} for Find Many, Count Documents and Aggregation")
+    
+    def output_settings(self):
+        """Choose how documents are printed"""
+        print("\n OUTPUT FORMAT")
+        print(f"Current: {self.render_mode}" +
+              (f" (columns: {', '.join(self.render_columns)})" if self.render_columns else "") +
+              (", raw BSON reads" if self.raw_documents else ""))
+        mode = input(f"Format ({'/'.join(DocumentRenderer.MODES)}, press Enter to keep): ").strip().lower()
+        if mode:
+            if mode not in DocumentRenderer.MODES:
+                print("⚠ Unknown format, keeping the current one")
+            else:
+                self.render_mode = mode
+        if self.render_mode == 'table':
+            columns = input("Columns, comma-separated dotted paths (press Enter for the first "
+                            f"{TABLE_MAX_COLUMNS} fields): ").strip()
+            self.render_columns = [column.strip() for column in columns.split(',') if column.strip()] or None
+        self.raw_documents = input("Decode streamed results lazily with RawBSONDocument? (y/n): "
+                                   ).lower().startswith('y')
+        print(f"✓ Output format: {self.render_mode}")
+    
+    def throttle_settings(self):
+        """Show write throttle statistics and change its limits"""
+        print("\n WRITE THROTTLE")
+        summary = self.throttle.summary()
+        if self.throttle.active:
+            print(f"Limits: {summary['docs_per_sec'] or 'unlimited'} docs/sec, "
+                  f"{summary['bytes_per_sec'] or 'unlimited'} bytes/sec, "
+                  f"adaptive {'on' if summary['adaptive'] else 'off'}")
+            print(f"Writes: {summary['writes']} ({summary['documents']} docs, {summary['bytes']} bytes), "
+                  f"waited {summary['waited']}s")
+            if summary['adaptive']:
+                print(f"Adaptive: rate factor {summary['factor']}, {summary['backoffs']} back-off(s), "
+                      f"latency {summary['latency_ms']} ms/doc, lock queue {summary['queue']}")
+        else:
+            print("Current: off")
+        if not input("Change limits? (y/n): ").lower().startswith('y'):
+            return
+        try:
+            docs_input = input("Max documents/sec (Enter for unlimited): ").strip()
+            bytes_input = input("Max bytes/sec (Enter for unlimited): ").strip()
+            docs_per_sec = float(docs_input) if docs_input else 0.0
+            bytes_per_sec = float(bytes_input) if bytes_input else 0.0
+        except ValueError:
+            print("⚠ Invalid number, throttle unchanged")
+            return
+        adaptive = input("Back off when latency or the server queue rises? (y/n): ").lower().startswith('y')
+        self.throttle.configure(docs_per_sec, bytes_per_sec, adaptive)
+        print("✓ Write throttle " + ("on" if self.throttle.active else "off"))
+    
+    def start_background_count(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run an exact count_documents in a daemon thread
+        
+        Returns:
+            Handle for wait_background_count
+        """
+        handle = {"result": None, "error": None}
+        
+        def run():
+            try:
+                handle["result"] = self.count_preview(query, 'exact')
+            except Exception as e:
+                handle["error"] = e
+        
+        handle["thread"] = threading.Thread(target=run, daemon=True)
+        handle["thread"].start()
+        return handle
+    
+    @staticmethod
+    def wait_background_count(handle: Dict[str, Any]) -> Tuple[Optional[int], str]:
+        """Wait for a background count; Ctrl+C gives up on it"""
+        if handle["thread"].is_alive():
+            print("\n Counting total matches (press Ctrl+C to skip)...")
+        try:
+            handle["thread"].join()
+        except KeyboardInterrupt:
+            return None, "unknown"
+        if handle["error"]:
+            print(f"⚠ Could not count total matches: {handle['error']}")
+            return None, "unknown"
+        return handle["result"]
+    
+    @invalidates_cache
     def update_one(self):
         """Update a single document"""
         print("\n✏️ UPDATE ONE DOCUMENT")
@@ -413,7 +1591,8 @@ class MongoDBCRUD:
         upsert = input("\nUpsert if not found? (y/n): ").lower().startswith('y')
         
         try:
-            result = self.collection.update_one(query, update, upsert=upsert)
+            with self.throttle.write(self.collection, [query, update], count=1):
+                result = self.collection.update_one(query, update, upsert=upsert)
             print(f"✓ Matched: {result.matched_count}, Modified: {result.modified_count}")
             if result.upserted_id:
                 print(f"   Upserted ID: {result.upserted_id}")
@@ -422,6 +1601,7 @@ class MongoDBCRUD:
         except Exception as e:
             print(f"✗ Error updating document: {e}")
     
+    @invalidates_cache
     def update_many(self):
         """Update multiple documents"""
         print("\n UPDATE MULTIPLE DOCUMENTS")
@@ -439,10 +1619,16 @@ class MongoDBCRUD:
             print("⚠ No update operations provided. Operation cancelled.")
             return
         
+        if input("\nRun in resumable chunks? (y/n): ").lower().startswith('y'):
+            self.run_chunked(query, update)
+            return
+        
         upsert = input("\nUpsert if not found? (y/n): ").lower().startswith('y')
         
         try:
-            result = self.collection.update_many(query, update, upsert=upsert)
+            with self.throttle.write(self.collection, [query, update], count=1) as usage:
+                result = self.collection.update_many(query, update, upsert=upsert)
+                usage['affected'] = result.modified_count
             print(f"✓ Matched: {result.matched_count}, Modified: {result.modified_count}")
             if result.upserted_id:
                 print(f"   Upserted ID: {result.upserted_id}")
@@ -451,6 +1637,7 @@ class MongoDBCRUD:
         except Exception as e:
             print(f"✗ Error updating documents: {e}")
     
+    @invalidates_cache
     def replace_one(self):
         """Replace a document entirely"""
         print("\n REPLACE ONE DOCUMENT")
@@ -472,13 +1659,15 @@ class MongoDBCRUD:
         upsert = input("\nUpsert if not found? (y/n): ").lower().startswith('y')
         
         try:
-            result = self.collection.replace_one(query, replacement, upsert=upsert)
+            with self.throttle.write(self.collection, [query, replacement], count=1):
+                result = self.collection.replace_one(query, replacement, upsert=upsert)
             print(f"✓ Matched: {result.matched_count}, Modified: {result.modified_count}")
             if result.upserted_id:
                 print(f"   Upserted ID: {result.upserted_id}")
         except Exception as e:
             print(f"✗ Error replacing document: {e}")
     
+    @invalidates_cache
     def delete_one(self):
         """Delete a single document"""
         print("\n　DELETE ONE DOCUMENT")
@@ -490,24 +1679,63 @@ class MongoDBCRUD:
                 print("Operation cancelled.")
                 return
         
-        # Show document to be deleted
-        doc = self.collection.find_one(query)
-        if doc:
-            print("\nDocument to be deleted:")
-            print(json.dumps(doc, default=str, indent=2))
-            if not input("\nConfirm deletion? (y/n): ").lower().startswith('y'):
-                print("Operation cancelled.")
-                return
-        else:
-            print("✗ No document found matching the query")
-            return
+        preview = not input("Skip preview and delete immediately? (y/n): ").lower().startswith('y')
         
         try:
-            result = self.collection.delete_one(query)
-            print(f"✓ Deleted {result.deleted_count} document")
+            if preview:
+                # Show document to be deleted
+                doc = self.collection.find_one(query)
+                if not doc:
+                    print("✗ No document found matching the query")
+                    return
+                print("\nDocument to be deleted:")
+                self.show_document(doc)
+                if not input("\nConfirm deletion? (y/n): ").lower().startswith('y'):
+                    print("Operation cancelled.")
+                    return
+                # Delete exactly the previewed document, even if others now match
+                query = {"_id": doc["_id"]}
+            
+            with self.throttle.write(self.collection, [query], count=1):
+                deleted = self.collection.find_one_and_delete(query)
+            if deleted:
+                print("✓ Deleted 1 document:")
+                self.show_document(deleted)
+            elif preview:
+                print("✗ Document was already removed by another client")
+            else:
+                print("✗ No document found matching the query")
         except Exception as e:
             print(f"✗ Error deleting document: {e}")
     
+    def count_preview(self, query: Dict[str, Any], mode: str = 'capped',
+                      cap: int = COUNT_PREVIEW_CAP) -> Tuple[Optional[int], str]:
+        """
+        Count matching documents without always scanning the whole collection
+        
+        Args:
+            query: Query filter
+            mode: exact (full count_documents), capped (stop counting at cap),
+                  estimated (collection metadata; empty filters only) or off
+            cap: Ceiling for capped counts
+            
+        Returns:
+            Tuple of (count or None when unknown, display label such as "10000+")
+        """
+        if mode == 'off':
+            return None, "unknown"
+        if mode == 'estimated' or (not query and mode != 'exact'):
+            if query:
+                raise ValueError("Estimated counts are only available for empty filters")
+            count = self.collection.estimated_document_count()
+            return count, f"~{count}"
+        if mode == 'capped':
+            count = self.collection.count_documents(query, limit=cap + 1)
+            return count, f"{cap}+" if count > cap else str(count)
+        count = self.collection.count_documents(query)
+        return count, str(count)
+    
+    @invalidates_cache
     def delete_many(self):
         """Delete multiple documents"""
         print("\n DELETE MULTIPLE DOCUMENTS")
@@ -519,26 +1747,255 @@ class MongoDBCRUD:
                 print("Operation cancelled.")
                 return
         
+        mode = input(f"Preview count (exact/capped/off, default: capped at {COUNT_PREVIEW_CAP}): "
+                     ).strip().lower() or 'capped'
+        if mode not in ('exact', 'capped', 'off'):
+            print("⚠ Invalid mode, using capped")
+            mode = 'capped'
+        
         # Show count of documents to be deleted
-        count = self.collection.count_documents(query)
-        if count > 0:
-            print(f"\n⚠ This will delete {count} document(s)")
-            if not input("Confirm deletion? (y/n): ").lower().startswith('y'):
-                print("Operation cancelled.")
-                return
-        else:
+        try:
+            count, label = self.count_preview(query, mode)
+        except Exception as e:
+            print(f"✗ Error counting documents: {e}")
+            return
+        if count == 0:
             print("✗ No documents found matching the query")
             return
         
+        if count is None:
+            print("\n⚠ This will delete every matching document (count skipped)")
+        else:
+            print(f"\n⚠ This will delete {label} document(s)")
+        if not input("Confirm deletion? (y/n): ").lower().startswith('y'):
+            print("Operation cancelled.")
+            return
+        
+        if input("Delete in resumable chunks? (y/n): ").lower().startswith('y'):
+            self.run_chunked(query)
+            return
+        
         try:
-            result = self.collection.delete_many(query)
-            print(f"✓ Deleted {result.deleted_count} document(s)")
+            with self.throttle.write(self.collection, [query], count=1) as usage:
+                result = self.collection.delete_many(query)
+                usage['affected'] = result.deleted_count
+            if result.deleted_count:
+                print(f"✓ Deleted {result.deleted_count} document(s)")
+            else:
+                print("✗ No documents found matching the query")
         except Exception as e:
             print(f"✗ Error deleting documents: {e}")
     
+    def run_chunked(self, query: Dict[str, Any], update: Optional[Any] = None):
+        """
+        Apply an update (or a delete when update is None) chunk by chunk with a checkpoint
+        
+        Args:
+            query: Filter selecting the documents
+            update: Update document or pipeline
+        """
+        op = 'delete' if update is None else 'update'
+        try:
+            size_input = input(f"Chunk size (default: {DEFAULT_CHUNK_SIZE}): ").strip()
+            chunk_size = int(size_input) if size_input else DEFAULT_CHUNK_SIZE
+            rate_input = input("Max documents/sec (Enter for unlimited): ").strip()
+            max_rate = float(rate_input) if rate_input else 0.0
+            lag_input = input("Pause while replication lag exceeds N seconds (Enter to ignore): ").strip()
+            max_lag = float(lag_input) if lag_input else 0.0
+        except ValueError:
+            print("⚠ Invalid number, using defaults")
+            chunk_size, max_rate, max_lag = DEFAULT_CHUNK_SIZE, 0.0, 0.0
+        default_checkpoint = f"{self.collection.full_name}.{op}.checkpoint.json"
+        checkpoint = input(f"Checkpoint file (default: {default_checkpoint}): ").strip() or default_checkpoint
+        
+        try:
+            writer = ChunkedWriter(self.collection, query, update, chunk_size, max_rate, max_lag, checkpoint,
+                                   throttle=self.throttle)
+        except ValueError as e:
+            print(f"✗ {e}")
+            return
+        if writer.resumed:
+            done = writer.state['deleted'] if update is None else writer.state['modified']
+            print(f"Found checkpoint: {writer.state['chunks']} chunk(s) done, {done} document(s) {op}d")
+            if not input("Resume from it? (y/n): ").lower().startswith('y'):
+                writer.reset()
+        
+        try:
+            stats = writer.run()
+            if update is None:
+                print(f"✓ Deleted {stats['deleted']} document(s) in {stats['chunks']} chunk(s)")
+            else:
+                print(f"✓ Matched: {stats['matched']}, Modified: {stats['modified']} in {stats['chunks']} chunk(s)")
+            print(f"   {stats['elapsed']}s this run ({stats['docs_per_sec']} docs/sec)")
+        except KeyboardInterrupt:
+            print(f"\n⚠ Interrupted after {writer.state['chunks']} chunk(s); "
+                  f"run again with the same filter and {checkpoint} to resume")
+        except Exception as e:
+            print(f"✗ Error in chunked {op}: {e}")
+            print(f"   Progress up to the last chunk is saved in {checkpoint}")
+    
     def aggregate(self):
         """Perform aggregation pipeline"""
         print("\n AGGREGATION PIPELINE")
+        library = PipelineLibrary(self.pipeline_library)
+        pipeline, built = self.load_saved_pipeline(library), False
+        if pipeline is None:
+            pipeline, built = self.build_pipeline(), True
+        
+        if not pipeline:
+            print("⚠ No pipeline stages added. Operation cancelled.")
+            return
+        
+        if built:
+            name = input("\nSave this pipeline as (name, or press Enter to skip): ").strip()
+            if name:
+                try:
+                    library.save(name, pipeline, input("Description: ").strip(), self.collection.name)
+                    print(f"✓ Saved pipeline '{name}' to {library.path}")
+                except OSError as e:
+                    print(f"⚠ Could not save pipeline: {e}")
+        
+        params = {}
+        for param in PipelineLibrary.parameters(pipeline):
+            params[param] = self.parse_value(input(f"Value for ${param}: ").strip())
+        pipeline = PipelineLibrary.substitute(pipeline, params)
+        
+        issues = validate_pipeline(pipeline, self.collection)
+        for level, message in issues:
+            print(f"{'✗' if level == 'error' else '⚠'} {message}")
+        if any(level == 'error' for level, _ in issues):
+            if not input("Pipeline has errors. Send it anyway? (y/n): ").lower().startswith('y'):
+                print("Operation cancelled.")
+                return
+        
+        pipeline = self.offer_optimized_pipeline(pipeline)
+        
+        print("\n Executing pipeline:")
+        print(json.dumps(pipeline, indent=2, default=str))
+        self.advisor.record_pipeline(self.collection.full_name, pipeline)
+        self.show_explain('aggregate', pipeline=pipeline)
+        
+        options = self.prompt_aggregate_options()
+        target = output_namespace(pipeline, self.db.name)
+        if target:
+            try:
+                started = time.perf_counter()
+                with self.throttle.write(self.collection, pipeline, count=1):
+                    self.collection.aggregate(pipeline, **options).close()
+                print(f"✓ Results written to {target} in {time.perf_counter() - started:.3f}s")
+            except Exception as e:
+                print(f"✗ Error executing aggregation: {e}")
+            finally:
+                self.invalidate_cache(target)
+            return
+        
+        exporter = self.prompt_export()
+        if exporter:
+            try:
+                source = raw_collection(self.collection) if exporter[0].fmt == 'bson' else self.collection
+                self.export_cursor(source.aggregate(pipeline, **options), *exporter)
+            except Exception as e:
+                print(f"✗ Error executing aggregation: {e}")
+            return
+        
+        try:
+            cursor = self.read_collection.aggregate(pipeline, **options)
+            print("\n Streaming results (press Ctrl+C to stop)...")
+            count, aborted = self.stream_cursor(cursor, label="Result")
+            if aborted:
+                print(f"\n⚠ Stopped after {count} result(s)")
+            elif count:
+                print(f"\n✓ Aggregation returned {count} result(s)")
+            else:
+                print("✗ No results from aggregation")
+        except Exception as e:
+            print(f"✗ Error executing aggregation: {e}")
+    
+    def offer_optimized_pipeline(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Show the optimizer's rewrite of a pipeline and let the user choose which one runs"""
+        optimized, notes = optimize_pipeline(pipeline)
+        if not notes:
+            return pipeline
+        
+        print("\n Optimizer suggestions:")
+        for note in notes:
+            print(f"  • {note}")
+        print(diff_pipelines(pipeline, optimized))
+        
+        if input("Compare explain timings of both versions? (y/n): ").lower().startswith('y'):
+            for label, candidate in (("before", pipeline), ("after", optimized)):
+                try:
+                    started = time.perf_counter()
+                    summary = summarize_explain(explain_read(self.collection, 'aggregate', pipeline=candidate))
+                    elapsed = (time.perf_counter() - started) * 1000
+                    server = f"{summary['execution_ms']} ms" if summary['execution_ms'] is not None else "n/a"
+                    print(f"  {label:<7} server {server:>8}, round trip {elapsed:8.1f} ms, "
+                          f"{summary['docs_examined']} docs examined, plan {summary['plan']}")
+                except Exception as e:
+                    print(f"  ⚠ Explain of the {label} pipeline failed: {e}")
+        
+        if input("Run the optimized pipeline? (Y/n): ").strip().lower().startswith('n'):
+            return pipeline
+        return optimized
+    
+    @staticmethod
+    def build_output_stage() -> Optional[Dict[str, Any]]:
+        """Ask for a $out or $merge stage writing results server-side"""
+        kind = input("Write with (out/merge, default: merge): ").strip().lower() or 'merge'
+        collection_name = input("Target collection: ").strip()
+        if not collection_name:
+            print("⚠ Target collection required")
+            return None
+        database_name = input("Target database (press Enter for current): ").strip()
+        target = {"db": database_name, "coll": collection_name} if database_name else collection_name
+        
+        if kind == 'out':
+            return {"$out": target}
+        stage = {"into": target}
+        on = input("Match on fields, comma-separated (default: _id): ").strip()
+        if on:
+            stage["on"] = [field.strip() for field in on.split(',') if field.strip()]
+        matched = input("When matched (replace/keepExisting/merge/fail, default: merge): ").strip()
+        if matched:
+            stage["whenMatched"] = matched
+        not_matched = input("When not matched (insert/discard/fail, default: insert): ").strip()
+        if not_matched:
+            stage["whenNotMatched"] = not_matched
+        return {"$merge": stage}
+    
+    @staticmethod
+    def prompt_aggregate_options() -> Dict[str, Any]:
+        """Ask for allowDiskUse, batchSize, maxTimeMS, hint and comment"""
+        options = {"batchSize": DEFAULT_BATCH_SIZE}
+        if not input("Set aggregation options (allowDiskUse/batch size/maxTimeMS/hint/comment)? (y/n): "
+                     ).lower().startswith('y'):
+            return options
+        
+        if input("Allow spilling to disk for large sorts/groups? (y/n): ").lower().startswith('y'):
+            options["allowDiskUse"] = True
+        try:
+            batch_input = input(f"Batch size (default: {DEFAULT_BATCH_SIZE}): ").strip()
+            if batch_input:
+                options["batchSize"] = int(batch_input)
+            time_input = input("Time limit in ms (press Enter for none): ").strip()
+            if time_input:
+                options["maxTimeMS"] = int(time_input)
+        except ValueError:
+            print("⚠ Invalid number, ignored")
+        
+        hint = input("Index hint (name or JSON keys, press Enter for none): ").strip()
+        if hint:
+            try:
+                options["hint"] = list(json.loads(hint).items()) if hint.startswith('{') else hint
+            except json.JSONDecodeError as e:
+                print(f"⚠ Invalid hint ignored: {e}")
+        comment = input("Comment for the server logs/profiler (press Enter for none): ").strip()
+        if comment:
+            options["comment"] = comment
+        return options
+    
+    def build_pipeline(self) -> List[Dict[str, Any]]:
+        """Build an aggregation pipeline stage by stage"""
         pipeline = []
         
         print("Build aggregation pipeline (common stages):")
@@ -549,9 +2006,10 @@ class MongoDBCRUD:
         print("5. $project - Shape output")
         print("6. $lookup - Join collections")
         print("7. Custom stage (JSON)")
+        print("8. $out / $merge - Write results to a collection (final stage)")
         
         while True:
-            stage_type = input("\nSelect stage (1-7, or press Enter to execute): ").strip()
+            stage_type = input("\nSelect stage (1-8, or press Enter to execute): ").strip()
             
             if not stage_type:
                 break
@@ -559,7 +2017,7 @@ class MongoDBCRUD:
             try:
                 if stage_type == '1':  # $match
                     print("Build match filter:")
-                    match_filter = self.build_query_filter()
+                    match_filter = self.build_query_filter(record=False)
                     if match_filter:
                         pipeline.append({"$match": match_filter})
                         print("✓ Added $match stage")
@@ -660,35 +2118,50 @@ class MongoDBCRUD:
                     pipeline.append(stage)
                     print("✓ Added custom stage")
                 
+                elif stage_type == '8':  # $out / $merge
+                    stage = self.build_output_stage()
+                    if stage:
+                        pipeline.append(stage)
+                        print(f"✓ Added {next(iter(stage))} stage; executing")
+                        break
+                
             except (ValueError, json.JSONDecodeError) as e:
                 print(f"⚠ Invalid input: {e}")
         
-        if not pipeline:
-            print("⚠ No pipeline stages added. Operation cancelled.")
-            return
-        
-        print("\n Executing pipeline:")
-        print(json.dumps(pipeline, indent=2))
-        
+        return pipeline
+    
+    def load_saved_pipeline(self, library: "PipelineLibrary") -> Optional[List[Dict[str, Any]]]:
+        """Offer the saved pipelines; returns the chosen one, or None to build a new one"""
         try:
-            results = list(self.collection.aggregate(pipeline))
-            if results:
-                print(f"\n✓ Aggregation returned {len(results)} result(s):")
-                for i, doc in enumerate(results, 1):
-                    print(f"\n--- Result {i} ---")
-                    print(json.dumps(doc, default=str, indent=2))
-            else:
-                print("✗ No results from aggregation")
-        except Exception as e:
-            print(f"✗ Error executing aggregation: {e}")
+            saved = library.load()
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read pipeline library {library.path}: {e}")
+            return None
+        if not saved:
+            return None
+        
+        print("Saved pipelines:")
+        for name, entry in sorted(saved.items()):
+            params = PipelineLibrary.parameters(entry['pipeline'])
+            print(f"  • {name}" + (f" - {entry['description']}" if entry.get('description') else "") +
+                  (f" (params: {', '.join(params)})" if params else ""))
+        while True:
+            name = input("Load a saved pipeline (name, or press Enter to build one): ").strip()
+            if not name:
+                return None
+            if name in saved:
+                return saved[name]['pipeline']
+            print(f"⚠ No saved pipeline '{name}'")
     
     def count_documents(self):
         """Count documents matching a query"""
         print("\n COUNT DOCUMENTS")
         query = self.build_query_filter()
+        self.show_explain('count', query=query)
         
         try:
-            count = self.collection.count_documents(query)
+            count = self.cached_read('count_documents',
+                                     lambda: self.collection.count_documents(query), query)
             print(f"✓ Count: {count} document(s)")
         except Exception as e:
             print(f"✗ Error counting documents: {e}")
@@ -706,7 +2179,8 @@ class MongoDBCRUD:
             query = self.build_query_filter()
         
         try:
-            values = self.collection.distinct(field, query)
+            values = self.cached_read('distinct', lambda: self.collection.distinct(field, query),
+                                      query, extra=field)
             print(f"✓ Found {len(values)} distinct value(s) for '{field}':")
             for value in values:
                 print(f"  • {value}")
@@ -748,13 +2222,78 @@ class MongoDBCRUD:
         if name:
             options['name'] = name
         
+        self.build_index(index_keys, **options)
+    
+    def build_index(self, index_keys: List[Tuple[str, Any]], **options) -> Optional[str]:
+        """
+        Create an index and report the outcome
+        
+        Args:
+            index_keys: (field, direction or type) pairs
+            **options: create_index options (unique, name, ...)
+            
+        Returns:
+            Name of the created index, or None on failure
+        """
         try:
             index_name = self.collection.create_index(index_keys, **options)
             print(f"✓ Created index: {index_name}")
+            return index_name
         except errors.DuplicateKeyError as e:
             print(f"✗ Duplicate key error: {e}")
         except Exception as e:
             print(f"✗ Error creating index: {e}")
+        return None
+    
+    def index_advisor(self):
+        """Recommend indexes for the query shapes recorded this session"""
+        print("\n INDEX ADVISOR")
+        try:
+            report = self.advisor.advise(self.collection)
+        except Exception as e:
+            print(f"✗ Error reading indexes: {e}")
+            return
+        
+        if not report['shapes']:
+            print("No queries recorded for this collection yet; run some finds, counts or aggregations first")
+        else:
+            print(f"Recorded query shapes for {self.collection.full_name}:")
+            for shape in report['shapes']:
+                parts = [f"eq({', '.join(shape['equality'])})" if shape['equality'] else "",
+                         f"sort({', '.join(f'{f}:{d}' for f, d in shape['sort'])})" if shape['sort'] else "",
+                         f"range({', '.join(shape['range'])})" if shape['range'] else ""]
+                served = f"✓ {shape['served_by']}" if 'served_by' in shape else "✗ no supporting index"
+                print(f"  {shape['count']:>5}x  {' '.join(part for part in parts if part):<50} {served}")
+        
+        for entry in report['redundant']:
+            print(f"⚠ Index '{entry['index']}' is a prefix of '{entry['prefix_of']}' and can likely be dropped")
+        for name in report['unused']:
+            print(f"⚠ Index '{name}' has not been used since the server started")
+        
+        if not report['recommended']:
+            if report['shapes']:
+                print("\n✓ Every recorded query shape is served by an existing index")
+            return
+        
+        print("\nRecommended indexes (equality, sort, range order):")
+        for number, entry in enumerate(report['recommended'], 1):
+            keys = ", ".join(f"{field}: {order}" for field, order in entry['keys'])
+            print(f"{number}. {{{keys}}}  serves {entry['queries']} recorded quer{'y' if entry['queries'] == 1 else 'ies'}")
+        
+        choice = input("\nCreate which (numbers separated by commas, 'all', or Enter to skip): ").strip().lower()
+        if not choice:
+            return
+        try:
+            picked = (range(1, len(report['recommended']) + 1) if choice == 'all'
+                      else [int(part) for part in choice.split(',') if part.strip()])
+        except ValueError:
+            print("⚠ Invalid selection")
+            return
+        for number in picked:
+            if 1 <= number <= len(report['recommended']):
+                self.build_index([tuple(key) for key in report['recommended'][number - 1]['keys']])
+            else:
+                print(f"⚠ No recommendation {number}")
     
     def list_indexes(self):
         """List all indexes on collection"""
@@ -785,12 +2324,103 @@ class MongoDBCRUD:
         except Exception as e:
             print(f"✗ Error getting collection stats: {e}")
     
+    def cache_settings(self):
+        """Enable, inspect or clear the read cache"""
+        print("\n QUERY CACHE")
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"Enabled (TTL {self.cache.ttl}s, {self.cache.max_entries} entries, "
+                  f"{self.cache.max_bytes // (1 << 20)} MiB budget)")
+            print(f"Entries: {stats['entries']} ({stats['bytes']} bytes)")
+            print(f"Hits: {stats['hits']}, Misses: {stats['misses']}, Hit rate: {stats['hit_rate']:.1%}")
+            print(f"Evictions: {stats['evictions']}, Invalidations: {stats['invalidations']}")
+            if self.cache_watcher and self.cache_watcher.failure:
+                print(f"⚠ Change stream invalidation stopped: {self.cache_watcher.failure}")
+            action = input("\n1. Clear  2. Disable  (or press Enter to keep): ").strip()
+            if action == '1':
+                self.cache.invalidate()
+                print("✓ Cache cleared")
+            elif action == '2':
+                self.disable_cache()
+                print("✓ Cache disabled")
+            return
+        
+        print("Cache is disabled. Cached reads: Find One, Count Documents, Distinct Values.")
+        if not input("Enable cache? (y/n): ").lower().startswith('y'):
+            return
+        try:
+            ttl_input = input(f"TTL in seconds (default: {DEFAULT_CACHE_TTL:g}): ").strip()
+            entries_input = input(f"Max entries (default: {DEFAULT_CACHE_ENTRIES}): ").strip()
+            mb_input = input(f"Memory budget in MiB (default: {DEFAULT_CACHE_BYTES >> 20}): ").strip()
+            self.enable_cache(float(ttl_input) if ttl_input else DEFAULT_CACHE_TTL,
+                              int(entries_input) if entries_input else DEFAULT_CACHE_ENTRIES,
+                              (int(mb_input) << 20) if mb_input else DEFAULT_CACHE_BYTES)
+            print("✓ Cache enabled; writes made through this tool invalidate it automatically")
+        except ValueError:
+            print("⚠ Invalid number. Cache not enabled.")
+            return
+        
+        if input("Also invalidate on writes from other clients via a change stream? (y/n): "
+                 ).lower().startswith('y'):
+            self.start_cache_watcher()
+            print(f"✓ Watching {self.db.name} for changes in the background")
+    
+    def watch(self):
+        """Tail a change stream on the collection or database"""
+        print("\n WATCH CHANGES")
+        scope = input("Watch (1) this collection or (2) the whole database? (1-2): ").strip()
+        target = self.db if scope == '2' else self.collection
+        
+        pipeline = []
+        op_types = input("Operation types, comma-separated (insert/update/replace/delete; "
+                         "Enter for all): ").strip()
+        if op_types:
+            pipeline.append({"$match": {"operationType": {
+                "$in": [op.strip() for op in op_types.split(',') if op.strip()]}}})
+        full_document = input("Include full document on updates? (y/n): ").lower().startswith('y')
+        
+        output_path = input("Write events to JSONL file (or press Enter to print): ").strip()
+        resume_file = input("Resume token file (or press Enter to start from now): ").strip() or None
+        
+        watcher = ChangeStreamWatcher(target, resume_file, pipeline, full_document, cache=self.cache)
+        if watcher.resume_token is not None:
+            print("✓ Resuming after saved token")
+        name = self.db.name if scope == '2' else self.collection.full_name
+        print(f"\n Watching {name} (press Ctrl+C to stop)...")
+        
+        output = None
+        try:
+            if output_path:
+                output = open(output_path, 'a', encoding='utf-8', buffering=EXPORT_BUFFER_SIZE)
+            for change in watcher.events():
+                if output:
+                    output.write(json_util.dumps(change) + "\n")
+                    if watcher.events_seen % PROGRESS_INTERVAL == 0:
+                        print(f"\r  {watcher.events_seen} event(s) written", end='', flush=True)
+                else:
+                    print(f"\n--- {change.get('operationType')} "
+                          f"{json_util.dumps(change.get('documentKey', {}))} ---")
+                    print(json_util.dumps(change, indent=2))
+        except KeyboardInterrupt:
+            pass
+        except errors.PyMongoError as e:
+            print(f"✗ Change stream error: {e} (change streams need a replica set or sharded cluster)")
+        except OSError as e:
+            print(f"✗ Error writing events: {e}")
+        finally:
+            if output:
+                output.close()
+        print(f"\n✓ Stopped after {watcher.events_seen} event(s)")
+        if resume_file:
+            print(f"   Resume token saved to {resume_file}")
+    
+    @invalidates_cache
     def bulk_operations(self):
         """Perform bulk write operations"""
         print("\n BULK WRITE OPERATIONS")
         from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
         
-        operations = []
+        operations, payload = [], []
         operation_types = {
             '1': 'InsertOne',
             '2': 'UpdateOne',
@@ -829,6 +2459,7 @@ class MongoDBCRUD:
                         document[field] = self.parse_value(value)
                     if document:
                         operations.append(InsertOne(document))
+                        payload.append(document)
                         print(f"✓ Added InsertOne operation")
                 
                 elif op_type in ['2', '3']:  # UpdateOne/UpdateMany
@@ -841,6 +2472,7 @@ class MongoDBCRUD:
                             operations.append(UpdateOne(filter_doc, update_doc))
                         else:
                             operations.append(UpdateMany(filter_doc, update_doc))
+                        payload.append([filter_doc, update_doc])
                         print(f"✓ Added {operation_types[op_type]} operation")
                 
                 elif op_type == '4':  # ReplaceOne
@@ -856,6 +2488,7 @@ class MongoDBCRUD:
                         replacement[field] = self.parse_value(value)
                     if replacement:
                         operations.append(ReplaceOne(filter_doc, replacement))
+                        payload.append([filter_doc, replacement])
                         print(f"✓ Added ReplaceOne operation")
                 
                 elif op_type in ['5', '6']:  # DeleteOne/DeleteMany
@@ -865,6 +2498,7 @@ class MongoDBCRUD:
                         operations.append(DeleteOne(filter_doc))
                     else:
                         operations.append(DeleteMany(filter_doc))
+                    payload.append(filter_doc)
                     print(f"✓ Added {operation_types[op_type]} operation")
                 
             except Exception as e:
@@ -878,7 +2512,10 @@ class MongoDBCRUD:
         ordered = input("Execute in order? (y/n): ").lower().startswith('y')
         
         try:
-            result = self.collection.bulk_write(operations, ordered=ordered)
+            with self.throttle.write(self.collection, payload, count=len(operations)) as usage:
+                result = self.collection.bulk_write(operations, ordered=ordered)
+                usage['affected'] = (result.inserted_count + result.modified_count +
+                                     result.deleted_count + result.upserted_count)
             print(f"✓ Bulk write completed:")
             print(f"  Inserted: {result.inserted_count}")
             print(f"  Matched: {result.matched_count}")
@@ -891,59 +2528,2926 @@ class MongoDBCRUD:
             print(f"✗ Bulk write error: {e.details}")
         except Exception as e:
             print(f"✗ Error executing bulk write: {e}")
-
-
-class MongoDBCLI:
-    """Command-line interface for MongoDB CRUD operations"""
-    
-    def __init__(self):
-        self.crud = None
-        self.connected = False
     
-    def connect(self):
-        """Establish MongoDB connection"""
-        print("\n MONGODB CONNECTION")
+    @invalidates_cache
+    def import_file(self):
+        """Import documents from a JSONL, Extended JSON, JSON array, CSV or BSON file"""
+        print("\n IMPORT FROM FILE")
+        path = input("File path (.jsonl/.json/.csv/.bson, optionally .gz): ").strip()
+        if not path:
+            print("⚠ File path required")
+            return
         
-        # Connection options
-        print("1. Use default (mongodb://localhost:27017/)")
-        print("2. Enter custom connection string")
-        choice = input("Select option (1-2): ").strip()
+        detected = MongoDBImporter.detect_format(path)
+        fmt = input(f"Format (jsonl/extjson/json/csv/bson, default: {detected}): ").strip().lower() or detected
         
-        if choice == '2':
-            connection_string = input("Enter MongoDB URI: ").strip()
-        else:
-            connection_string = "mongodb://localhost:27017/"
+        schema = {}
+        if fmt == 'csv' and input("Declare column types? (y/n): ").lower().startswith('y'):
+            print(f"Types: {', '.join(MongoDBImporter.SCHEMA_TYPES)}")
+            while True:
+                column = input("Column (or press Enter to finish): ").strip()
+                if not column:
+                    break
+                schema[column] = input(f"Type for '{column}': ").strip().lower() or 'auto'
         
-        database_name = input("Database name (default: mydatabase): ").strip() or "mydatabase"
-        collection_name = input("Collection name (default: mycollection): ").strip() or "mycollection"
+        try:
+            batch_input = input(f"Batch size (default: {DEFAULT_IMPORT_BATCH_SIZE}): ").strip()
+            batch_size = int(batch_input) if batch_input else DEFAULT_IMPORT_BATCH_SIZE
+        except ValueError:
+            print("⚠ Invalid number, using default")
+            batch_size = DEFAULT_IMPORT_BATCH_SIZE
+        try:
+            workers_input = input("Worker threads (default: 1): ").strip()
+            workers = int(workers_input) if workers_input else 1
+        except ValueError:
+            print("⚠ Invalid number, using a single worker")
+            workers = 1
+        ordered = input("Use ordered insert? (y/n): ").lower().startswith('y')
         
         try:
-            self.crud = MongoDBCRUD(connection_string, database_name, collection_name)
-            self.connected = True
-        except ConnectionError as e:
-            print(f"✗ {e}")
-            self.connected = False
+            importer = MongoDBImporter(self.collection, batch_size=batch_size,
+                                       ordered=ordered, workers=workers, throttle=self.throttle)
+            stats = importer.import_file(path, fmt, schema)
+            print(f"✓ Imported {stats['inserted']} document(s) in {stats['batches']} batch(es), "
+                  f"{stats['elapsed']}s ({stats['docs_per_sec']} docs/sec)")
+            if stats['failed']:
+                print(f"⚠ {stats['failed']} document(s) failed to insert")
+        except KeyboardInterrupt:
+            print("\n⚠ Import interrupted; documents already sent remain inserted")
+        except (OSError, ValueError) as e:
+            print(f"✗ Error reading import file: {e}")
+        except Exception as e:
+            print(f"✗ Error importing documents: {e}")
     
-    def switch_collection(self):
-        """Switch to a different collection"""
-        if not self.connected:
-            print("⚠ Not connected to MongoDB")
-            return
-        
-        database_name = input("Database name (or press Enter to keep current): ").strip()
-        collection_name = input("Collection name: ").strip()
-        
+    def copy_documents(self):
+        """Copy matching documents to another collection as raw BSON"""
+        print("\n COPY TO COLLECTION")
+        database_name = input(f"Target database (default: {self.db.name}): ").strip() or self.db.name
+        collection_name = input("Target collection: ").strip()
         if not collection_name:
-            print("⚠ Collection name required")
+            print("⚠ Target collection required")
+            return
+        target = self.client[database_name][collection_name]
+        if target.full_name == self.collection.full_name:
+            print("⚠ Target must differ from the current collection")
             return
         
+        print("Filter documents to copy (press Enter for all):")
+        query = self.build_query_filter()
         try:
-            if database_name:
-                self.crud.db = self.crud.client[database_name]
-            self.crud.collection = self.crud.db[collection_name]
-            print(f"✓ Switched to {self.crud.db.name}.{collection_name}")
-        except Exception as e:
-            print(f"✗ Error switching collection: {e}")
+            batch_input = input(f"Batch size (default: {DEFAULT_IMPORT_BATCH_SIZE}): ").strip()
+            batch_size = int(batch_input) if batch_input else DEFAULT_IMPORT_BATCH_SIZE
+            workers_input = input("Worker threads (default: 1): ").strip()
+            workers = int(workers_input) if workers_input else 1
+        except ValueError:
+            print("⚠ Invalid number, using defaults")
+            batch_size, workers = DEFAULT_IMPORT_BATCH_SIZE, 1
+        
+        try:
+            stats = copy_collection(self.collection, target, query, batch_size, workers,
+                                    throttle=self.throttle)
+            print(f"✓ Copied {stats['inserted']} document(s) to {target.full_name} in {stats['elapsed']}s "
+                  f"({stats['docs_per_sec']} docs/sec)")
+            if stats['failed']:
+                print(f"⚠ {stats['failed']} document(s) failed to insert (duplicate _id?)")
+        except KeyboardInterrupt:
+            print("\n⚠ Copy interrupted; documents already sent remain inserted")
+        except Exception as e:
+            print(f"✗ Error copying documents: {e}")
+        finally:
+            self.invalidate_cache(target.full_name)
+
+
+# Filter mini-language operators, longest tokens first so ">=" wins over ">"
+FILTER_OPERATORS = (
+    (':exists:', '$exists'),
+    (':nin:', '$nin'),
+    (':in:', '$in'),
+    ('>=', '$gte'),
+    ('<=', '$lte'),
+    ('!=', '$ne'),
+    ('>', '$gt'),
+    ('<', '$lt'),
+    ('~', '$regex'),
+    ('=', None),
+)
+# Unquoted field names: word characters (any script), '.', '$', '-' and single inner spaces
+FILTER_FIELD_PATTERN = re.compile(r'[\w$][\w.$-]*(?: +[\w$][\w.$-]*)*')
+REGEX_LITERAL_PATTERN = re.compile(r'^/(.*)/([imsx]*)$', re.DOTALL)
+
+
+def is_operator_document(value: Any) -> bool:
+    """Check whether a value is a non-empty {"$op": ...} document"""
+    return isinstance(value, dict) and bool(value) and all(key.startswith('$') for key in value)
+
+
+def merge_filter(target: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    AND a filter into another in place
+    
+    Operator documents on the same field are combined (age>=18 and age<65
+    become {"age": {"$gte": 18, "$lt": 65}}); anything that would overwrite an
+    existing condition is appended to "$and" instead.
+    
+    Args:
+        target: Filter to extend
+        extra: Filter to add
+        
+    Returns:
+        The updated target filter
+    """
+    for field, condition in extra.items():
+        if field not in target:
+            target[field] = condition
+        elif field == '$and' and isinstance(condition, list):
+            target['$and'].extend(condition)
+        elif is_operator_document(target[field]) and is_operator_document(condition) \
+                and not set(target[field]) & set(condition):
+            target[field] = {**target[field], **condition}
+        else:
+            target.setdefault('$and', []).append({field: condition})
+    return target
+
+
+class FilterParser:
+    """
+    Recursive-descent parser for the query filter mini-language
+    
+    Grammar:
+        expr      := and_expr ('||' and_expr)*
+        and_expr  := term ((',' | '&&') term)*
+        term      := '(' expr ')' | condition
+        condition := field operator value
+    
+    Values may be quoted ("..." or '...') to keep them as literal strings or
+    to include separators; brackets, braces and parentheses inside a value are
+    balanced so JSON arrays and ObjectId("...") need no quoting. A ',' only
+    ends an unquoted value when another condition follows it, so
+    name=hello, world keeps its comma. Field names containing operator
+    characters can be quoted too ("a=b"=1). A '~' regex is read raw up to
+    the next separator outside its own groups and [...] classes; quotes in
+    it are not paired, and a ')' with no matching '(' only ends it inside a
+    parenthesized group.
+    """
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.depth = 0
+    
+    def error(self, message: str) -> ValueError:
+        """Build a ValueError pointing at the current position"""
+        return ValueError(f"{message} at position {self.pos} in {self.text!r}")
+    
+    def skip_whitespace(self):
+        """Advance past spaces"""
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+    
+    def accept(self, token: str) -> bool:
+        """Consume a token if it comes next"""
+        self.skip_whitespace()
+        if self.text.startswith(token, self.pos):
+            self.pos += len(token)
+            return True
+        return False
+    
+    def parse(self) -> Dict[str, Any]:
+        """Parse the whole expression"""
+        self.skip_whitespace()
+        if self.pos == len(self.text):
+            return {}
+        result = self.parse_or()
+        self.skip_whitespace()
+        if self.pos != len(self.text):
+            raise self.error("Unexpected input")
+        return result
+    
+    def parse_or(self) -> Dict[str, Any]:
+        """expr := and_expr ('||' and_expr)*"""
+        branches = [self.parse_and()]
+        while self.accept('||'):
+            branches.append(self.parse_and())
+        return branches[0] if len(branches) == 1 else {"$or": branches}
+    
+    def parse_and(self) -> Dict[str, Any]:
+        """and_expr := term ((',' | '&&') term)*"""
+        result = self.parse_term()
+        while self.accept(',') or self.accept('&&'):
+            result = merge_filter(dict(result), self.parse_term())
+        return result
+    
+    def parse_term(self) -> Dict[str, Any]:
+        """term := '(' expr ')' | condition"""
+        if self.accept('('):
+            self.depth += 1
+            result = self.parse_or()
+            if not self.accept(')'):
+                raise self.error("Expected ')'")
+            self.depth -= 1
+            return result
+        return self.parse_condition()
+    
+    def parse_condition(self) -> Dict[str, Any]:
+        """condition := field operator value"""
+        field = self.scan_field()
+        self.skip_whitespace()
+        
+        for token, operator in FILTER_OPERATORS:
+            if self.text.startswith(token, self.pos):
+                self.pos += len(token)
+                break
+        else:
+            raise self.error(f"Expected operator after '{field}'")
+        
+        raw, quoted = self.scan_value(regex=operator == '$regex')
+        return {field: self.build_condition(field, operator, raw, quoted)}
+    
+    def scan_quoted(self) -> str:
+        """Read a '...' or "..." string starting at the current position"""
+        text = self.text
+        quote = text[self.pos]
+        chars = []
+        self.pos += 1
+        while self.pos < len(text) and text[self.pos] != quote:
+            if text[self.pos] == '\\' and self.pos + 1 < len(text):
+                self.pos += 1
+            chars.append(text[self.pos])
+            self.pos += 1
+        if self.pos == len(text):
+            raise self.error("Unterminated quoted string")
+        self.pos += 1
+        return ''.join(chars)
+    
+    def scan_field(self) -> str:
+        """Read a field name, quoted or unquoted"""
+        self.skip_whitespace()
+        if self.pos < len(self.text) and self.text[self.pos] in '"\'':
+            return self.scan_quoted()
+        match = FILTER_FIELD_PATTERN.match(self.text, self.pos)
+        if not match:
+            raise self.error("Expected field name")
+        self.pos = match.end()
+        return match.group()
+    
+    def starts_condition(self, position: int) -> bool:
+        """Whether a term (a condition or '(') begins at a position, checked without consuming it"""
+        saved = self.pos
+        try:
+            self.pos = position
+            if self.accept('('):
+                return True
+            self.scan_field()
+            self.skip_whitespace()
+            return any(self.text.startswith(token, self.pos) for token, _ in FILTER_OPERATORS)
+        except ValueError:
+            return False
+        finally:
+            self.pos = saved
+    
+    def at_separator(self) -> bool:
+        """Whether '&&', '||' or a ',' followed by another condition comes next"""
+        text, pos = self.text, self.pos
+        return (text.startswith('&&', pos) or text.startswith('||', pos)
+                or (text[pos] == ',' and self.starts_condition(pos + 1)))
+    
+    def scan_regex(self) -> str:
+        """Read an unquoted regex up to the next top-level separator, skipping escapes, groups and [...] classes"""
+        text = self.text
+        start = self.pos
+        depth = 0
+        in_class = False
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char == '\\':
+                self.pos += 2
+                continue
+            if in_class:
+                in_class = char != ']'
+            elif char == '[':
+                in_class = True
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                if depth == 0 and self.depth:
+                    break
+                depth = max(0, depth - 1)
+            elif depth == 0 and self.at_separator():
+                break
+            self.pos += 1
+        self.pos = min(self.pos, len(text))
+        return text[start:self.pos].strip()
+    
+    def scan_value(self, regex: bool = False) -> Tuple[str, bool]:
+        """Read a value up to the next top-level separator"""
+        self.skip_whitespace()
+        text = self.text
+        
+        if self.pos < len(text) and text[self.pos] in '"\'':
+            return self.scan_quoted(), True
+        if regex:
+            return self.scan_regex(), False
+        
+        start = self.pos
+        depth = 0
+        quote = None
+        while self.pos < len(text):
+            char = text[self.pos]
+            if quote:
+                if char == '\\':
+                    self.pos += 1
+                elif char == quote:
+                    quote = None
+            elif char in '"\'':
+                quote = char
+            elif char in '([{':
+                depth += 1
+            elif char in ')]}':
+                if depth == 0:
+                    break
+                depth -= 1
+            elif depth == 0 and self.at_separator():
+                break
+            self.pos += 1
+        return text[start:self.pos].strip(), False
+    
+    @staticmethod
+    def build_condition(field: str, operator: Optional[str], raw: str, quoted: bool) -> Any:
+        """Convert a raw value for the given operator"""
+        if operator == '$exists':
+            return {"$exists": raw.lower() in ('true', '1', 'yes')}
+        
+        if operator in ('$in', '$nin'):
+            try:
+                values = json.loads(raw)
+            except json.JSONDecodeError:
+                raise ValueError("Invalid array format. Use JSON array: [val1, val2]")
+            if not isinstance(values, list):
+                raise ValueError("Invalid array format. Use JSON array: [val1, val2]")
+            return {operator: values}
+        
+        if operator == '$regex':
+            match = None if quoted else REGEX_LITERAL_PATTERN.match(raw)
+            if match:
+                pattern, options = match.groups()
+                return {"$regex": pattern, "$options": options} if options else {"$regex": pattern}
+            return {"$regex": raw}
+        
+        if quoted:
+            value = raw
+        elif field == '_id' and MongoDBCRUD.validate_object_id(raw) and len(raw) == 24:
+            value = ObjectId(raw)
+        else:
+            value = MongoDBCRUD.parse_value(raw)
+        return value if operator is None else {operator: value}
+
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def compile_filter(text: str) -> Dict[str, Any]:
+    """Parse a filter string once; callers must not mutate the cached result"""
+    return FilterParser(text).parse()
+
+
+def parse_filter(text: str) -> Dict[str, Any]:
+    """
+    Parse a filter mini-language string into a MongoDB query document
+    
+    Examples:
+        parse_filter('age>=18, age<65')       -> {"age": {"$gte": 18, "$lt": 65}}
+        parse_filter('status=A || (qty<30, tags:in:["x"])')
+        parse_filter('name~/^ali/i')          -> {"name": {"$regex": "^ali", "$options": "i"}}
+    
+    Args:
+        text: Filter expression
+        
+    Returns:
+        New query filter dictionary (safe to modify)
+        
+    Raises:
+        ValueError: If the expression cannot be parsed
+    """
+    return copy.deepcopy(compile_filter(text.strip()))
+
+
+def parse_update(operation: str) -> Dict[str, Any]:
+    """
+    Parse one update operation string into an update document
+    
+    Examples:
+        parse_update('score+=10')    -> {"$inc": {"score": 10}}
+        parse_update('tags[]=new')   -> {"$push": {"tags": "new"}}
+        parse_update('old:new')      -> {"$rename": {"old": "new"}}
+    
+    Args:
+        operation: Operation in the update mini-language
+        
+    Returns:
+        Update document with a single operator
+        
+    Raises:
+        ValueError: If the operation format is not recognized
+    """
+    operation = operation.strip()
+    parse_value = MongoDBCRUD.parse_value
+    
+    if ':' in operation and not '[]' in operation:  # $rename
+        old_field, new_field = operation.split(':', 1)
+        return {"$rename": {old_field.strip(): new_field.strip()}}
+    if '[]!=' in operation:  # $addToSet
+        field, value = operation.split('[]!=', 1)
+        return {"$addToSet": {field.strip(): parse_value(value)}}
+    if '[]=' in operation:  # $push
+        field, value = operation.split('[]=', 1)
+        return {"$push": {field.strip(): parse_value(value)}}
+    if '-=' in operation:  # $pull
+        field, value = operation.split('-=', 1)
+        return {"$pull": {field.strip(): parse_value(value)}}
+    if '+=' in operation:  # $inc
+        field, value = operation.split('+=', 1)
+        return {"$inc": {field.strip(): parse_value(value)}}
+    if '*=' in operation:  # $mul
+        field, value = operation.split('*=', 1)
+        return {"$mul": {field.strip(): parse_value(value)}}
+    if operation.endswith('!'):  # $unset
+        return {"$unset": {operation[:-1].strip(): ""}}
+    if '=' in operation:  # $set
+        field, value = operation.split('=', 1)
+        return {"$set": {field.strip(): parse_value(value)}}
+    raise ValueError("Invalid operation format")
+
+
+def merge_update(target: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the operators of one update document into another in place"""
+    for operator, fields in extra.items():
+        target.setdefault(operator, {}).update(fields)
+    return target
+
+
+def update_of(value: Any) -> Any:
+    """Accept an update document, one operation string, or a list of operation strings"""
+    if isinstance(value, str):
+        value = [value]
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        update = {}
+        for operation in value:
+            merge_update(update, parse_update(operation))
+        return update
+    return value
+
+
+def explain_read(collection: Collection, kind: str, query: Optional[Dict[str, Any]] = None,
+                 projection: Optional[Dict[str, Any]] = None, sort: Optional[List[Tuple[str, int]]] = None,
+                 skip: int = 0, limit: int = 0, pipeline: Optional[List[Dict[str, Any]]] = None,
+                 verbosity: str = 'executionStats') -> Dict[str, Any]:
+    """
+    Run the explain command for a find, count or aggregate
+    
+    Args:
+        collection: Target collection
+        kind: find, count or aggregate
+        query, projection, sort, skip, limit: Parameters of the read
+        pipeline: Aggregation pipeline (kind == 'aggregate')
+        verbosity: queryPlanner, executionStats or allPlansExecution
+        
+    Returns:
+        Raw explain output
+    """
+    if kind == 'find':
+        command = {"find": collection.name, "filter": query or {}}
+        if projection:
+            command["projection"] = projection
+        if sort:
+            command["sort"] = SON(sort)
+        if skip:
+            command["skip"] = skip
+        if limit:
+            command["limit"] = limit
+    elif kind == 'count':
+        command = {"count": collection.name, "query": query or {}}
+    elif kind == 'aggregate':
+        command = {"aggregate": collection.name, "pipeline": pipeline or [], "cursor": {}}
+    else:
+        raise ValueError(f"Cannot explain {kind}")
+    return collection.database.command("explain", command, verbosity=verbosity)
+
+
+def find_explain_section(explain: Any, name: str) -> Optional[Dict[str, Any]]:
+    """Find the first queryPlanner/executionStats section anywhere in explain output"""
+    if isinstance(explain, dict):
+        if isinstance(explain.get(name), dict):
+            return explain[name]
+        for value in explain.values():
+            found = find_explain_section(value, name)
+            if found:
+                return found
+    elif isinstance(explain, list):
+        for item in explain:
+            found = find_explain_section(item, name)
+            if found:
+                return found
+    return None
+
+
+def plan_stages(plan: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Flatten a (possibly SBE-wrapped) plan tree from the root down"""
+    stages = []
+    pending = [plan] if plan else []
+    while pending:
+        node = pending.pop(0)
+        if 'queryPlan' in node:
+            node = node['queryPlan']
+        stages.append(node)
+        if isinstance(node.get('inputStage'), dict):
+            pending.append(node['inputStage'])
+        pending.extend(node.get('inputStages', []))
+    return stages
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce explain output to the numbers that show why a read is slow
+    
+    Returns:
+        Dictionary with plan, indexes, n_returned, docs_examined, keys_examined,
+        examined_per_returned, execution_ms, collscan and in_memory_sort
+    """
+    planner = find_explain_section(explain, 'queryPlanner') or {}
+    stats = find_explain_section(explain, 'executionStats') or {}
+    stages = plan_stages(planner.get('winningPlan'))
+    names = [stage.get('stage', '?') for stage in stages]
+    indexes = [stage['indexName'] for stage in stages if stage.get('indexName')]
+    
+    n_returned = stats.get('nReturned', 0)
+    docs_examined = stats.get('totalDocsExamined', 0)
+    return {"plan": " <- ".join(names) or "n/a",
+            "indexes": indexes,
+            "n_returned": n_returned,
+            "docs_examined": docs_examined,
+            "keys_examined": stats.get('totalKeysExamined', 0),
+            "examined_per_returned": round(docs_examined / n_returned, 1) if n_returned else
+                                     (float(docs_examined) if docs_examined else 0.0),
+            "execution_ms": stats.get('executionTimeMillis'),
+            "collscan": 'COLLSCAN' in names,
+            "in_memory_sort": 'SORT' in names}
+
+
+def print_explain_summary(summary: Dict[str, Any]):
+    """Print an explain summary as a compact table with warnings"""
+    rows = [("Winning plan", summary['plan']),
+            ("Index used", ", ".join(summary['indexes']) or "none"),
+            ("Returned", summary['n_returned']),
+            ("Docs examined", summary['docs_examined']),
+            ("Keys examined", summary['keys_examined']),
+            ("Examined/returned", summary['examined_per_returned']),
+            ("Execution time", f"{summary['execution_ms']} ms" if summary['execution_ms'] is not None else "n/a")]
+    print("\n EXPLAIN")
+    for label, value in rows:
+        print(f"  {label:<18} {value}")
+    if summary['collscan']:
+        print("  ⚠ COLLSCAN: no index supports this filter")
+    if summary['in_memory_sort']:
+        print("  ⚠ In-memory SORT: no index provides this sort order")
+    if summary['examined_per_returned'] > EXPLAIN_RATIO_WARNING:
+        print(f"  ⚠ Examines {summary['examined_per_returned']} docs per result; "
+              "consider a more selective index")
+
+
+# Aggregation stages and operators accepted by pipeline validation
+PIPELINE_STAGES = frozenset({
+    '$addFields', '$bucket', '$bucketAuto', '$changeStream', '$collStats', '$count', '$currentOp',
+    '$densify', '$documents', '$facet', '$fill', '$geoNear', '$graphLookup', '$group', '$indexStats',
+    '$limit', '$listSearchIndexes', '$listSessions', '$lookup', '$match', '$merge', '$out',
+    '$planCacheStats', '$project', '$redact', '$replaceRoot', '$replaceWith', '$sample', '$search',
+    '$searchMeta', '$set', '$setWindowFields', '$skip', '$sort', '$sortByCount', '$unionWith',
+    '$unset', '$unwind', '$vectorSearch'})
+PIPELINE_OPERATORS = frozenset({
+    # Query
+    '$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$in', '$nin', '$and', '$or', '$nor', '$not',
+    '$exists', '$type', '$expr', '$jsonSchema', '$mod', '$regex', '$options', '$text', '$search',
+    '$language', '$caseSensitive', '$diacriticSensitive', '$where', '$geoIntersects', '$geoWithin',
+    '$near', '$nearSphere', '$box', '$center', '$centerSphere', '$geometry', '$maxDistance',
+    '$minDistance', '$polygon', '$all', '$elemMatch', '$size', '$bitsAllClear', '$bitsAllSet',
+    '$bitsAnyClear', '$bitsAnySet', '$comment', '$meta', '$slice', '$rand', '$sampleRate',
+    # Accumulators and window functions
+    '$sum', '$avg', '$min', '$max', '$first', '$last', '$push', '$addToSet', '$count', '$stdDevPop',
+    '$stdDevSamp', '$mergeObjects', '$top', '$bottom', '$topN', '$bottomN', '$firstN', '$lastN',
+    '$maxN', '$minN', '$median', '$percentile', '$accumulator', '$function', '$documentNumber',
+    '$rank', '$denseRank', '$shift', '$derivative', '$integral', '$expMovingAvg', '$covariancePop',
+    '$covarianceSamp', '$linearFill', '$locf',
+    # Expressions
+    '$abs', '$add', '$ceil', '$divide', '$exp', '$floor', '$ln', '$log', '$log10', '$multiply', '$pow',
+    '$round', '$sqrt', '$subtract', '$trunc', '$arrayElemAt', '$arrayToObject', '$concatArrays',
+    '$filter', '$indexOfArray', '$isArray', '$map', '$objectToArray', '$range', '$reduce',
+    '$reverseArray', '$sortArray', '$zip', '$cmp', '$cond', '$ifNull', '$switch', '$dateAdd',
+    '$dateDiff', '$dateFromParts', '$dateFromString', '$dateSubtract', '$dateToParts',
+    '$dateToString', '$dateTrunc', '$dayOfMonth', '$dayOfWeek', '$dayOfYear', '$hour',
+    '$isoDayOfWeek', '$isoWeek', '$isoWeekYear', '$millisecond', '$minute', '$month', '$second',
+    '$week', '$year', '$literal', '$getField', '$setField', '$unsetField', '$let', '$toBool',
+    '$toDate', '$toDecimal', '$toDouble', '$toInt', '$toLong', '$toObjectId', '$toString',
+    '$convert', '$isNumber', '$toLower', '$toUpper', '$concat', '$indexOfBytes', '$indexOfCP',
+    '$ltrim', '$rtrim', '$trim', '$regexFind', '$regexFindAll', '$regexMatch', '$replaceOne',
+    '$replaceAll', '$split', '$strLenBytes', '$strLenCP', '$strcasecmp', '$substr', '$substrBytes',
+    '$substrCP', '$setDifference', '$setEquals', '$setIntersection', '$setIsSubset', '$setUnion',
+    '$anyElementTrue', '$allElementsTrue', '$binarySize', '$bsonSize', '$tsIncrement', '$tsSecond',
+    '$toHashedIndexKey', '$sin', '$cos', '$tan', '$asin', '$acos', '$atan', '$atan2', '$asinh',
+    '$acosh', '$atanh', '$sinh', '$cosh', '$tanh', '$degreesToRadians', '$radiansToDegrees',
+    '$bitAnd', '$bitOr', '$bitXor', '$bitNot'})
+# Stages emitting exactly one document per input document, which a $limit may move ahead of
+ONE_TO_ONE_STAGES = frozenset({'$project', '$addFields', '$set', '$unset', '$lookup',
+                               '$replaceRoot', '$replaceWith'})
+# Stages after which documents no longer come straight from the collection's indexes
+BLOCKING_STAGES = frozenset({'$group', '$bucket', '$bucketAuto', '$facet', '$unwind', '$project',
+                             '$addFields', '$set', '$unset', '$replaceRoot', '$replaceWith',
+                             '$lookup', '$graphLookup', '$unionWith', '$sortByCount', '$sample',
+                             '$setWindowFields', '$densify', '$fill', '$redact', '$count'})
+
+
+def filter_fields(query: Any) -> Optional[set]:
+    """
+    Field paths a filter reads, or None when they cannot be determined
+    statically ($expr, $where, $text, ...)
+    """
+    fields = set()
+    for key, value in (query or {}).items():
+        if key in ('$and', '$or', '$nor'):
+            for clause in value:
+                nested = filter_fields(clause)
+                if nested is None:
+                    return None
+                fields |= nested
+        elif key.startswith('$'):
+            return None
+        else:
+            fields.add(key)
+    return fields
+
+
+def paths_overlap(path: str, other: str) -> bool:
+    """Whether two dotted paths refer to the same field or one contains the other"""
+    return path == other or path.startswith(other + '.') or other.startswith(path + '.')
+
+
+def match_passes(stage: Dict[str, Any], fields: set) -> bool:
+    """Whether a $match reading only the given fields can move before this stage unchanged"""
+    (name, body), = stage.items()
+    if name == '$sort':
+        return True
+    if name == '$project' and isinstance(body, dict):
+        if any(value not in (0, 1, True, False) for value in body.values()):
+            return False
+        included = [field for field, value in body.items() if value in (1, True)]
+        excluded = [field for field, value in body.items() if value in (0, False)]
+        if included:
+            # Inclusion (even {_id: 1} alone): every field read must survive the projection
+            # whole, otherwise a null or $exists: false test would match documents it dropped
+            if [field for field in excluded if field != '_id']:
+                return False
+            if '_id' not in excluded:
+                included.append('_id')
+            return all(any(path == field or path.startswith(field + '.') for field in included)
+                       for path in fields)
+        return not any(paths_overlap(path, field) for path in fields for field in excluded)
+    if name in ('$addFields', '$set') and isinstance(body, dict):
+        # Setting a subfield can replace a scalar parent, so compare whole top-level fields
+        return not ({path.split('.', 1)[0] for path in fields} & {field.split('.', 1)[0] for field in body})
+    if name == '$unset':
+        unset = [body] if isinstance(body, str) else body
+        return not any(paths_overlap(path, field) for path in fields for field in unset)
+    if name == '$lookup' and isinstance(body, dict):
+        return not any(paths_overlap(path, body.get('as', '')) for path in fields)
+    return False
+
+
+def merge_projections(first: Any, second: Any) -> Optional[Dict[str, Any]]:
+    """Combine two consecutive plain inclusion or exclusion projections, or None if unsafe"""
+    if not isinstance(first, dict) or not isinstance(second, dict):
+        return None
+    if any(value not in (0, 1, True, False) for value in list(first.values()) + list(second.values())):
+        return None
+    
+    def split(projection):
+        included = {field for field, value in projection.items() if value in (1, True)}
+        excluded = {field for field, value in projection.items() if value in (0, False)}
+        return included, excluded
+    
+    first_in, first_out = split(first)
+    second_in, second_out = split(second)
+    if not first_in and not second_in:
+        # Two exclusions: drop both sets of fields
+        return {field: 0 for field in list(first_out) + [f for f in second_out if f not in first_out]}
+    if first_in and second_in and first_out <= {'_id'} and second_out <= {'_id'}:
+        # Two inclusions (_id is kept unless excluded): fields kept by both
+        first_kept = first_in | ({'_id'} - first_out)
+        second_kept = [field for field in second if field in second_in]
+        if '_id' not in second_out and '_id' not in second_kept:
+            second_kept.append('_id')
+        fields = []
+        for field in second_kept:
+            if any(field == kept or field.startswith(kept + '.') for kept in first_kept):
+                fields.append(field)
+            elif any(kept.startswith(field + '.') for kept in first_kept):
+                # The first projection keeps only part of this field; leave both stages
+                return None
+        if not fields:
+            return None
+        merged = {field: 1 for field in fields}
+        if '_id' not in fields:
+            merged['_id'] = 0
+        return merged
+    return None
+
+
+def optimize_pipeline(pipeline: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Rewrite a pipeline so it does less work without changing its results
+    
+    Rules, applied until nothing changes:
+        - $match moves ahead of $sort, and ahead of $project, $addFields/$set,
+          $unset and $lookup that don't produce the fields it reads
+        - adjacent $match stages are combined
+        - adjacent inclusion (or exclusion) $project stages are combined
+        - a $limit separated from its $sort by one-to-one stages moves up
+          next to the $sort, so the server can do a top-k sort
+        - adjacent $limit stages keep the smaller, adjacent $skip stages add up
+    
+    Returns:
+        Tuple of (optimized copy of the pipeline, descriptions of each rewrite)
+    """
+    stages = copy.deepcopy(pipeline)
+    notes = []
+    changed = True
+    while changed:
+        changed = False
+        for i in range(1, len(stages)):
+            previous, stage = stages[i - 1], stages[i]
+            if len(previous) != 1 or len(stage) != 1:
+                continue
+            (previous_name, previous_body), = previous.items()
+            (name, body), = stage.items()
+            
+            if name == '$match' and previous_name == '$match':
+                stages[i - 1:i + 1] = [{"$match": merge_filter(copy.deepcopy(previous_body), body)}]
+                notes.append(f"Combined the $match stages at positions {i} and {i + 1}")
+            elif name == '$match':
+                fields = filter_fields(body)
+                if fields is None and previous_name != '$sort':
+                    continue
+                if not match_passes(previous, fields or set()):
+                    continue
+                stages[i - 1], stages[i] = stage, previous
+                notes.append(f"Moved $match ahead of {previous_name} (position {i + 1} -> {i})")
+            elif name == previous_name == '$project':
+                merged = merge_projections(previous_body, body)
+                if merged is None:
+                    continue
+                stages[i - 1:i + 1] = [{"$project": merged}]
+                notes.append(f"Combined the $project stages at positions {i} and {i + 1}")
+            elif name == previous_name == '$limit':
+                stages[i - 1:i + 1] = [{"$limit": min(previous_body, body)}]
+                notes.append(f"Combined the $limit stages at positions {i} and {i + 1}")
+            elif name == previous_name == '$skip':
+                stages[i - 1:i + 1] = [{"$skip": previous_body + body}]
+                notes.append(f"Combined the $skip stages at positions {i} and {i + 1}")
+            elif name == '$limit' and previous_name in ONE_TO_ONE_STAGES and any(
+                    '$sort' in earlier for earlier in stages[:i - 1]):
+                # Walk back over one-to-one stages to the $sort this $limit belongs to
+                j = i - 1
+                while j > 0 and len(stages[j]) == 1 and next(iter(stages[j])) in ONE_TO_ONE_STAGES:
+                    j -= 1
+                if '$sort' not in stages[j]:
+                    continue
+                stages.insert(j + 1, stages.pop(i))
+                notes.append(f"Moved $limit next to $sort (position {i + 1} -> {j + 2}) for a top-k sort")
+            else:
+                continue
+            changed = True
+            break
+    return stages, notes
+
+
+def diff_pipelines(before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> str:
+    """Unified diff of two pipelines, one stage per line"""
+    import difflib
+    return "\n".join(difflib.unified_diff([json_util.dumps(stage) for stage in before],
+                                         [json_util.dumps(stage) for stage in after],
+                                         "before", "after", lineterm=""))
+
+
+class PipelineLibrary:
+    """
+    Named aggregation pipelines saved to a local Extended JSON file
+    
+    Pipelines may contain {"$param": "name"} placeholders, replaced by
+    values supplied when the pipeline is loaded.
+    """
+    
+    def __init__(self, path: str = DEFAULT_PIPELINE_LIBRARY):
+        self.path = os.path.expanduser(path)
+    
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Read every saved entry (an empty library if the file does not exist)"""
+        try:
+            with open(self.path, encoding='utf-8') as handle:
+                return json_util.loads(handle.read())
+        except FileNotFoundError:
+            return {}
+    
+    def save(self, name: str, pipeline: List[Dict[str, Any]], description: str = "",
+             collection: Optional[str] = None):
+        """Store a pipeline under a name, replacing any previous entry"""
+        entries = self.load()
+        entries[name] = {"pipeline": pipeline, "description": description, "collection": collection,
+                         "saved": datetime.now().isoformat(timespec='seconds')}
+        self.write(entries)
+    
+    def delete(self, name: str) -> bool:
+        """Remove a saved pipeline; returns whether it existed"""
+        entries = self.load()
+        if entries.pop(name, None) is None:
+            return False
+        self.write(entries)
+        return True
+    
+    def write(self, entries: Dict[str, Dict[str, Any]]):
+        """Replace the library file, via a sibling file so a crash never truncates it"""
+        partial = self.path + ".tmp"
+        with open(partial, 'w', encoding='utf-8') as handle:
+            handle.write(json_util.dumps(entries, indent=2))
+        os.replace(partial, self.path)
+    
+    def get(self, name: str) -> Dict[str, Any]:
+        """Return a saved entry, raising KeyError with the available names"""
+        entries = self.load()
+        if name not in entries:
+            raise KeyError(f"No saved pipeline '{name}' (available: {', '.join(sorted(entries)) or 'none'})")
+        return entries[name]
+    
+    @staticmethod
+    def parameters(value: Any) -> List[str]:
+        """Names of the $param placeholders in a pipeline, in order of appearance"""
+        found = []
+        
+        def visit(item: Any):
+            if isinstance(item, dict):
+                if set(item) == {'$param'}:
+                    if item['$param'] not in found:
+                        found.append(item['$param'])
+                    return
+                for child in item.values():
+                    visit(child)
+            elif isinstance(item, list):
+                for child in item:
+                    visit(child)
+        
+        visit(value)
+        return found
+    
+    @classmethod
+    def substitute(cls, value: Any, params: Dict[str, Any]) -> Any:
+        """
+        Replace {"$param": "name"} placeholders with values
+        
+        Raises:
+            ValueError: A placeholder has no value
+        """
+        missing = [name for name in cls.parameters(value) if name not in params]
+        if missing:
+            raise ValueError(f"Missing pipeline parameter(s): {', '.join(missing)}")
+        
+        def replace(item: Any) -> Any:
+            if isinstance(item, dict):
+                if set(item) == {'$param'}:
+                    return copy.deepcopy(params[item['$param']])
+                return {key: replace(child) for key, child in item.items()}
+            if isinstance(item, list):
+                return [replace(child) for child in item]
+            return item
+        return replace(value)
+
+
+def validate_pipeline(pipeline: List[Dict[str, Any]],
+                      collection: Optional[Collection] = None) -> List[Tuple[str, str]]:
+    """
+    Check a pipeline for mistakes before it is sent to the server
+    
+    Structural problems (malformed stages, unknown stages, $out/$merge not
+    last, unresolved $param) are errors. Unknown operators, a $match that
+    is not the first stage, and - when a collection is given - a $sort no
+    index supports or a $lookup on an unindexed foreignField are warnings.
+    
+    Returns:
+        List of ("error" | "warning", message) tuples, empty when clean
+    """
+    issues = []
+    indexes = None
+    
+    def index_keys(target: Collection) -> List[List[Tuple[str, Any]]]:
+        try:
+            return [IndexAdvisor.index_fields(index['key']) for index in target.list_indexes()]
+        except Exception:
+            return []
+    
+    def unknown_operators(value: Any, found: set):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if key.startswith('$') and key not in PIPELINE_OPERATORS:
+                    found.add(key)
+                if key != '$literal':
+                    unknown_operators(child, found)
+        elif isinstance(value, list):
+            for child in value:
+                unknown_operators(child, found)
+    
+    leading_match: Dict[str, Any] = {}
+    index_order = True
+    warned_match = False
+    for position, stage in enumerate(pipeline, 1):
+        if not isinstance(stage, dict) or len(stage) != 1:
+            issues.append(("error", f"Stage {position} must be a document with exactly one $stage key"))
+            continue
+        name, body = next(iter(stage.items()))
+        if name not in PIPELINE_STAGES:
+            issues.append(("error", f"Stage {position}: unknown stage {name}"))
+            continue
+        if PipelineLibrary.parameters(body):
+            issues.append(("error", f"Stage {position}: unresolved parameter(s) "
+                                    f"{', '.join(PipelineLibrary.parameters(body))}"))
+        if name in ('$out', '$merge') and position != len(pipeline):
+            issues.append(("error", f"Stage {position}: {name} must be the last stage"))
+        
+        found = set()
+        unknown_operators(body, found)
+        for operator in sorted(found):
+            issues.append(("warning", f"Stage {position} ({name}): unknown operator {operator}"))
+        
+        if name == '$match':
+            if position > 1 and '$match' not in pipeline[0] and not warned_match:
+                warned_match = True
+                issues.append(("warning", f"Stage {position}: $match is not the first stage, so earlier "
+                                          "stages process every document; move it forward if possible"))
+            if index_order and isinstance(body, dict):
+                merge_filter(leading_match, copy.deepcopy(body))
+        elif name == '$sort':
+            if index_order and collection is not None and isinstance(body, dict):
+                indexes = index_keys(collection) if indexes is None else indexes
+                equality, sort_keys, _ = IndexAdvisor.shape_of(leading_match, list(body.items()))
+                if sort_keys and not any(IndexAdvisor.serves(fields[:len(equality) + len(sort_keys)],
+                                                             (equality, sort_keys, ()))
+                                         for fields in indexes):
+                    issues.append(("warning", f"Stage {position}: no index supports this $sort; "
+                                              "it will sort in memory (100 MB limit without allowDiskUse)"))
+            index_order = False
+        elif name == '$lookup' and collection is not None and isinstance(body, dict):
+            foreign = body.get('foreignField')
+            if foreign and foreign != '_id' and body.get('from'):
+                foreign_indexes = index_keys(collection.database[body['from']])
+                if not any(fields and fields[0][0] == foreign for fields in foreign_indexes):
+                    issues.append(("warning", f"Stage {position}: {body['from']}.{foreign} is not indexed; "
+                                              "each input document scans the whole foreign collection"))
+        
+        if name in BLOCKING_STAGES or name in ('$skip', '$limit', '$sample'):
+            index_order = False
+    return issues
+
+
+class ChangeStreamWatcher:
+    """Tails a change stream with resume-token persistence and optional cache invalidation"""
+    
+    def __init__(self, target: Union[Collection, Database], resume_file: Optional[str] = None,
+                 pipeline: Optional[List[Dict[str, Any]]] = None, full_document: bool = False,
+                 cache: Optional[QueryCache] = None):
+        """
+        Initialize watcher
+        
+        Args:
+            target: Collection or Database to watch
+            resume_file: File holding the last resume token; resumed from when present
+            pipeline: Extra change stream stages (e.g. a $match on operationType)
+            full_document: Include the current document for update events
+            cache: QueryCache to invalidate for each changed namespace
+        """
+        self.target = target
+        self.resume_file = resume_file
+        self.pipeline = pipeline or []
+        self.full_document = full_document
+        self.cache = cache
+        self.resume_token = self.load_resume_token()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.events_seen = 0
+        self.failure: Optional[Exception] = None
+    
+    def load_resume_token(self) -> Optional[Dict[str, Any]]:
+        """Read a saved resume token, if any"""
+        if not self.resume_file:
+            return None
+        try:
+            with open(self.resume_file, encoding='utf-8') as handle:
+                return json_util.loads(handle.read())
+        except FileNotFoundError:
+            return None
+    
+    def save_resume_token(self):
+        """Persist the current resume token atomically"""
+        if not self.resume_file or self.resume_token is None:
+            return
+        temp_path = self.resume_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as handle:
+            handle.write(json_util.dumps(self.resume_token))
+        os.replace(temp_path, self.resume_file)
+    
+    def invalidate(self, change: Dict[str, Any]):
+        """Drop cached reads affected by a change event"""
+        if not self.cache:
+            return
+        ns = change.get('ns') or {}
+        if change.get('operationType') in ('dropDatabase', 'invalidate') or 'coll' not in ns:
+            self.cache.invalidate(None)
+        else:
+            self.cache.invalidate(f"{ns['db']}.{ns['coll']}")
+    
+    def events(self, max_events: int = 0, max_seconds: float = 0):
+        """
+        Yield change events until stopped, Ctrl+C, or a limit is reached
+        
+        The resume token is saved at most once per RESUME_SAVE_INTERVAL
+        seconds and when the stream ends, so a restart may replay the last
+        few events (at-least-once delivery).
+        
+        Args:
+            max_events: Stop after this many events (0 for no limit)
+            max_seconds: Stop after this many seconds (0 for no limit)
+        """
+        options = {"max_await_time_ms": 1000}
+        if self.full_document:
+            options["full_document"] = 'updateLookup'
+        if self.resume_token is not None:
+            options["resume_after"] = self.resume_token
+        
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+        last_save = time.monotonic()
+        count = 0
+        try:
+            with self.target.watch(self.pipeline, **options) as stream:
+                while stream.alive and not self.stop_event.is_set():
+                    if deadline and time.monotonic() >= deadline:
+                        break
+                    change = stream.try_next()
+                    # Token advances even on empty batches (postBatchResumeToken)
+                    if stream.resume_token is not None:
+                        self.resume_token = stream.resume_token
+                    if change is None:
+                        continue
+                    self.invalidate(change)
+                    count += 1
+                    self.events_seen += 1
+                    yield change
+                    if time.monotonic() - last_save >= RESUME_SAVE_INTERVAL:
+                        self.save_resume_token()
+                        last_save = time.monotonic()
+                    if max_events and count >= max_events:
+                        break
+        finally:
+            self.save_resume_token()
+    
+    @staticmethod
+    def is_transient(error: Exception) -> bool:
+        """Whether reopening the stream may succeed (network trouble, elections, resumable errors)"""
+        return isinstance(error, errors.ConnectionFailure) or (
+            isinstance(error, errors.PyMongoError) and error.has_error_label('ResumableChangeStreamError'))
+    
+    def start_background(self):
+        """
+        Consume the stream in a daemon thread, only invalidating the cache
+        
+        Transient errors reopen the stream with exponential backoff (up to
+        WATCH_MAX_BACKOFF seconds). Any other error, such as change streams
+        being unsupported on a standalone server, stops the watcher for good
+        and clears the cache, since other clients' writes are no longer seen.
+        """
+        def run():
+            delay = 1.0
+            while not self.stop_event.is_set():
+                seen = self.events_seen
+                try:
+                    for _ in self.events():
+                        pass
+                except errors.PyMongoError as e:
+                    if not self.is_transient(e):
+                        self.failure = e
+                        if self.cache:
+                            self.cache.invalidate(None)
+                        self.cache = None
+                        print(f"\n⚠ Change stream stopped, writes from other clients will not invalidate "
+                              f"the cache: {e}", file=sys.stderr)
+                        return
+                    if self.events_seen > seen:
+                        delay = 1.0
+                    print(f"\n⚠ Change stream error, retrying in {delay:g}s: {e}", file=sys.stderr)
+                    self.stop_event.wait(delay)
+                    delay = min(delay * 2, WATCH_MAX_BACKOFF)
+        
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Stop a background watcher"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+
+class MongoDBImporter:
+    """Streaming file importer that loads documents in chunked insert_many calls"""
+    
+    FORMATS = ('jsonl', 'extjson', 'json', 'csv', 'bson')
+    
+    # Converters for declared CSV column types
+    SCHEMA_TYPES = VALUE_CONVERTERS
+    
+    # Write error codes that will fail again if retried (duplicate key, validation)
+    PERMANENT_ERROR_CODES = {11000, 11001, 12582, 121}
+    
+    def __init__(self, collection: Collection, batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+                 ordered: bool = False, workers: int = 1, max_in_flight: Optional[int] = None,
+                 max_retries: int = 3, retry_backoff: float = 0.5,
+                 throttle: Optional[WriteThrottle] = None):
+        """
+        Initialize importer
+        
+        Args:
+            collection: Target collection
+            batch_size: Documents sent per insert_many call
+            ordered: Stop each batch at its first write error
+            workers: Threads issuing insert_many calls over the shared client pool
+            max_in_flight: Batches read ahead of the server (default: 2 per worker)
+            max_retries: Retries per batch for transient BulkWriteError failures
+            retry_backoff: Initial retry delay in seconds, doubled on each attempt
+            throttle: Write rate limit applied to every insert_many call
+        """
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.ordered = ordered
+        self.workers = max(1, workers)
+        self.max_in_flight = max(self.workers, max_in_flight or self.workers * 2)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.throttle = throttle or WriteThrottle()
+    
+    @classmethod
+    def detect_format(cls, path: str) -> str:
+        """
+        Guess the import format from a file extension (ignoring .gz)
+        
+        A .json file is sniffed: an array if its first non-blank character is '[',
+        otherwise one document per line (mongoexport's default output)
+        """
+        name = path.lower()
+        if name.endswith('.gz'):
+            name = name[:-3]
+        if name.endswith('.csv'):
+            return 'csv'
+        if name.endswith('.json'):
+            return 'json' if cls.first_character(path) == '[' else 'jsonl'
+        if name.endswith('.bson'):
+            return 'bson'
+        return 'jsonl'
+    
+    @classmethod
+    def first_character(cls, path: str) -> str:
+        """First non-whitespace character of a text file, or '' if blank or unreadable"""
+        try:
+            with cls.open_text(path) as handle:
+                while True:
+                    chunk = handle.read(4096)
+                    if not chunk:
+                        return ''
+                    chunk = chunk.lstrip()
+                    if chunk:
+                        return chunk[0]
+        except (OSError, UnicodeDecodeError):
+            return ''
+    
+    @staticmethod
+    def open_text(path: str):
+        """Open a plain or gzip-compressed text file for reading"""
+        if path.lower().endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8', newline='')
+        return open(path, 'r', encoding='utf-8', newline='')
+    
+    @staticmethod
+    def set_path(document: Dict[str, Any], field: str, value: Any):
+        """Set a dotted CSV header such as 'address.city' as a nested field"""
+        *parents, leaf = field.split('.')
+        for part in parents:
+            document = document.setdefault(part, {})
+        document[leaf] = value
+    
+    def iter_documents(self, path: str, fmt: Optional[str] = None,
+                       schema: Optional[Dict[str, str]] = None, ignore_blanks: bool = True):
+        """
+        Lazily yield documents from an import file
+        
+        Args:
+            path: File to read (.gz files are decompressed on the fly)
+            fmt: One of jsonl, extjson, json (array), csv or bson; detected from extension if omitted
+            schema: Optional CSV column -> type name mapping (see SCHEMA_TYPES)
+            ignore_blanks: Skip empty CSV cells instead of storing empty strings
+            
+        Yields:
+            Documents ready for insertion
+        """
+        fmt = fmt or self.detect_format(path)
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported import format: {fmt}")
+        if fmt == 'bson':
+            yield from self.iter_bson(path)
+            return
+        
+        with self.open_text(path) as handle:
+            if fmt == 'csv':
+                yield from self.iter_csv(handle, schema or {}, ignore_blanks)
+            elif fmt == 'json':
+                yield from self.iter_json_array(handle)
+            else:
+                for line in handle:
+                    line = line.strip()
+                    if line:
+                        yield json_util.loads(line)
+    
+    def iter_csv(self, handle, schema: Dict[str, str], ignore_blanks: bool):
+        """Yield documents from CSV rows, converting cells by schema or parse_value"""
+        reader = csv.DictReader(handle)
+        converters = {}
+        for field in reader.fieldnames or []:
+            type_name = schema.get(field, 'auto').lower()
+            if type_name not in self.SCHEMA_TYPES:
+                raise ValueError(f"Unknown type '{type_name}' for column '{field}'")
+            converters[field] = self.SCHEMA_TYPES[type_name]
+        
+        for row in reader:
+            document = {}
+            for field, value in row.items():
+                if field is None or value is None:
+                    continue
+                if ignore_blanks and not value.strip():
+                    continue
+                self.set_path(document, field, converters[field](value))
+            if document:
+                yield document
+    
+    @staticmethod
+    def iter_bson(path: str):
+        """
+        Yield RawBSONDocuments from a concatenated BSON file (mongodump, bson export)
+        
+        Each document's bytes are passed to insert_many untouched.
+        """
+        opener = gzip.open if path.lower().endswith('.gz') else open
+        with opener(path, 'rb') as raw, io.BufferedReader(raw, buffer_size=EXPORT_BUFFER_SIZE) as handle:
+            while True:
+                prefix = handle.read(4)
+                if not prefix:
+                    return
+                size = int.from_bytes(prefix, 'little')
+                body = handle.read(size - 4) if len(prefix) == 4 and size > 4 else b''
+                if len(body) != size - 4:
+                    raise ValueError(f"Truncated BSON document in {path}")
+                yield RawBSONDocument(prefix + body)
+    
+    @staticmethod
+    def iter_json_array(handle, chunk_size: int = 1 << 16):
+        """Yield elements of a top-level JSON array (mongoexport --jsonArray) incrementally"""
+        decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+        buffer = ''
+        started = False
+        eof = False
+        
+        while True:
+            if not eof and len(buffer) < chunk_size:
+                chunk = handle.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+            
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    if eof:
+                        return
+                    continue
+                if buffer[0] != '[':
+                    raise ValueError("JSON import file must contain a top-level array")
+                buffer = buffer[1:]
+                started = True
+                continue
+            
+            if buffer.startswith(','):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith(']'):
+                return
+            if not buffer:
+                if eof:
+                    raise ValueError("Unexpected end of JSON array")
+                continue
+            
+            try:
+                document, end = decoder.raw_decode(buffer)
+                complete = eof or end < len(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # Element may span the chunk boundary; read more
+                chunk = handle.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            buffer = buffer[end:]
+            yield document
+    
+    @staticmethod
+    def iter_batches(documents, batch_size: int):
+        """Group an iterable of documents into lists of at most batch_size"""
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def retryable_documents(self, pending: List[Dict[str, Any]],
+                            details: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Select documents from a failed insert_many worth sending again
+        
+        Ordered batches stop at the first error, so everything from that index
+        on is resent unless the error is permanent. Unordered batches resend
+        only the individual documents that hit transient errors.
+        """
+        write_errors = details.get('writeErrors', [])
+        if not write_errors:
+            return []
+        
+        if self.ordered:
+            first = min(write_errors, key=lambda err: err['index'])
+            if first.get('code') in self.PERMANENT_ERROR_CODES:
+                return []
+            return pending[first['index']:]
+        
+        return [pending[err['index']] for err in write_errors
+                if err.get('code') not in self.PERMANENT_ERROR_CODES]
+    
+    def insert_batch(self, batch: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Insert one batch, retrying transient write errors with backoff
+        
+        Returns:
+            Tuple of (inserted count, failed count)
+        """
+        pending = batch
+        inserted = 0
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.throttle.write(self.collection, pending):
+                    result = self.collection.insert_many(pending, ordered=self.ordered)
+                inserted += len(result.inserted_ids)
+                break
+            except errors.BulkWriteError as e:
+                inserted += e.details.get('nInserted', 0)
+                pending = self.retryable_documents(pending, e.details)
+                if not pending or attempt == self.max_retries:
+                    break
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        return inserted, len(batch) - inserted
+    
+    def import_documents(self, documents, progress: bool = True) -> Dict[str, Any]:
+        """
+        Insert documents from any iterable in chunked insert_many calls
+        
+        Batches are handed to a thread pool; at most max_in_flight batches
+        are outstanding, so reading the source pauses while the server
+        catches up and memory stays bounded.
+        
+        Args:
+            documents: Iterable of documents (consumed lazily)
+            progress: Print a docs/sec line after each batch
+            
+        Returns:
+            Dictionary with inserted, failed, batches, elapsed and docs_per_sec
+        """
+        totals = {"inserted": 0, "failed": 0, "batches": 0}
+        started = time.perf_counter()
+        
+        def record(future):
+            ok, bad = future.result()
+            totals["inserted"] += ok
+            totals["failed"] += bad
+            totals["batches"] += 1
+            if progress:
+                elapsed = time.perf_counter() - started
+                rate = totals["inserted"] / elapsed if elapsed > 0 else 0.0
+                print(f"\r  {totals['inserted']} inserted, {totals['failed']} failed "
+                      f"({rate:.0f} docs/sec)", end='', file=sys.stderr, flush=True)
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = set()
+            try:
+                for batch in self.iter_batches(documents, self.batch_size):
+                    if len(in_flight) >= self.max_in_flight:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            record(future)
+                    in_flight.add(pool.submit(self.insert_batch, batch))
+            finally:
+                # Let batches already sent finish (or fail) before returning
+                for future in as_completed(in_flight):
+                    record(future)
+        
+        elapsed = time.perf_counter() - started
+        if progress and totals["batches"]:
+            print(file=sys.stderr)
+        return {"inserted": totals["inserted"],
+                "failed": totals["failed"],
+                "batches": totals["batches"],
+                "elapsed": round(elapsed, 3),
+                "docs_per_sec": round(totals["inserted"] / elapsed, 1) if elapsed > 0 else 0.0}
+    
+    def import_file(self, path: str, fmt: Optional[str] = None,
+                    schema: Optional[Dict[str, str]] = None,
+                    ignore_blanks: bool = True, progress: bool = True) -> Dict[str, Any]:
+        """Stream a JSONL, Extended JSON, JSON array, CSV or BSON file into the collection"""
+        return self.import_documents(self.iter_documents(path, fmt, schema, ignore_blanks),
+                                     progress=progress)
+
+
+def copy_collection(source: Collection, target: Collection, query: Optional[Dict[str, Any]] = None,
+                    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE, workers: int = 1,
+                    progress: bool = True, throttle: Optional[WriteThrottle] = None) -> Dict[str, Any]:
+    """
+    Copy matching documents between collections without decoding them
+    
+    Documents are read as RawBSONDocument and their bytes are inserted
+    as-is through MongoDBImporter's batching and retry logic.
+    
+    Returns:
+        Import statistics (inserted, failed, batches, elapsed, docs_per_sec)
+    """
+    cursor = raw_collection(source).find(query or {}, batch_size=batch_size)
+    try:
+        importer = MongoDBImporter(target, batch_size=batch_size, workers=workers, throttle=throttle)
+        return importer.import_documents(cursor, progress=progress)
+    finally:
+        cursor.close()
+
+
+class ChunkedWriter:
+    """
+    Resumable update_many/delete_many that walks matching _ids in ascending chunks
+    
+    Each chunk is applied with one bulk_write call whose filter is the original
+    query restricted to the chunk's _ids, so documents changed by other clients
+    in the meantime are re-checked. The last _id written is checkpointed after
+    every chunk. Every _id in the collection must share one BSON type, because
+    the walk uses $gt comparisons.
+    """
+    
+    def __init__(self, collection: Collection, query: Optional[Dict[str, Any]] = None,
+                 update: Optional[Any] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_rate: float = 0.0, max_lag: float = 0.0, checkpoint_file: Optional[str] = None,
+                 throttle: Optional[WriteThrottle] = None):
+        """
+        Initialize writer
+        
+        Args:
+            collection: Target collection
+            query: Filter selecting the documents to change
+            update: Update document or pipeline (None deletes the documents)
+            chunk_size: Documents per bulk_write call
+            max_rate: Documents per second ceiling (0 for unlimited)
+            max_lag: Pause while a secondary lags the primary by more seconds than this (0 to ignore)
+            checkpoint_file: File holding progress; resumed from when present
+            throttle: Shared write rate limit applied to every chunk
+        """
+        self.collection = collection
+        self.query = query or {}
+        self.update = update
+        self.op = 'delete' if update is None else 'update'
+        self.chunk_size = max(1, chunk_size)
+        self.max_rate = max_rate
+        self.max_lag = max_lag
+        self.checkpoint_file = checkpoint_file
+        self.throttle = throttle or WriteThrottle()
+        self.lag_unavailable = False
+        self.resumed = False
+        self.state = self.load_checkpoint()
+    
+    def job(self) -> Dict[str, Any]:
+        """Description of the work, used to match a checkpoint to the job that wrote it"""
+        return {"namespace": self.collection.full_name, "op": self.op,
+                "filter": self.query, "update": self.update}
+    
+    @staticmethod
+    def fresh_state() -> Dict[str, Any]:
+        return {"last_id": None, "chunks": 0, "matched": 0, "modified": 0, "deleted": 0}
+    
+    def load_checkpoint(self) -> Dict[str, Any]:
+        """
+        Read saved progress, if any
+        
+        Raises:
+            ValueError: The checkpoint belongs to a different job
+        """
+        if not self.checkpoint_file:
+            return self.fresh_state()
+        try:
+            with open(self.checkpoint_file, encoding='utf-8') as handle:
+                saved = json_util.loads(handle.read())
+        except FileNotFoundError:
+            return self.fresh_state()
+        if json_util.dumps(saved.get('job')) != json_util.dumps(self.job()):
+            raise ValueError(f"Checkpoint {self.checkpoint_file} was written by a different "
+                             f"job ({saved.get('job', {}).get('op')} on {saved.get('job', {}).get('namespace')})")
+        self.resumed = True
+        return saved['state']
+    
+    def save_checkpoint(self):
+        """Persist progress atomically"""
+        if not self.checkpoint_file:
+            return
+        temp_path = self.checkpoint_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as handle:
+            handle.write(json_util.dumps({"job": self.job(), "state": self.state}))
+        os.replace(temp_path, self.checkpoint_file)
+    
+    def reset(self):
+        """Discard saved progress and start from the first matching _id"""
+        self.state = self.fresh_state()
+        self.resumed = False
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+    
+    def replication_lag(self) -> Optional[float]:
+        """Seconds the furthest secondary trails the primary, or None when it cannot be read"""
+        try:
+            status = self.collection.database.client.admin.command('replSetGetStatus')
+        except errors.PyMongoError:
+            return None
+        members = status.get('members', [])
+        primary = next((m['optimeDate'] for m in members if m.get('stateStr') == 'PRIMARY'), None)
+        secondaries = [m['optimeDate'] for m in members if m.get('stateStr') == 'SECONDARY']
+        if primary is None or not secondaries:
+            return 0.0
+        return max((primary - optime).total_seconds() for optime in secondaries)
+    
+    def wait_for_lag(self, progress: bool = True):
+        """Block while replication lag is above max_lag"""
+        if not self.max_lag or self.lag_unavailable:
+            return
+        while True:
+            lag = self.replication_lag()
+            if lag is None:
+                self.lag_unavailable = True
+                if progress:
+                    print("\n⚠ Replication status unavailable (standalone or not authorized); lag check disabled",
+                          file=sys.stderr)
+                return
+            if lag <= self.max_lag:
+                return
+            if progress:
+                print(f"\n⚠ Replication lag {lag:.1f}s exceeds {self.max_lag}s, pausing", file=sys.stderr)
+            time.sleep(LAG_POLL_INTERVAL)
+    
+    def next_ids(self) -> List[Any]:
+        """_ids of the next chunk of matching documents"""
+        query = self.query
+        if self.state['last_id'] is not None:
+            after = {"_id": {"$gt": self.state['last_id']}}
+            query = {"$and": [self.query, after]} if self.query else after
+        cursor = self.collection.find(query, {"_id": 1}).sort("_id", ASCENDING).limit(self.chunk_size)
+        return [doc["_id"] for doc in cursor]
+    
+    def apply(self, ids: List[Any]):
+        """Run one chunk through bulk_write and fold its counts into the state"""
+        from pymongo import UpdateMany, DeleteMany
+        
+        selector = {"$and": [self.query, {"_id": {"$in": ids}}]} if self.query else {"_id": {"$in": ids}}
+        request = DeleteMany(selector) if self.update is None else UpdateMany(selector, self.update)
+        with self.throttle.write(self.collection, [selector, self.update], count=len(ids)):
+            result = self.collection.bulk_write([request])
+        if self.update is None:
+            self.state['deleted'] += result.deleted_count
+        else:
+            self.state['matched'] += result.matched_count
+            self.state['modified'] += result.modified_count
+        self.state['last_id'] = ids[-1]
+        self.state['chunks'] += 1
+    
+    def run(self, progress: bool = True) -> Dict[str, Any]:
+        """
+        Process every remaining chunk, checkpointing after each one
+        
+        The checkpoint file is removed once the walk finishes; an interrupted
+        run leaves it behind for the next run to resume from.
+        
+        Returns:
+            Totals for the whole job (chunks, matched/modified or deleted) and
+            this run's elapsed time and rate
+        """
+        started = time.perf_counter()
+        processed = 0
+        while True:
+            self.wait_for_lag(progress)
+            ids = self.next_ids()
+            if not ids:
+                break
+            self.apply(ids)
+            self.save_checkpoint()
+            processed += len(ids)
+            
+            elapsed = time.perf_counter() - started
+            if self.max_rate and processed / self.max_rate > elapsed:
+                time.sleep(processed / self.max_rate - elapsed)
+            if progress:
+                done = self.state['deleted'] if self.update is None else self.state['modified']
+                print(f"\r  {self.state['chunks']} chunk(s), {done} {self.op}d "
+                      f"({processed / max(time.perf_counter() - started, 1e-9):.0f} docs/sec)",
+                      end='', file=sys.stderr, flush=True)
+        if progress and processed:
+            print(file=sys.stderr)
+        
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        elapsed = time.perf_counter() - started
+        totals = {key: value for key, value in self.state.items() if key != 'last_id'}
+        if self.update is None:
+            totals.pop('matched')
+            totals.pop('modified')
+        else:
+            totals.pop('deleted')
+        return dict(totals, resumed=self.resumed, elapsed=round(elapsed, 3),
+                    docs_per_sec=round(processed / elapsed, 1) if elapsed else 0.0)
+
+
+class MongoDBExporter:
+    """Streaming writer for query and aggregation cursors"""
+    
+    FORMATS = ('jsonl', 'csv', 'bson')
+    
+    def __init__(self, fmt: str = 'jsonl', fields: Optional[List[str]] = None,
+                 canonical: bool = False, compress: bool = False):
+        """
+        Initialize exporter
+        
+        Args:
+            fmt: Output format (jsonl, csv or bson)
+            fields: Columns for CSV output (taken from the first document if omitted)
+            canonical: Write Canonical instead of Relaxed Extended JSON
+            compress: Gzip the output file
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        self.fmt = fmt
+        self.fields = fields
+        self.compress = compress
+        self.json_options = json_util.CANONICAL_JSON_OPTIONS if canonical \
+            else json_util.RELAXED_JSON_OPTIONS
+    
+    @staticmethod
+    def detect_format(path: str) -> Tuple[str, bool]:
+        """Guess (format, compressed) from a file name such as dump.csv.gz"""
+        name = path.lower()
+        compress = name.endswith('.gz')
+        if compress:
+            name = name[:-3]
+        if name.endswith('.csv'):
+            return 'csv', compress
+        if name.endswith('.bson'):
+            return 'bson', compress
+        return 'jsonl', compress
+    
+    def open_binary(self, path: str):
+        """Open the output file behind a large write buffer"""
+        if self.compress:
+            return io.BufferedWriter(gzip.open(path, 'wb', compresslevel=6),
+                                     buffer_size=EXPORT_BUFFER_SIZE)
+        return open(path, 'wb', buffering=EXPORT_BUFFER_SIZE)
+    
+    @staticmethod
+    def get_path(document: Dict[str, Any], field: str) -> Any:
+        """Resolve a dotted field path, returning None when missing"""
+        value = document
+        for part in field.split('.'):
+            if isinstance(value, Mapping):
+                value = value.get(part)
+            elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+                value = value[int(part)]
+            else:
+                return None
+        return value
+    
+    def csv_cell(self, value: Any) -> Any:
+        """Render a value for a CSV cell without losing nested structure"""
+        if value is None:
+            return ''
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, (dict, list)):
+            return json_util.dumps(value, json_options=self.json_options)
+        return value
+    
+    def write(self, documents, path: str, progress: bool = True) -> Dict[str, Any]:
+        """
+        Write documents from a cursor (or any iterable) to a file
+        
+        Args:
+            documents: Cursor or iterable of documents, consumed lazily
+            path: Output file path
+            progress: Print a running count every PROGRESS_INTERVAL documents
+            
+        Returns:
+            Dictionary with exported, elapsed, docs_per_sec and path
+        """
+        exported = 0
+        started = time.perf_counter()
+        
+        def tick():
+            if progress and exported % PROGRESS_INTERVAL == 0:
+                print(f"\r  {exported} document(s) exported", end='', file=sys.stderr, flush=True)
+        
+        with self.open_binary(path) as stream:
+            if self.fmt == 'bson':
+                for doc in documents:
+                    stream.write(doc.raw if isinstance(doc, RawBSONDocument) else bson.encode(doc))
+                    exported += 1
+                    tick()
+            elif self.fmt == 'jsonl':
+                for doc in documents:
+                    stream.write(json_util.dumps(doc, json_options=self.json_options).encode('utf-8'))
+                    stream.write(b'\n')
+                    exported += 1
+                    tick()
+            else:
+                text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+                writer = None
+                for doc in documents:
+                    if writer is None:
+                        fields = self.fields or list(doc.keys())
+                        writer = csv.writer(text)
+                        writer.writerow(fields)
+                    writer.writerow([self.csv_cell(self.get_path(doc, field)) for field in fields])
+                    exported += 1
+                    tick()
+                text.flush()
+                text.detach()
+        
+        elapsed = time.perf_counter() - started
+        if progress and exported >= PROGRESS_INTERVAL:
+            print(file=sys.stderr)
+        return {"exported": exported,
+                "elapsed": round(elapsed, 3),
+                "docs_per_sec": round(exported / elapsed, 1) if elapsed > 0 else 0.0,
+                "path": path}
+
+
+class DocumentRenderer:
+    """
+    Formats documents for the terminal and writes them through a buffer
+    
+    Modes:
+        pretty: indented JSON, values json can't express shown via str()
+        compact: the same on one line per document
+        table: one row per document for selected columns, cells truncated
+        relaxed / canonical: Extended JSON, one line per document, types kept
+    """
+    
+    MODES = ('pretty', 'compact', 'table', 'relaxed', 'canonical')
+    
+    def __init__(self, mode: str = 'pretty', columns: Optional[List[str]] = None,
+                 width: int = DEFAULT_COLUMN_WIDTH, output=None):
+        """
+        Args:
+            mode: One of MODES
+            columns: Dotted field paths shown in table mode (default: the first
+                     document's top-level fields)
+            width: Maximum characters per table cell
+            output: Text stream written to (default: stdout)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown output format: {mode}")
+        self.mode = mode
+        self.columns = list(columns) if columns else None
+        self.width = max(4, width)
+        self.output = output or sys.stdout
+        self.json_options = (json_util.CANONICAL_JSON_OPTIONS if mode == 'canonical'
+                             else json_util.RELAXED_JSON_OPTIONS)
+        self.buffer: List[str] = []
+        self.buffered = 0
+        self.flushed_at: Optional[float] = None
+        self.header_written = False
+    
+    @staticmethod
+    def plain(value: Any) -> Any:
+        """json.dumps fallback: nested RawBSONDocuments become dicts, anything else str()"""
+        if isinstance(value, Mapping):
+            return dict(value)
+        return str(value)
+    
+    def render(self, document: Mapping) -> str:
+        """Format one document according to the mode"""
+        if self.mode == 'pretty':
+            return json.dumps(document, default=self.plain, indent=2)
+        if self.mode == 'compact':
+            return json.dumps(document, default=self.plain)
+        if self.mode == 'table':
+            return self.row(document)
+        return json_util.dumps(document, json_options=self.json_options)
+    
+    def cell(self, value: Any) -> str:
+        """Render a table cell, truncated to the column width"""
+        if value is None:
+            text = ''
+        elif isinstance(value, (Mapping, list)):
+            text = json.dumps(value, default=self.plain)
+        else:
+            text = str(value)
+        text = text.replace('\n', ' ')
+        return text if len(text) <= self.width else text[:self.width - 1] + '…'
+    
+    def row(self, document: Mapping) -> str:
+        """Render a table row, preceded by the header for the first document"""
+        if self.columns is None:
+            self.columns = list(document.keys())[:TABLE_MAX_COLUMNS]
+        cells = " | ".join(self.cell(MongoDBExporter.get_path(document, column)).ljust(self.width)
+                           for column in self.columns).rstrip()
+        if self.header_written:
+            return cells
+        self.header_written = True
+        header = " | ".join(column[:self.width].ljust(self.width) for column in self.columns).rstrip()
+        return f"{header}\n{'-+-'.join('-' * self.width for _ in self.columns)}\n{cells}"
+    
+    def write(self, text: str):
+        """
+        Queue text for output; the first write is shown at once, later ones
+        once the buffer is full or RENDER_FLUSH_INTERVAL has passed
+        """
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if (self.flushed_at is None or self.buffered >= RENDER_BUFFER_SIZE
+                or time.monotonic() - self.flushed_at >= RENDER_FLUSH_INTERVAL):
+            self.flush()
+    
+    def document(self, document: Mapping, heading: Optional[str] = None):
+        """
+        Queue one document; the heading is only shown in pretty mode, where
+        documents span several lines
+        """
+        if heading and self.mode == 'pretty':
+            self.write(f"\n--- {heading} ---\n")
+        self.write(self.render(document) + "\n")
+    
+    def flush(self):
+        """Write out everything queued so far"""
+        if self.buffer:
+            self.output.write("".join(self.buffer))
+            self.output.flush()
+            self.buffer.clear()
+            self.buffered = 0
+        self.flushed_at = time.monotonic()
+
+
+class KeysetPaginator:
+    """Range-based pagination that seeks past the last seen sort key instead of skipping"""
+    
+    # $type aliases in BSON sort order after null; $gt/$lt only match within one group
+    TYPE_ORDER = (('double', 'int', 'long', 'decimal'), ('string', 'symbol'), ('object',), ('array',),
+                  ('binData',), ('objectId',), ('bool',), ('date',), ('timestamp',), ('regex',))
+    
+    def __init__(self, collection: Collection, query: Optional[Dict[str, Any]] = None,
+                 projection: Optional[Dict[str, Any]] = None, sort_field: str = '_id',
+                 direction: int = ASCENDING, page_size: int = DEFAULT_PAGE_SIZE):
+        """
+        Initialize paginator
+        
+        Args:
+            collection: Collection to page through
+            query: Base query filter
+            projection: Optional projection (the sort key and _id are always returned)
+            sort_field: Indexed field to page on; _id breaks ties for non-unique keys
+            direction: ASCENDING or DESCENDING
+            page_size: Documents per page
+        """
+        self.collection = collection
+        self.query = query or {}
+        self.projection = self.with_keys(projection, sort_field)
+        self.sort_field = sort_field
+        self.direction = direction
+        self.page_size = max(1, page_size)
+        # bounds[i] is the key of the last document before page i (None for page 0)
+        self.bounds: List[Optional[Any]] = [None]
+        self.page = -1
+    
+    @staticmethod
+    def with_keys(projection: Optional[Dict[str, Any]], sort_field: str) -> Optional[Dict[str, Any]]:
+        """Make sure a projection returns the fields needed to seek"""
+        if not projection:
+            return None
+        projection = dict(projection)
+        if any(value for key, value in projection.items() if key != '_id'):
+            projection[sort_field] = 1
+        else:
+            projection.pop(sort_field, None)
+        projection.pop('_id', None)
+        return projection or None
+    
+    @property
+    def sort(self) -> List[Tuple[str, int]]:
+        """Sort specification matching the seek condition"""
+        if self.sort_field == '_id':
+            return [('_id', self.direction)]
+        return [(self.sort_field, self.direction), ('_id', self.direction)]
+    
+    def key_of(self, document: Dict[str, Any]) -> Any:
+        """Extract the seek key from a document"""
+        if self.sort_field == '_id':
+            return document['_id']
+        return MongoDBExporter.get_path(document, self.sort_field), document['_id']
+    
+    @classmethod
+    def type_group(cls, value: Any) -> Optional[int]:
+        """Index into TYPE_ORDER of a non-null sort key, or None for types not listed"""
+        if isinstance(value, bool):
+            return 6
+        if isinstance(value, (int, float, bson.Decimal128)):
+            return 0
+        if isinstance(value, str):
+            return 1
+        if isinstance(value, Mapping):
+            return 2
+        if isinstance(value, (list, tuple)):
+            return 3
+        if isinstance(value, bytes):
+            return 4
+        if isinstance(value, ObjectId):
+            return 5
+        if isinstance(value, datetime):
+            return 7
+        if isinstance(value, bson.Timestamp):
+            return 8
+        if isinstance(value, (bson.Regex, re.Pattern)):
+            return 9
+        return None
+    
+    def later_types(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Branch matching keys whose BSON type sorts after value's in the walk direction"""
+        group = self.type_group(value)
+        if group is None:
+            return []
+        if self.direction == ASCENDING:
+            groups = self.TYPE_ORDER[group + 1:]
+        else:
+            groups = self.TYPE_ORDER[:group]
+        aliases = [alias for names in groups for alias in names]
+        return [{field: {'$type': aliases}}] if aliases else []
+    
+    def seek_filter(self, after: Any) -> Dict[str, Any]:
+        """
+        Build the query for the page following the given key
+        
+        Null and missing sort keys sort together, before every other value,
+        but $gt/$lt never match them, so they get their own branches: after a
+        null key an ascending walk continues with the remaining nulls and then
+        every non-null value, and a descending walk reaches the nulls last.
+        $gt/$lt also stay within one BSON type, so a sort field holding, say,
+        numbers and strings gets a $type branch for the types still to come.
+        Array sort keys are not supported.
+        """
+        if after is None:
+            return self.query
+        op = '$gt' if self.direction == ASCENDING else '$lt'
+        if self.sort_field == '_id':
+            branches = [{'_id': {op: after}}] + self.later_types('_id', after)
+        else:
+            value, last_id = after
+            same_key = {self.sort_field: value, '_id': {op: last_id}}
+            if value is None:
+                branches = [same_key]
+                if self.direction == ASCENDING:
+                    branches.append({self.sort_field: {'$ne': None}})
+            else:
+                branches = [{self.sort_field: {op: value}}, same_key]
+                branches += self.later_types(self.sort_field, value)
+                if self.direction == DESCENDING:
+                    branches.append({self.sort_field: None})
+        condition = {'$or': branches} if len(branches) > 1 else branches[0]
+        return merge_filter(copy.deepcopy(self.query), condition) if self.query else condition
+    
+    def fetch(self, after: Any) -> List[Dict[str, Any]]:
+        """Fetch one page starting after a key"""
+        cursor = self.collection.find(self.seek_filter(after), self.projection,
+                                      sort=self.sort, limit=self.page_size)
+        return list(cursor)
+    
+    def next_page(self) -> List[Dict[str, Any]]:
+        """Fetch the next page (empty list at the end)"""
+        documents = self.fetch(self.bounds[self.page + 1])
+        if documents:
+            self.page += 1
+            if len(self.bounds) == self.page + 1:
+                self.bounds.append(self.key_of(documents[-1]))
+            else:
+                self.bounds[self.page + 1] = self.key_of(documents[-1])
+        return documents
+    
+    def previous_page(self) -> List[Dict[str, Any]]:
+        """Fetch the previous page (empty list when already on the first page)"""
+        if self.page <= 0:
+            return []
+        self.page -= 1
+        return self.fetch(self.bounds[self.page])
+
+
+class MongoDBScriptRunner:
+    """Non-interactive runner executing operations from a JSON Lines script"""
+    
+    # Operations that modify the collection and so invalidate cached reads
+    WRITE_OPS = {'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+                 'delete_one', 'delete_many', 'bulk_write', 'import_file'}
+    # Result keys counting the documents a write touched, charged to the write throttle
+    AFFECTED_KEYS = ('inserted_count', 'modified_count', 'deleted_count', 'upserted_count')
+    # Operations whose filter and sort feed the index advisor
+    SHAPED_OPS = {'find_one', 'find_many', 'find_page', 'count_documents', 'distinct', 'update_one',
+                  'update_many', 'replace_one', 'delete_one', 'delete_many', 'aggregate', 'export'}
+    
+    def __init__(self, crud: MongoDBCRUD, stop_on_error: bool = False):
+        """
+        Initialize script runner
+        
+        Args:
+            crud: Connected MongoDBCRUD instance shared by every operation
+            stop_on_error: Abort the script at the first failing operation
+        """
+        self.crud = crud
+        self.stop_on_error = stop_on_error
+        self.handlers = {
+            'insert_one': self.op_insert_one,
+            'insert_many': self.op_insert_many,
+            'find_one': self.op_find_one,
+            'find_many': self.op_find_many,
+            'count_documents': self.op_count_documents,
+            'distinct': self.op_distinct,
+            'update_one': self.op_update_one,
+            'update_many': self.op_update_many,
+            'replace_one': self.op_replace_one,
+            'delete_one': self.op_delete_one,
+            'delete_many': self.op_delete_many,
+            'aggregate': self.op_aggregate,
+            'bulk_write': self.op_bulk_write,
+            'create_index': self.op_create_index,
+            'import_file': self.op_import_file,
+            'export': self.op_export,
+            'cache_stats': self.op_cache_stats,
+            'watch': self.op_watch,
+            'find_page': self.op_find_page,
+            'explain': self.op_explain,
+            'index_advice': self.op_index_advice,
+            'copy': self.op_copy,
+            'save_pipeline': self.op_save_pipeline,
+            'run_pipeline': self.op_run_pipeline,
+        }
+    
+    @property
+    def collection(self) -> Collection:
+        """Collection currently targeted by the runner"""
+        return self.crud.collection
+    
+    @staticmethod
+    def filter_of(spec: Dict[str, Any], key: str = 'filter') -> Dict[str, Any]:
+        """Read a filter given either as a query document or a filter string"""
+        value = spec.get(key) or {}
+        if isinstance(value, str):
+            return parse_filter(value)
+        return value
+    
+    @staticmethod
+    def parse_sort(sort: Any) -> List[Tuple[str, int]]:
+        """Convert {"field": 1} or [["field", -1]] to a pymongo sort list"""
+        if not sort:
+            return []
+        if isinstance(sort, dict):
+            return [(field, int(order)) for field, order in sort.items()]
+        return [(field, int(order)) for field, order in sort]
+    
+    def op_insert_one(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.collection.insert_one(spec['document'])
+        return {"inserted_id": result.inserted_id}
+    
+    def op_insert_many(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.collection.insert_many(spec['documents'], ordered=spec.get('ordered', True))
+        return {"inserted_count": len(result.inserted_ids)}
+    
+    def op_find_one(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        query = self.filter_of(spec)
+        sort = self.parse_sort(spec.get('sort')) or None
+        document = self.crud.cached_read(
+            'find_one',
+            lambda: self.collection.find_one(query, spec.get('projection'), sort=sort,
+                                             skip=spec.get('skip', 0)),
+            query, projection=spec.get('projection'), sort=sort, skip=spec.get('skip', 0))
+        return {"document": document}
+    
+    def op_find_many(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        cursor = self.collection.find(self.filter_of(spec), spec.get('projection'),
+                                      skip=spec.get('skip', 0), limit=spec.get('limit', 0),
+                                      batch_size=spec.get('batch_size', DEFAULT_BATCH_SIZE))
+        sort = self.parse_sort(spec.get('sort'))
+        if sort:
+            cursor = cursor.sort(sort)
+        documents = list(cursor)
+        return {"count": len(documents), "documents": documents}
+    
+    def op_explain(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        kind = {'find_many': 'find', 'find_one': 'find', 'count_documents': 'count'}.get(
+            spec.get('of', 'find'), spec.get('of', 'find'))
+        explain = explain_read(self.collection, kind, query=self.filter_of(spec),
+                               projection=spec.get('projection'),
+                               sort=self.parse_sort(spec.get('sort')) or None,
+                               skip=spec.get('skip', 0),
+                               limit=1 if spec.get('of') == 'find_one' else spec.get('limit', 0),
+                               pipeline=spec.get('pipeline'),
+                               verbosity=spec.get('verbosity', 'executionStats'))
+        summary = summarize_explain(explain)
+        if spec.get('raw'):
+            summary["explain"] = explain
+        return summary
+    
+    def op_find_page(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        direction = DESCENDING if spec.get('direction', 1) in (-1, 'desc') else ASCENDING
+        paginator = KeysetPaginator(self.collection, self.filter_of(spec), spec.get('projection'),
+                                    spec.get('sort_field', '_id'), direction,
+                                    spec.get('page_size', DEFAULT_PAGE_SIZE))
+        after = spec.get('after')
+        if isinstance(after, list):
+            after = tuple(after)
+        documents = paginator.fetch(after)
+        # Pass "next_after" back as "after" to get the following page
+        next_after = paginator.key_of(documents[-1]) if len(documents) == paginator.page_size else None
+        return {"count": len(documents), "documents": documents,
+                "next_after": list(next_after) if isinstance(next_after, tuple) else next_after}
+    
+    def op_count_documents(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        query = self.filter_of(spec)
+        options = {key: spec[key] for key in ('skip', 'limit') if spec.get(key)}
+        count = self.crud.cached_read('count_documents',
+                                      lambda: self.collection.count_documents(query, **options),
+                                      query, **options)
+        return {"count": count}
+    
+    def op_distinct(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        query = self.filter_of(spec)
+        values = self.crud.cached_read('distinct',
+                                       lambda: self.collection.distinct(spec['field'], query),
+                                       query, extra=spec['field'])
+        return {"count": len(values), "values": values}
+    
+    def op_update_one(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.collection.update_one(self.filter_of(spec), update_of(spec['update']),
+                                            upsert=spec.get('upsert', False))
+        return self.update_result(result)
+    
+    def chunked_writer(self, spec: Dict[str, Any], update: Optional[Any] = None) -> ChunkedWriter:
+        """Build a ChunkedWriter from chunk_size/max_rate/max_lag/checkpoint spec keys"""
+        checkpoint = spec.get('checkpoint')
+        if spec.get('restart') and checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        return ChunkedWriter(self.collection, self.filter_of(spec), update,
+                             spec.get('chunk_size') or DEFAULT_CHUNK_SIZE, spec.get('max_rate', 0.0),
+                             spec.get('max_lag', 0.0), checkpoint, throttle=self.crud.throttle)
+    
+    def op_update_many(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        if spec.get('chunked'):
+            if spec.get('upsert'):
+                raise ValueError("Chunked updates cannot upsert")
+            return self.chunked_writer(spec, update_of(spec['update'])).run(progress=False)
+        result = self.collection.update_many(self.filter_of(spec), update_of(spec['update']),
+                                             upsert=spec.get('upsert', False))
+        return self.update_result(result)
+    
+    def op_replace_one(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        result = self.collection.replace_one(self.filter_of(spec), spec['replacement'],
+                                             upsert=spec.get('upsert', False))
+        return self.update_result(result)
+    
+    @staticmethod
+    def update_result(result) -> Dict[str, Any]:
+        """Summarize an UpdateResult"""
+        return {"matched_count": result.matched_count,
+                "modified_count": result.modified_count,
+                "upserted_id": result.upserted_id}
+    
+    def op_delete_one(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        return {"deleted_count": self.collection.delete_one(self.filter_of(spec)).deleted_count}
+    
+    def op_delete_many(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        query = self.filter_of(spec)
+        if not query and not spec.get('confirm_all'):
+            raise ValueError("Empty filter would delete ALL documents; set \"confirm_all\": true")
+        if spec.get('chunked'):
+            return self.chunked_writer(spec).run(progress=False)
+        return {"deleted_count": self.collection.delete_many(query).deleted_count}
+    
+    @staticmethod
+    def aggregate_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Collect aggregate() keyword options from a spec"""
+        options = {"batchSize": spec.get('batch_size', DEFAULT_BATCH_SIZE)}
+        for key, option in (('allow_disk_use', 'allowDiskUse'), ('max_time_ms', 'maxTimeMS'),
+                            ('comment', 'comment')):
+            if spec.get(key) is not None:
+                options[option] = spec[key]
+        if spec.get('hint'):
+            hint = spec['hint']
+            options['hint'] = list(hint.items()) if isinstance(hint, dict) else hint
+        return options
+    
+    def op_aggregate(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        pipeline, notes = spec['pipeline'], []
+        if spec.get('optimize'):
+            pipeline, notes = optimize_pipeline(pipeline)
+        target = output_namespace(pipeline, self.crud.db.name)
+        if target:
+            with self.crud.throttle.write(self.collection, pipeline, count=1):
+                self.collection.aggregate(pipeline, **self.aggregate_options(spec)).close()
+            self.crud.invalidate_cache(target)
+            result = {"written_to": target}
+        else:
+            results = list(self.collection.aggregate(pipeline, **self.aggregate_options(spec)))
+            result = {"count": len(results), "documents": results}
+        if spec.get('optimize'):
+            result["optimizations"] = notes
+        return result
+    
+    def op_save_pipeline(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        library = PipelineLibrary(self.crud.pipeline_library)
+        library.save(spec['name'], spec['pipeline'], spec.get('description', ""), self.collection.name)
+        return {"saved": spec['name'], "params": PipelineLibrary.parameters(spec['pipeline']),
+                "path": library.path}
+    
+    def op_run_pipeline(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        entry = PipelineLibrary(self.crud.pipeline_library).get(spec['name'])
+        pipeline = PipelineLibrary.substitute(entry['pipeline'], spec.get('params', {}))
+        issues = validate_pipeline(pipeline, self.collection)
+        errors_found = [message for level, message in issues if level == 'error']
+        if errors_found and not spec.get('force'):
+            raise ValueError("; ".join(errors_found))
+        self.crud.advisor.record_pipeline(self.collection.full_name, pipeline)
+        result = self.op_aggregate(dict(spec, pipeline=pipeline))
+        result["warnings"] = [message for level, message in issues if level == 'warning']
+        return result
+    
+    def op_bulk_write(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+        
+        operations = []
+        for request in spec['operations']:
+            (name, args), = request.items()
+            if name == 'insert_one':
+                operations.append(InsertOne(args['document']))
+            elif name == 'update_one':
+                operations.append(UpdateOne(self.filter_of(args), update_of(args['update']), upsert=args.get('upsert', False)))
+            elif name == 'update_many':
+                operations.append(UpdateMany(self.filter_of(args), update_of(args['update']), upsert=args.get('upsert', False)))
+            elif name == 'replace_one':
+                operations.append(ReplaceOne(self.filter_of(args), args['replacement'], upsert=args.get('upsert', False)))
+            elif name == 'delete_one':
+                operations.append(DeleteOne(self.filter_of(args)))
+            elif name == 'delete_many':
+                operations.append(DeleteMany(self.filter_of(args)))
+            else:
+                raise ValueError(f"Unknown bulk operation: {name}")
+        
+        result = self.collection.bulk_write(operations, ordered=spec.get('ordered', True))
+        return {"inserted_count": result.inserted_count,
+                "matched_count": result.matched_count,
+                "modified_count": result.modified_count,
+                "deleted_count": result.deleted_count,
+                "upserted_count": result.upserted_count}
+    
+    def op_create_index(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        keys = self.parse_sort(spec['keys'])
+        options = spec.get('options', {})
+        return {"index_name": self.collection.create_index(keys, **options)}
+    
+    def op_import_file(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        importer = MongoDBImporter(self.collection,
+                                   batch_size=spec.get('batch_size', DEFAULT_IMPORT_BATCH_SIZE),
+                                   ordered=spec.get('ordered', False),
+                                   workers=spec.get('workers', 1),
+                                   max_in_flight=spec.get('max_in_flight'),
+                                   max_retries=spec.get('max_retries', 3),
+                                   throttle=self.crud.throttle)
+        return importer.import_file(spec['path'], spec.get('format'), spec.get('schema'),
+                                    ignore_blanks=spec.get('ignore_blanks', True), progress=False)
+    
+    def op_export(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        fmt, compress = MongoDBExporter.detect_format(spec['path'])
+        exporter = MongoDBExporter(spec.get('format', fmt), fields=spec.get('fields'),
+                                   canonical=spec.get('canonical', False),
+                                   compress=spec.get('compress', compress))
+        source = raw_collection(self.collection) if exporter.fmt == 'bson' else self.collection
+        if 'pipeline' in spec:
+            cursor = source.aggregate(spec['pipeline'], **self.aggregate_options(spec))
+        else:
+            cursor = source.find(
+                self.filter_of(spec), spec.get('projection'),
+                skip=spec.get('skip', 0), limit=spec.get('limit', 0),
+                batch_size=spec.get('batch_size', DEFAULT_BATCH_SIZE))
+            sort = self.parse_sort(spec.get('sort'))
+            if sort:
+                cursor = cursor.sort(sort)
+        return exporter.write(cursor, spec['path'], progress=False)
+    
+    def op_copy(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        target_db = self.crud.client[spec['to_database']] if spec.get('to_database') else self.crud.db
+        target = target_db[spec['to']]
+        if target.full_name == self.collection.full_name:
+            raise ValueError("copy target must differ from the source collection")
+        try:
+            return copy_collection(self.collection, target, self.filter_of(spec),
+                                   spec.get('batch_size', DEFAULT_IMPORT_BATCH_SIZE),
+                                   spec.get('workers', 1), progress=False, throttle=self.crud.throttle)
+        finally:
+            self.crud.invalidate_cache(target.full_name)
+    
+    def op_watch(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        if not spec.get('max_events') and not spec.get('max_seconds'):
+            raise ValueError("watch needs \"max_events\" or \"max_seconds\" in script mode")
+        target = self.crud.db if spec.get('scope') == 'database' else self.collection
+        watcher = ChangeStreamWatcher(target, spec.get('resume_file'), spec.get('pipeline'),
+                                      spec.get('full_document', False), cache=self.crud.cache)
+        events = watcher.events(spec.get('max_events', 0), spec.get('max_seconds', 0))
+        if spec.get('path'):
+            with open(spec['path'], 'a', encoding='utf-8', buffering=EXPORT_BUFFER_SIZE) as output:
+                for change in events:
+                    output.write(json_util.dumps(change) + "\n")
+            return {"events": watcher.events_seen, "path": spec['path']}
+        changes = list(events)
+        return {"events": len(changes), "changes": changes}
+    
+    def op_index_advice(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        report = self.crud.advisor.advise(self.collection)
+        if spec.get('create'):
+            report["created"] = [self.collection.create_index([tuple(key) for key in entry['keys']])
+                                 for entry in report['recommended']]
+        return report
+    
+    def op_cache_stats(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        return self.crud.cache.stats() if self.crud.cache else {"enabled": False}
+    
+    def record_shape(self, spec: Dict[str, Any]):
+        """Record the query shape of an operation for the index advisor"""
+        namespace = self.collection.full_name
+        if 'pipeline' in spec:
+            self.crud.advisor.record_pipeline(namespace, spec.get('pipeline') or [])
+        elif spec['op'] == 'find_page':
+            sort_field = spec.get('sort_field', '_id')
+            direction = DESCENDING if spec.get('direction', 1) in (-1, 'desc') else ASCENDING
+            sort = [(sort_field, direction)] + ([('_id', direction)] if sort_field != '_id' else [])
+            self.crud.advisor.record(namespace, self.filter_of(spec), sort)
+        else:
+            self.crud.advisor.record(namespace, self.filter_of(spec), self.parse_sort(spec.get('sort')))
+    
+    def execute(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute a single operation spec
+        
+        Args:
+            spec: Operation dictionary with an "op" key and its arguments
+            
+        Returns:
+            Operation result dictionary
+        """
+        op = spec.get('op')
+        if op not in self.handlers:
+            raise ValueError(f"Unknown operation: {op}")
+        
+        # Optional per-operation namespace override
+        if spec.get('database') or spec.get('collection'):
+            db = self.crud.client[spec['database']] if spec.get('database') else self.crud.db
+            self.crud.db = db
+            self.crud.collection = db[spec.get('collection') or self.crud.collection.name]
+        
+        if op in self.SHAPED_OPS:
+            self.record_shape(spec)
+        
+        if op not in self.WRITE_OPS:
+            return self.handlers[op](spec)
+        namespace = self.collection.full_name
+        try:
+            if op == 'import_file' or spec.get('chunked'):
+                # Throttled per batch/chunk by the importer and ChunkedWriter
+                return self.handlers[op](spec)
+            payload, count = self.write_payload(spec)
+            with self.crud.throttle.write(self.collection, payload, count) as usage:
+                result = self.handlers[op](spec)
+                if any(key in result for key in self.AFFECTED_KEYS):
+                    usage['affected'] = sum(result.get(key, 0) for key in self.AFFECTED_KEYS)
+            return result
+        finally:
+            self.crud.invalidate_cache(namespace)
+    
+    @staticmethod
+    def write_payload(spec: Dict[str, Any]) -> Tuple[List[Any], Optional[int]]:
+        """Documents (or the statement itself) a write op sends, and the documents charged up front"""
+        if spec['op'] == 'insert_many':
+            return spec['documents'], None
+        if spec['op'] == 'insert_one':
+            return [spec['document']], None
+        statement = {key: value for key, value in spec.items() if key != 'op'}
+        return [statement], len(spec.get('operations') or [statement])
+    
+    def run(self, lines, output=sys.stdout) -> int:
+        """
+        Execute every operation in a JSON Lines stream
+        
+        Each result is written as one Extended JSON line containing the
+        line number, op name, status, elapsed milliseconds and result.
+        Blank lines and lines starting with '#' are skipped.
+        
+        Args:
+            lines: Iterable of script lines
+            output: Text stream receiving result lines
+            
+        Returns:
+            Number of failed operations
+        """
+        executed = 0
+        failures = 0
+        started = time.perf_counter()
+        
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            
+            op = None
+            op_started = time.perf_counter()
+            try:
+                spec = json_util.loads(line)
+                op = spec.get('op')
+                record = {"line": line_no, "op": op, "ok": True, "result": self.execute(spec)}
+            except errors.BulkWriteError as e:
+                record = {"line": line_no, "op": op, "ok": False, "error": str(e), "details": e.details}
+            except Exception as e:
+                record = {"line": line_no, "op": op, "ok": False, "error": str(e)}
+            record["elapsed_ms"] = round((time.perf_counter() - op_started) * 1000, 3)
+            
+            executed += 1
+            if not record["ok"]:
+                failures += 1
+            output.write(json_util.dumps(record) + "\n")
+            
+            if failures and self.stop_on_error:
+                break
+        
+        elapsed = time.perf_counter() - started
+        rate = executed / elapsed if elapsed > 0 else 0.0
+        print(f"✓ Executed {executed} operation(s), {failures} failed, "
+              f"in {elapsed:.3f}s ({rate:.1f} ops/sec)", file=sys.stderr)
+        if self.crud.cache:
+            stats = self.crud.cache.stats()
+            print(f"  Cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                  f"hit rate {stats['hit_rate']:.1%}", file=sys.stderr)
+        return failures
+
+
+class AsyncMongoDBCRUD:
+    """asyncio counterpart of MongoDBCRUD for concurrent, non-interactive workloads"""
+    
+    def __init__(self, connection_string: str = "mongodb://localhost:27017/",
+                 database_name: str = "mydatabase",
+                 collection_name: str = "mycollection",
+                 concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                 client_options: Optional[Dict[str, Any]] = None):
+        """
+        Initialize async MongoDB client (call connect() before use)
+        
+        Args:
+            connection_string: MongoDB connection URI
+            database_name: Name of the database
+            collection_name: Name of the collection
+            concurrency: Maximum operations in flight at once
+            client_options: Extra client options, as for MongoDBCRUD
+        """
+        if AsyncMongoClient is None:
+            raise RuntimeError("Async engine requires pymongo>=4.9 or motor")
+        options = {"serverSelectionTimeoutMS": 5000, **(client_options or {})}
+        self.client = AsyncMongoClient(connection_string, **options)
+        self.db = self.client[database_name]
+        self.collection = self.db[collection_name]
+        self.concurrency = max(1, concurrency)
+        self.limiter: Optional[asyncio.Semaphore] = None
+    
+    async def connect(self):
+        """Verify the connection and create the concurrency limiter on the running loop"""
+        self.limiter = asyncio.Semaphore(self.concurrency)
+        try:
+            await self.client.admin.command('ping')
+        except errors.ServerSelectionTimeoutError:
+            raise ConnectionError("Failed to connect to MongoDB. Ensure MongoDB is running.")
+        except Exception as e:
+            raise ConnectionError(f"MongoDB connection error: {e}")
+    
+    def using(self, database_name: str, collection_name: str) -> "AsyncMongoDBCRUD":
+        """View of this engine on another namespace, sharing its client and concurrency limit"""
+        view = copy.copy(self)
+        view.db = self.client[database_name]
+        view.collection = view.db[collection_name]
+        return view
+    
+    async def close(self):
+        """Close the client (pymongo's async client returns a coroutine, motor's does not)"""
+        result = self.client.close()
+        if inspect.isawaitable(result):
+            await result
+    
+    @staticmethod
+    def query_of(query: Any) -> Dict[str, Any]:
+        """Accept a filter document or a filter mini-language string"""
+        if isinstance(query, str):
+            return parse_filter(query)
+        return query or {}
+    
+    async def find_one(self, query: Any = None, projection: Optional[Dict[str, Any]] = None,
+                       sort: Any = None, skip: int = 0) -> Optional[Dict[str, Any]]:
+        """Find a single document"""
+        async with self.limiter:
+            return await self.collection.find_one(self.query_of(query), projection,
+                                                  sort=MongoDBScriptRunner.parse_sort(sort) or None,
+                                                  skip=skip)
+    
+    async def find_many(self, query: Any = None, projection: Optional[Dict[str, Any]] = None,
+                        sort: Any = None, skip: int = 0, limit: int = 0,
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """Find documents and return them as a list"""
+        async with self.limiter:
+            cursor = self.collection.find(self.query_of(query), projection, skip=skip,
+                                          limit=limit, batch_size=batch_size)
+            sort = MongoDBScriptRunner.parse_sort(sort)
+            if sort:
+                cursor = cursor.sort(sort)
+            return await cursor.to_list(length=None)
+    
+    async def count_documents(self, query: Any = None, **options) -> int:
+        """Count documents matching a query"""
+        async with self.limiter:
+            return await self.collection.count_documents(self.query_of(query), **options)
+    
+    async def distinct(self, field: str, query: Any = None) -> List[Any]:
+        """Get distinct values for a field"""
+        async with self.limiter:
+            return await self.collection.distinct(field, self.query_of(query))
+    
+    async def insert_one(self, document: Dict[str, Any]):
+        """Insert a single document"""
+        async with self.limiter:
+            return await self.collection.insert_one(document)
+    
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True):
+        """Insert multiple documents"""
+        async with self.limiter:
+            return await self.collection.insert_many(documents, ordered=ordered)
+    
+    async def update_one(self, query: Any, update: Any, upsert: bool = False):
+        """Update a single document"""
+        async with self.limiter:
+            return await self.collection.update_one(self.query_of(query), update_of(update),
+                                                    upsert=upsert)
+    
+    async def update_many(self, query: Any, update: Any, upsert: bool = False):
+        """Update multiple documents"""
+        async with self.limiter:
+            return await self.collection.update_many(self.query_of(query), update_of(update),
+                                                     upsert=upsert)
+    
+    async def replace_one(self, query: Any, replacement: Dict[str, Any], upsert: bool = False):
+        """Replace a document entirely"""
+        async with self.limiter:
+            return await self.collection.replace_one(self.query_of(query), replacement,
+                                                     upsert=upsert)
+    
+    async def delete_one(self, query: Any):
+        """Delete a single document"""
+        async with self.limiter:
+            return await self.collection.delete_one(self.query_of(query))
+    
+    async def delete_many(self, query: Any):
+        """Delete multiple documents"""
+        async with self.limiter:
+            return await self.collection.delete_many(self.query_of(query))
+    
+    async def aggregate(self, pipeline: List[Dict[str, Any]], **options) -> List[Dict[str, Any]]:
+        """Run an aggregation pipeline and return its results"""
+        async with self.limiter:
+            cursor = self.collection.aggregate(pipeline, **options)
+            # pymongo's async aggregate is a coroutine; motor returns the cursor directly
+            if inspect.isawaitable(cursor):
+                cursor = await cursor
+            return await cursor.to_list(length=None)
+    
+    async def bulk_write(self, operations: List[Any], ordered: bool = True):
+        """Execute a list of pymongo write models"""
+        async with self.limiter:
+            return await self.collection.bulk_write(operations, ordered=ordered)
+
+
+class AsyncMongoDBScriptRunner:
+    """Runs JSON Lines scripts on AsyncMongoDBCRUD with operations overlapping"""
+    
+    def __init__(self, crud: AsyncMongoDBCRUD, stop_on_error: bool = False):
+        """
+        Initialize async script runner
+        
+        Args:
+            crud: Connected AsyncMongoDBCRUD; its concurrency bounds in-flight operations
+            stop_on_error: Run lines one at a time and stop at the first failure
+        """
+        self.crud = crud
+        self.stop_on_error = stop_on_error
+        self.current = crud
+    
+    def target_of(self, spec: Dict[str, Any]) -> AsyncMongoDBCRUD:
+        """
+        Namespace a line runs against
+        
+        As in MongoDBScriptRunner, a line's database/collection keys switch
+        the namespace for it and every later line. Lines are resolved in file
+        order before they start, so overlapping operations keep their own.
+        """
+        if spec.get('database') or spec.get('collection'):
+            self.current = self.current.using(spec.get('database') or self.current.db.name,
+                                              spec.get('collection') or self.current.collection.name)
+        return self.current
+    
+    async def execute(self, spec: Dict[str, Any], crud: Optional[AsyncMongoDBCRUD] = None) -> Dict[str, Any]:
+        """Execute a single operation spec (same format as MongoDBScriptRunner)"""
+        crud = crud or self.crud
+        op = spec.get('op')
+        query = MongoDBScriptRunner.filter_of(spec)
+        
+        if op == 'insert_one':
+            return {"inserted_id": (await crud.insert_one(spec['document'])).inserted_id}
+        if op == 'insert_many':
+            result = await crud.insert_many(spec['documents'], ordered=spec.get('ordered', True))
+            return {"inserted_count": len(result.inserted_ids)}
+        if op == 'find_one':
+            return {"document": await crud.find_one(query, spec.get('projection'),
+                                                    spec.get('sort'), spec.get('skip', 0))}
+        if op == 'find_many':
+            documents = await crud.find_many(query, spec.get('projection'), spec.get('sort'),
+                                             spec.get('skip', 0), spec.get('limit', 0),
+                                             spec.get('batch_size', DEFAULT_BATCH_SIZE))
+            return {"count": len(documents), "documents": documents}
+        if op == 'count_documents':
+            options = {key: spec[key] for key in ('skip', 'limit') if spec.get(key)}
+            return {"count": await crud.count_documents(query, **options)}
+        if op == 'distinct':
+            values = await crud.distinct(spec['field'], query)
+            return {"count": len(values), "values": values}
+        if op in ('update_one', 'update_many'):
+            method = crud.update_one if op == 'update_one' else crud.update_many
+            result = await method(query, spec['update'], upsert=spec.get('upsert', False))
+            return MongoDBScriptRunner.update_result(result)
+        if op == 'replace_one':
+            result = await crud.replace_one(query, spec['replacement'], upsert=spec.get('upsert', False))
+            return MongoDBScriptRunner.update_result(result)
+        if op == 'delete_one':
+            return {"deleted_count": (await crud.delete_one(query)).deleted_count}
+        if op == 'delete_many':
+            if not query and not spec.get('confirm_all'):
+                raise ValueError("Empty filter would delete ALL documents; set \"confirm_all\": true")
+            return {"deleted_count": (await crud.delete_many(query)).deleted_count}
+        if op == 'aggregate':
+            results = await crud.aggregate(spec['pipeline'])
+            return {"count": len(results), "documents": results}
+        raise ValueError(f"Unsupported operation in async mode: {op}")
+    
+    async def run_line(self, line_no: int, spec: Dict[str, Any], crud: AsyncMongoDBCRUD, output) -> bool:
+        """Execute one parsed script line and write its result record; returns success"""
+        op = spec.get('op')
+        started = time.perf_counter()
+        try:
+            record = {"line": line_no, "op": op, "ok": True, "result": await self.execute(spec, crud)}
+        except errors.BulkWriteError as e:
+            record = {"line": line_no, "op": op, "ok": False, "error": str(e), "details": e.details}
+        except Exception as e:
+            record = {"line": line_no, "op": op, "ok": False, "error": str(e)}
+        record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        output.write(json_util.dumps(record) + "\n")
+        return record["ok"]
+    
+    async def run(self, lines, output=sys.stdout) -> int:
+        """
+        Execute every operation in a JSON Lines stream concurrently
+        
+        Operations are started in file order, but results are written as
+        they complete, so scripts must not rely on ordering between lines.
+        At most 4x the concurrency limit lines are buffered at once. With
+        stop_on_error each line finishes before the next one starts, so the
+        first failure stops the script exactly as in synchronous mode.
+        
+        Returns:
+            Number of failed operations
+        """
+        executed = 0
+        failures = 0
+        stopped = False
+        started = time.perf_counter()
+        pending = set()
+        max_pending = self.crud.concurrency * 4
+        
+        async def drain(return_when):
+            nonlocal executed, failures, pending
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for task in done:
+                executed += 1
+                if not task.result():
+                    failures += 1
+        
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if failures and self.stop_on_error:
+                stopped = True
+                break
+            if len(pending) >= max_pending:
+                await drain(asyncio.FIRST_COMPLETED)
+            try:
+                spec = json_util.loads(line)
+                crud = self.target_of(spec)
+            except Exception as e:
+                output.write(json_util.dumps({"line": line_no, "op": None, "ok": False, "error": str(e),
+                                              "elapsed_ms": 0.0}) + "\n")
+                executed += 1
+                failures += 1
+                continue
+            if self.stop_on_error:
+                executed += 1
+                if not await self.run_line(line_no, spec, crud, output):
+                    failures += 1
+                continue
+            pending.add(asyncio.ensure_future(self.run_line(line_no, spec, crud, output)))
+        if pending:
+            await drain(asyncio.ALL_COMPLETED)
+        
+        elapsed = time.perf_counter() - started
+        rate = executed / elapsed if elapsed > 0 else 0.0
+        mode = "sequentially" if self.stop_on_error else "concurrently"
+        print(f"✓ Executed {executed} operation(s) {mode}, {failures} failed, "
+              f"in {elapsed:.3f}s ({rate:.1f} ops/sec)", file=sys.stderr)
+        if stopped:
+            print("⚠ Stopped at the first failure; remaining lines were not run", file=sys.stderr)
+        return failures
+
+
+async def run_async_script(args, client_options: Dict[str, Any]) -> int:
+    """Connect the async engine, run a script and close the client"""
+    crud = AsyncMongoDBCRUD(args.uri, args.db, args.collection,
+                            concurrency=args.concurrency, client_options=client_options)
+    try:
+        await crud.connect()
+        print(f"✓ Connected to MongoDB (async): {args.db}.{args.collection}", file=sys.stderr)
+        runner = AsyncMongoDBScriptRunner(crud, stop_on_error=args.stop_on_error)
+        if args.script == '-':
+            return await runner.run(sys.stdin)
+        with open(args.script, encoding='utf-8') as script:
+            return await runner.run(script)
+    finally:
+        await crud.close()
+
+
+class MongoDBCLI:
+    """Command-line interface for MongoDB CRUD operations"""
+    
+    def __init__(self):
+        self.crud = None
+        self.connected = False
+        self.connections = MongoDBConnectionManager()
+        self.client_options: Dict[str, Any] = {}
+        self.metrics = CommandMetrics()
+    
+    def prompt_client_options(self) -> Dict[str, Any]:
+        """Ask for connection pool, compression and read preference settings"""
+        options = dict(self.client_options)
+        print("\nConnection options (press Enter to keep current/default):")
+        for name, label in (('maxPoolSize', "Max pool size"),
+                            ('minPoolSize', "Min pool size"),
+                            ('maxIdleTimeMS', "Max idle time per connection (ms)")):
+            value = input(f"{label} [{options.get(name, 'default')}]: ").strip()
+            if value:
+                try:
+                    options[name] = int(value)
+                except ValueError:
+                    print(f"⚠ Invalid number for {name}, ignored")
+        
+        available = available_compressors()
+        value = input(f"Compressors, comma-separated ({'/'.join(available)}) "
+                      f"[{','.join(options.get('compressors', [])) or 'none'}]: ").strip()
+        if value:
+            requested = [name.strip().lower() for name in value.split(',') if name.strip()]
+            missing = [name for name in requested if name not in available]
+            if missing:
+                print(f"⚠ Not available here (missing package?): {', '.join(missing)}")
+            options['compressors'] = [name for name in requested if name in available]
+        
+        value = input("Read preference (primary/primaryPreferred/secondary/"
+                      f"secondaryPreferred/nearest) [{options.get('readPreference', 'primary')}]: ").strip()
+        if value:
+            options['readPreference'] = value
+        
+        recording = 'event_listeners' in options
+        value = input(f"Record per-command latency metrics? (y/n) [{'y' if recording else 'n'}]: ").strip().lower()
+        if value.startswith('y'):
+            options['event_listeners'] = (self.metrics,)
+        elif value.startswith('n'):
+            options.pop('event_listeners', None)
+        return options
+    
+    def show_metrics(self):
+        """Print the command metrics summary and optionally export or reset it"""
+        if 'event_listeners' not in self.client_options:
+            print("⚠ Metrics are off; enable them in the connection options (option 20)")
+            return
+        self.metrics.print_summary()
+        action = input("\n1. Export (.json or .prom)  2. Reset  (or press Enter to keep): ").strip()
+        if action == '1':
+            path = input("Output file: ").strip()
+            if path:
+                try:
+                    fmt = self.metrics.export(path)
+                    print(f"✓ Wrote {fmt} metrics to {path}")
+                except OSError as e:
+                    print(f"✗ Error writing metrics: {e}")
+        elif action == '2':
+            self.metrics.reset()
+            print("✓ Metrics reset")
+    
+    def connect(self):
+        """Establish MongoDB connection"""
+        print("\n MONGODB CONNECTION")
+        
+        # Connection options
+        print("1. Use default (mongodb://localhost:27017/)")
+        print("2. Enter custom connection string")
+        choice = input("Select option (1-2): ").strip()
+        
+        if choice == '2':
+            connection_string = input("Enter MongoDB URI: ").strip()
+        else:
+            connection_string = "mongodb://localhost:27017/"
+        
+        database_name = input("Database name (default: mydatabase): ").strip() or "mydatabase"
+        collection_name = input("Collection name (default: mycollection): ").strip() or "mycollection"
+        
+        if input("Configure pool/compression/read preference? (y/n): ").lower().startswith('y'):
+            self.client_options = self.prompt_client_options()
+        
+        if self.crud:
+            # The old connection's watcher thread would otherwise keep running
+            self.crud.stop_cache_watcher()
+        try:
+            # Clients are cached per URI and options, so reconnecting reuses the pool
+            self.crud = MongoDBCRUD(connection_string, database_name, collection_name,
+                                    client_options=self.client_options,
+                                    manager=self.connections)
+            self.connected = True
+        except ConnectionError as e:
+            print(f"✗ {e}")
+            self.connected = False
+    
+    def switch_collection(self):
+        """Switch to a different collection"""
+        if not self.connected:
+            print("⚠ Not connected to MongoDB")
+            return
+        
+        database_name = input("Database name (or press Enter to keep current): ").strip()
+        collection_name = input("Collection name: ").strip()
+        
+        if not collection_name:
+            print("⚠ Collection name required")
+            return
+        
+        try:
+            if database_name:
+                self.crud.db = self.crud.client[database_name]
+            self.crud.collection = self.crud.db[collection_name]
+            print(f"✓ Switched to {self.crud.db.name}.{collection_name}")
+        except Exception as e:
+            print(f"✗ Error switching collection: {e}")
     
     def list_databases(self):
         """List all databases"""
@@ -979,6 +5483,8 @@ class MongoDBCLI:
         
         if self.connected:
             print(f" Connected to: {self.crud.db.name}.{self.crud.collection.name}")
+            if self.crud.explain_enabled:
+                print(" Explain mode: ON")
         else:
             print("⚠ Not connected to MongoDB")
         
@@ -1015,6 +5521,23 @@ class MongoDBCLI:
         print("18. List Collections")
         print("19. Switch Collection")
         
+        print("\n--- IMPORT/COPY ---")
+        print("21. Import From File")
+        print("28. Copy To Collection")
+        
+        print("\n--- CACHE/MONITORING ---")
+        print("22. Query Cache")
+        print("23. Watch Changes")
+        print("26. Command Metrics")
+        
+        print("\n--- TUNING ---")
+        print("24. Toggle Explain Mode")
+        print("25. Index Advisor")
+        print("29. Write Throttle")
+        
+        print("\n--- DISPLAY ---")
+        print("27. Output Format")
+        
         print("\n--- CONNECTION ---")
         print("20. Connect/Reconnect")
         print("0.  Exit")
@@ -1049,18 +5572,28 @@ class MongoDBCLI:
             '17': lambda: self.list_databases(),
             '18': lambda: self.list_collections(),
             '19': lambda: self.switch_collection(),
-            '20': lambda: self.connect()
+            '20': lambda: self.connect(),
+            '21': lambda: self.crud.import_file(),
+            '22': lambda: self.crud.cache_settings(),
+            '23': lambda: self.crud.watch(),
+            '24': lambda: self.crud.toggle_explain(),
+            '25': lambda: self.crud.index_advisor(),
+            '26': lambda: self.show_metrics(),
+            '27': lambda: self.crud.output_settings(),
+            '28': lambda: self.crud.copy_documents(),
+            '29': lambda: self.crud.throttle_settings()
         }
         
         while True:
             try:
                 self.display_menu()
-                choice = input("\nSelect operation (0-20): ").strip()
+                choice = input("\nSelect operation (0-29): ").strip()
                 
                 if choice == '0':
                     print("\n　Closing MongoDB connection...")
                     if self.crud:
-                        self.crud.client.close()
+                        self.crud.stop_cache_watcher()
+                    self.connections.close_all()
                     print("✓ Thank you for using MongoDB CRUD Manager!")
                     break
                 
@@ -1079,7 +5612,8 @@ class MongoDBCLI:
                 print("\n\n⚠ Operation interrupted by user")
                 if input("Exit application? (y/n): ").lower().startswith('y'):
                     if self.crud:
-                        self.crud.client.close()
+                        self.crud.stop_cache_watcher()
+                    self.connections.close_all()
                     print("Goodbye!")
                     break
             except Exception as e:
@@ -1087,10 +5621,524 @@ class MongoDBCLI:
                 input("\nPress Enter to continue...")
 
 
+def benchmark_parse_value(count: int = 200000):
+    """
+    Micro-benchmark value coercion throughput
+    
+    Measures values/sec for inference on unique values (cache misses),
+    inference on a realistic mix of repeated CSV cells (cache hits), and
+    hinted conversion that bypasses inference.
+    
+    Args:
+        count: Values parsed per scenario
+    """
+    import random
+    rng = random.Random(42)
+    repeated = ['true', 'false', 'null', 'active', 'pending', 'Alice', 'Bob', '42', '3.5',
+                '2024-01-02T03:04:05', 'ObjectId("507f1f77bcf86cd799439011")', '[1,2,3]']
+    scenarios = [
+        ("inferred, unique values", [str(rng.randint(0, 10 ** 9)) if i % 2 else f"{rng.random():.6f}"
+                                     for i in range(count)], None),
+        ("inferred, repeated values", [rng.choice(repeated) for _ in range(count)], None),
+        ("hinted (int)", [str(rng.randint(0, 10 ** 9)) for _ in range(count)], 'int'),
+    ]
+    
+    print(f"parse_value benchmark ({count} values per scenario)")
+    for name, values, hint in scenarios:
+        infer_value.cache_clear()
+        started = time.perf_counter()
+        for value in values:
+            MongoDBCRUD.parse_value(value, hint)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<28} {count / elapsed:>12,.0f} values/sec")
+
+
+class MongoDBBenchmark:
+    """
+    Load generator driving the script-mode code path of MongoDBCRUD
+    
+    Each workload builds operation specs and runs them through
+    MongoDBScriptRunner.execute from one or more threads until its
+    duration elapses, recording the latency of every operation. The
+    *_async workloads run the same specs through AsyncMongoDBScriptRunner
+    with as many coroutines on one event loop, for a direct comparison
+    with their threaded counterparts. The benchmark collection is dropped
+    before and after the run.
+    """
+    
+    WORKLOADS = ('insert_many_10', 'insert_many_100', 'insert_many_1000', 'find', 'find_projection',
+                 'update_many', 'bulk_ordered', 'bulk_unordered', 'aggregate', 'find_async', 'aggregate_async')
+    
+    def __init__(self, crud: MongoDBCRUD, doc_size: int = DEFAULT_BENCH_DOC_SIZE,
+                 concurrency: int = 1, duration: float = DEFAULT_BENCH_DURATION,
+                 seed_docs: int = DEFAULT_BENCH_SEED_DOCS, async_factory=None):
+        """
+        Args:
+            crud: Connected CRUD instance whose collection is used (and dropped)
+            doc_size: Approximate BSON size of generated documents in bytes
+            concurrency: Threads (or coroutines for *_async workloads) issuing operations at once
+            duration: Seconds each workload runs
+            seed_docs: Documents loaded before the read/update workloads
+            async_factory: Callable returning an unconnected AsyncMongoDBCRUD on the same
+                           namespace; required by the *_async workloads
+        """
+        self.crud = crud
+        self.async_factory = async_factory
+        self.doc_size = doc_size
+        self.concurrency = max(1, concurrency)
+        self.duration = duration
+        self.seed_docs = seed_docs
+        self.groups = max(1, seed_docs // BENCH_GROUP_SIZE)
+        self.padding = 'x' * max(0, doc_size - 60)
+    
+    def make_document(self, number: int, seeded: bool = True) -> Dict[str, Any]:
+        """
+        Generate a document of roughly doc_size bytes
+        
+        Documents inserted by the write workloads go to group -1 so the
+        groups read by later workloads keep BENCH_GROUP_SIZE documents.
+        """
+        return {"group": number % self.groups if seeded else -1, "n": number, "created": datetime.now(),
+                "payload": self.padding}
+    
+    def make_spec(self, workload: str, rng) -> Tuple[Dict[str, Any], int]:
+        """
+        Build the next operation of a workload
+        
+        Returns:
+            (operation spec, documents it processes)
+        """
+        if workload.endswith('_async'):
+            workload = workload[:-len('_async')]
+        group = rng.randrange(self.groups)
+        if workload.startswith('insert_many_'):
+            size = int(workload.rsplit('_', 1)[1])
+            return {"op": "insert_many", "ordered": False,
+                    "documents": [self.make_document(rng.randrange(1 << 30), seeded=False)
+                                  for _ in range(size)]}, size
+        if workload == 'find':
+            return {"op": "find_many", "filter": {"group": group}}, BENCH_GROUP_SIZE
+        if workload == 'find_projection':
+            return {"op": "find_many", "filter": {"group": group},
+                    "projection": {"_id": 0, "group": 1, "n": 1}}, BENCH_GROUP_SIZE
+        if workload == 'update_many':
+            return {"op": "update_many", "filter": {"group": group}, "update": {"$inc": {"n": 1}}}, BENCH_GROUP_SIZE
+        if workload in ('bulk_ordered', 'bulk_unordered'):
+            operations = []
+            for _ in range(BENCH_BULK_SIZE // 2):
+                operations.append({"insert_one": {"document": self.make_document(rng.randrange(1 << 30),
+                                                                                  seeded=False)}})
+                # update_many rather than update_one: mongomock rejects the sort= that
+                # newer pymongo passes for UpdateOne, and --in-process must run this too
+                operations.append({"update_many": {"filter": {"n": rng.randrange(self.seed_docs)},
+                                                   "update": {"$set": {"touched": True}}}})
+            return {"op": "bulk_write", "ordered": workload == 'bulk_ordered',
+                    "operations": operations}, BENCH_BULK_SIZE
+        if workload == 'aggregate':
+            return {"op": "aggregate", "pipeline": [
+                {"$match": {"group": group}},
+                {"$group": {"_id": "$group", "total": {"$sum": "$n"}, "count": {"$sum": 1}}}]}, BENCH_GROUP_SIZE
+        raise ValueError(f"Unknown workload: {workload}")
+    
+    def seed(self):
+        """Reset the collection and load the documents read by later workloads"""
+        collection = self.crud.collection
+        collection.drop()
+        for start in range(0, self.seed_docs, DEFAULT_IMPORT_BATCH_SIZE):
+            collection.insert_many([self.make_document(number) for number in
+                                    range(start, min(start + DEFAULT_IMPORT_BATCH_SIZE, self.seed_docs))],
+                                   ordered=False)
+        collection.create_index([("group", ASCENDING)])
+        collection.create_index([("n", ASCENDING)])
+    
+    def run_workload(self, workload: str) -> Dict[str, Any]:
+        """
+        Run one workload for the configured duration
+        
+        Returns:
+            Dictionary with ops, docs, errors, ops_per_sec, docs_per_sec and
+            p50/p95/p99/max latency in milliseconds
+        """
+        import random
+        if workload.endswith('_async'):
+            return self.run_async_workload(workload)
+        runner = MongoDBScriptRunner(self.crud)
+        deadline = time.perf_counter() + self.duration
+        
+        def worker(thread_id: int) -> Tuple[List[float], int, int, Optional[str]]:
+            rng = random.Random(thread_id)
+            latencies, docs, failures, first_error = [], 0, 0, None
+            while time.perf_counter() < deadline:
+                spec, count = self.make_spec(workload, rng)
+                started = time.perf_counter()
+                try:
+                    runner.execute(spec)
+                    docs += count
+                except Exception as e:
+                    failures += 1
+                    first_error = first_error or f"{type(e).__name__}: {e}"
+                latencies.append((time.perf_counter() - started) * 1000)
+            return latencies, docs, failures, first_error
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            outcomes = list(pool.map(worker, range(self.concurrency)))
+        return self.summarize(outcomes, time.perf_counter() - started)
+    
+    def run_async_workload(self, workload: str) -> Dict[str, Any]:
+        """Run one workload on the async engine, one coroutine per unit of concurrency"""
+        import random
+        
+        async def drive() -> Tuple[List[Tuple[List[float], int, int, Optional[str]]], float]:
+            crud = self.async_factory()
+            await crud.connect()
+            runner = AsyncMongoDBScriptRunner(crud)
+            deadline = time.perf_counter() + self.duration
+            
+            async def worker(task_id: int) -> Tuple[List[float], int, int, Optional[str]]:
+                rng = random.Random(task_id)
+                latencies, docs, failures, first_error = [], 0, 0, None
+                while time.perf_counter() < deadline:
+                    spec, count = self.make_spec(workload, rng)
+                    started = time.perf_counter()
+                    try:
+                        await runner.execute(spec)
+                        docs += count
+                    except Exception as e:
+                        failures += 1
+                        first_error = first_error or f"{type(e).__name__}: {e}"
+                    latencies.append((time.perf_counter() - started) * 1000)
+                return latencies, docs, failures, first_error
+            
+            try:
+                started = time.perf_counter()
+                outcomes = await asyncio.gather(*(worker(task_id) for task_id in range(self.concurrency)))
+                return outcomes, time.perf_counter() - started
+            finally:
+                await crud.close()
+        
+        outcomes, elapsed = asyncio.run(drive())
+        return self.summarize(outcomes, elapsed)
+    
+    @staticmethod
+    def summarize(outcomes: List[Tuple[List[float], int, int, Optional[str]]], elapsed: float) -> Dict[str, Any]:
+        """
+        Combine per-worker (latencies, docs, failures, first error) into one
+        workload result; any failed operation marks the workload as failed
+        """
+        latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+        docs = sum(outcome[1] for outcome in outcomes)
+        ops = len(latencies)
+        errors_seen = sum(outcome[2] for outcome in outcomes)
+        
+        def percentile(fraction: float) -> float:
+            return round(latencies[min(ops - 1, int(fraction * ops))], 3) if ops else 0.0
+        
+        return {"ops": ops, "docs": docs, "errors": errors_seen,
+                "ops_per_sec": round(ops / elapsed, 1), "docs_per_sec": round(docs / elapsed, 1),
+                "p50_ms": percentile(0.50), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99),
+                "max_ms": round(latencies[-1], 3) if ops else 0.0, "failed": bool(errors_seen),
+                "first_error": next((outcome[3] for outcome in outcomes if outcome[3]), None)}
+    
+    def run(self, workloads: List[str]) -> Dict[str, Any]:
+        """
+        Seed the collection and run the given workloads in order
+        
+        Returns:
+            Result document with the run parameters and one entry per workload
+        """
+        unknown = [workload for workload in workloads if workload not in self.WORKLOADS]
+        if unknown:
+            raise ValueError(f"Unknown workload(s): {', '.join(unknown)} "
+                             f"(available: {', '.join(self.WORKLOADS)})")
+        if self.async_factory is None and any(workload.endswith('_async') for workload in workloads):
+            raise ValueError("The *_async workloads need a server and the async engine "
+                             "(not --in-process, pymongo>=4.9 or motor)")
+        import pymongo
+        
+        print(f"Seeding {self.seed_docs} documents of ~{self.doc_size} bytes...", file=sys.stderr)
+        self.seed()
+        results = {}
+        try:
+            for workload in workloads:
+                print(f"Running {workload} for {self.duration:g}s with {self.concurrency} thread(s)...",
+                      file=sys.stderr)
+                try:
+                    results[workload] = self.run_workload(workload)
+                except Exception as e:
+                    # e.g. the async engine failing to connect; the other workloads still run
+                    results[workload] = dict(self.summarize([], 1.0), failed=True,
+                                             first_error=f"{type(e).__name__}: {e}")
+                if results[workload]['failed']:
+                    print(f"✗ {workload}: {results[workload]['errors']} error(s), first: "
+                          f"{results[workload]['first_error']}", file=sys.stderr)
+        finally:
+            self.crud.collection.drop()
+        
+        return {"tool": os.path.basename(__file__), "pymongo": pymongo.version,
+                "server": self.crud.client.server_info().get('version'),
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "doc_size": self.doc_size, "concurrency": self.concurrency,
+                "duration": self.duration, "seed_docs": self.seed_docs, "workloads": results}
+    
+    @staticmethod
+    def print_results(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+        """
+        Print a results table, with ops/sec and p95 changes against a baseline run
+        
+        Returns:
+            Workloads whose ops/sec dropped or p95 grew by more than BENCH_REGRESSION_THRESHOLD
+        """
+        previous = (baseline or {}).get('workloads', {})
+        regressions = []
+        print(f"\nBenchmark: {report['tool']}, pymongo {report['pymongo']}, server {report['server']}, "
+              f"{report['doc_size']} B docs, {report['concurrency']} thread(s)")
+        print(f"  {'workload':<18} {'ops/sec':>10} {'docs/sec':>12} {'p50':>8} {'p95':>8} {'p99':>8} "
+              f"{'max':>8} {'errors':>7}" + (f" {'Δ ops/sec':>10} {'Δ p95':>8}" if baseline else ""))
+        for workload, result in report['workloads'].items():
+            line = (f"  {workload:<18} {result['ops_per_sec']:>10,.1f} {result['docs_per_sec']:>12,.1f} "
+                    f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                    f"{result['max_ms']:>8.2f} {result['errors']:>7}")
+            before = previous.get(workload)
+            if result.get('failed'):
+                line += "  ✗ failed"
+            elif before and before['ops_per_sec'] and before['p95_ms'] and not before.get('failed'):
+                throughput = result['ops_per_sec'] / before['ops_per_sec'] - 1
+                latency = result['p95_ms'] / before['p95_ms'] - 1
+                line += f" {throughput:>+10.1%} {latency:>+8.1%}"
+                if throughput < -BENCH_REGRESSION_THRESHOLD or latency > BENCH_REGRESSION_THRESHOLD:
+                    regressions.append(workload)
+                    line += "  ⚠"
+            print(line)
+        print("  (latencies in ms)")
+        failed = [workload for workload, result in report['workloads'].items() if result.get('failed')]
+        if failed:
+            print(f"✗ Failed (operations raised errors): {', '.join(failed)}")
+        if regressions:
+            print(f"⚠ Regressed beyond {BENCH_REGRESSION_THRESHOLD:.0%}: {', '.join(regressions)}")
+        return regressions
+
+
+def run_benchmark(args: argparse.Namespace, client_options: Dict[str, Any],
+                  metrics: Optional[CommandMetrics]) -> int:
+    """
+    Run the --bench workloads, save and compare results
+    
+    Returns:
+        Exit code: 0 on success, 1 on failed workloads or regressions against
+        --bench-compare, 2 on setup errors
+    """
+    workloads = list(MongoDBBenchmark.WORKLOADS) if args.bench == 'all' else [
+        workload.strip() for workload in args.bench.split(',') if workload.strip()]
+    async_factory = None
+    if not args.in_process and AsyncMongoClient is not None:
+        def async_factory():
+            return AsyncMongoDBCRUD(args.uri, args.db, args.bench_collection, concurrency=args.bench_threads,
+                                    client_options=client_options)
+    elif args.bench == 'all':
+        # Without an async engine 'all' means every workload that can run
+        workloads = [workload for workload in workloads if not workload.endswith('_async')]
+    baseline = None
+    if args.bench_compare:
+        try:
+            with open(args.bench_compare, encoding='utf-8') as handle:
+                baseline = json.load(handle)
+        except (OSError, ValueError) as e:
+            print(f"✗ Cannot read baseline: {e}", file=sys.stderr)
+            return 2
+    
+    if args.in_process:
+        if mongomock is None:
+            print("✗ --in-process needs mongomock (pip install mongomock)", file=sys.stderr)
+            return 2
+        manager = MongoDBConnectionManager(client_factory=mongomock.MongoClient)
+        client_options.pop('event_listeners', None)
+    else:
+        manager = MongoDBConnectionManager()
+    
+    try:
+        crud = MongoDBCRUD(args.uri, args.db, args.bench_collection, quiet=True,
+                           client_options=client_options, manager=manager)
+    except ConnectionError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 2
+    
+    try:
+        report = MongoDBBenchmark(crud, args.bench_doc_size, args.bench_threads, args.bench_duration,
+                                  args.bench_seed, async_factory).run(workloads)
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 2
+    finally:
+        manager.close_all()
+    if args.in_process:
+        report["server"] = "mongomock (in-process)"
+    
+    regressions = MongoDBBenchmark.print_results(report, baseline)
+    failed = [workload for workload, result in report['workloads'].items() if result['failed']]
+    if args.bench_out and failed:
+        print(f"✗ Not saving {args.bench_out}: failed workloads would make a misleading baseline")
+    elif args.bench_out:
+        with open(args.bench_out, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+        print(f"✓ Saved results to {args.bench_out}")
+    report_metrics(metrics, args)
+    return 1 if regressions or failed else 0
+
+
+def report_metrics(metrics: Optional[CommandMetrics], args: argparse.Namespace):
+    """Print and/or export script-mode command metrics as requested on the command line"""
+    if metrics is None:
+        return
+    if args.metrics:
+        metrics.print_summary(file=sys.stderr)
+    if args.metrics_out:
+        fmt = metrics.export(args.metrics_out)
+        print(f"✓ Wrote {fmt} metrics to {args.metrics_out}", file=sys.stderr)
+
+
 def main():
     """Main entry point"""
-    cli = MongoDBCLI()
-    cli.run()
+    parser = argparse.ArgumentParser(description="MongoDB CRUD Operations Manager")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run operations from a JSON Lines file ('-' for stdin) without prompts")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    parser.add_argument("--db", default="mydatabase", help="database name")
+    parser.add_argument("--collection", default="mycollection", help="collection name")
+    parser.add_argument("--stop-on-error", action="store_true",
+                        help="abort the script at the first failing operation")
+    parser.add_argument("--pipeline", metavar="NAME",
+                        help="run a saved aggregation pipeline without prompts and exit")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="value for a $param placeholder of --pipeline (repeatable)")
+    parser.add_argument("--pipelines", metavar="FILE", default=DEFAULT_PIPELINE_LIBRARY,
+                        help="saved pipeline library file")
+    parser.add_argument("--max-pool-size", type=int, help="maximum connections in the client pool")
+    parser.add_argument("--min-pool-size", type=int, help="connections kept open when idle")
+    parser.add_argument("--max-idle-ms", type=int, help="close pooled connections idle this long")
+    parser.add_argument("--compressors", help="wire compression, e.g. zstd,snappy,zlib")
+    parser.add_argument("--read-preference", help="e.g. primary, secondaryPreferred, nearest")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run the script on the asyncio engine with operations overlapping")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_ASYNC_CONCURRENCY,
+                        help="operations in flight at once with --async")
+    parser.add_argument("--cache", action="store_true",
+                        help="cache find_one/count_documents/distinct results in script mode")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL,
+                        help="seconds a cached read stays valid")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES >> 20,
+                        help="memory budget for cached reads in MiB")
+    parser.add_argument("--cache-watch", action="store_true",
+                        help="with --cache, also invalidate on other clients' writes via a change stream")
+    parser.add_argument("--metrics", action="store_true",
+                        help="print per-command latency/bytes/docs metrics to stderr after the script")
+    parser.add_argument("--metrics-out", metavar="FILE",
+                        help="write command metrics to FILE (.prom/.txt: Prometheus text, else JSON)")
+    parser.add_argument("--throttle-docs", type=float, default=0.0, metavar="N",
+                        help="limit every write path to N documents/sec")
+    parser.add_argument("--throttle-bytes", type=float, default=0.0, metavar="N",
+                        help="limit every write path to N payload bytes/sec")
+    parser.add_argument("--throttle-adaptive", action="store_true",
+                        help="back writes off while latency or the serverStatus lock queue rises")
+    parser.add_argument("--bench", metavar="WORKLOADS",
+                        help="run benchmark workloads ('all' or comma-separated: "
+                             + ", ".join(MongoDBBenchmark.WORKLOADS) + ") and exit")
+    parser.add_argument("--bench-duration", type=float, default=DEFAULT_BENCH_DURATION,
+                        help="seconds each benchmark workload runs")
+    parser.add_argument("--bench-doc-size", type=int, default=DEFAULT_BENCH_DOC_SIZE,
+                        help="approximate size of generated documents in bytes")
+    parser.add_argument("--bench-threads", type=int, default=1,
+                        help="threads issuing benchmark operations at once")
+    parser.add_argument("--bench-seed", type=int, default=DEFAULT_BENCH_SEED_DOCS,
+                        help="documents loaded before the read/update workloads")
+    parser.add_argument("--bench-collection", default="crud_benchmark",
+                        help="collection used (and dropped) by the benchmark")
+    parser.add_argument("--bench-out", metavar="FILE", help="save benchmark results as JSON")
+    parser.add_argument("--bench-compare", metavar="FILE",
+                        help="compare against saved results; exit 1 on regressions")
+    parser.add_argument("--in-process", action="store_true",
+                        help="benchmark against an in-process mongomock stand-in instead of --uri")
+    parser.add_argument("--bench-parse", action="store_true",
+                        help="run the parse_value micro-benchmark and exit")
+    args = parser.parse_args()
+    
+    if args.bench_parse:
+        benchmark_parse_value()
+        return
+    
+    MongoDBCRUD.pipeline_library = args.pipelines
+    MongoDBCRUD.throttle.configure(args.throttle_docs, args.throttle_bytes, args.throttle_adaptive)
+    if not args.script and not args.bench and not args.pipeline:
+        cli = MongoDBCLI()
+        cli.run()
+        return
+    
+    client_options = {}
+    for name, value in (('maxPoolSize', args.max_pool_size),
+                        ('minPoolSize', args.min_pool_size),
+                        ('maxIdleTimeMS', args.max_idle_ms),
+                        ('readPreference', args.read_preference)):
+        if value is not None:
+            client_options[name] = value
+    if args.compressors:
+        client_options['compressors'] = args.compressors
+    metrics = None
+    if args.metrics or args.metrics_out:
+        metrics = CommandMetrics()
+        client_options['event_listeners'] = (metrics,)
+    
+    if args.bench:
+        sys.exit(run_benchmark(args, client_options, metrics))
+    
+    if args.use_async and not args.pipeline:
+        unsupported = [flag for flag, value in (('--cache', args.cache), ('--cache-watch', args.cache_watch),
+                                                ('--throttle-docs', args.throttle_docs),
+                                                ('--throttle-bytes', args.throttle_bytes),
+                                                ('--throttle-adaptive', args.throttle_adaptive)) if value]
+        if unsupported:
+            print(f"✗ {', '.join(unsupported)} not supported with --async", file=sys.stderr)
+            sys.exit(2)
+        try:
+            failures = asyncio.run(run_async_script(args, client_options))
+        except (ConnectionError, RuntimeError) as e:
+            print(f"✗ {e}", file=sys.stderr)
+            sys.exit(2)
+        report_metrics(metrics, args)
+        sys.exit(1 if failures else 0)
+    
+    try:
+        crud = MongoDBCRUD(args.uri, args.db, args.collection, quiet=True,
+                           client_options=client_options)
+    except ConnectionError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(2)
+    
+    if args.cache:
+        crud.enable_cache(ttl=args.cache_ttl, max_bytes=args.cache_mb << 20)
+        if args.cache_watch:
+            crud.start_cache_watcher()
+    
+    runner = MongoDBScriptRunner(crud, stop_on_error=args.stop_on_error)
+    try:
+        if args.pipeline:
+            params = {}
+            for item in args.param:
+                name, _, value = item.partition('=')
+                params[name.strip()] = MongoDBCRUD.parse_value(value.strip())
+            failures = runner.run([json_util.dumps({"op": "run_pipeline", "name": args.pipeline,
+                                                    "params": params})])
+        elif args.script == '-':
+            failures = runner.run(sys.stdin)
+        else:
+            with open(args.script, encoding='utf-8') as script:
+                failures = runner.run(script)
+    finally:
+        crud.stop_cache_watcher()
+        crud.close()
+    report_metrics(metrics, args)
+    if crud.throttle.active:
+        print(f"Write throttle: {json.dumps(crud.throttle.summary())}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+"""Smoke test: every benchmark workload runs cleanly against the in-process stand-in"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "MongoDB-CRUD(20251123).py")
+
+try:
+    import mongomock  # noqa: F401
+except ImportError:
+    mongomock = None
+
+
+@unittest.skipIf(mongomock is None, "mongomock is not installed")
+class InProcessBenchmarkTest(unittest.TestCase):
+    def test_all_workloads_pass_and_save_a_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            completed = subprocess.run(
+                [sys.executable, SCRIPT, "--bench", "all", "--in-process", "--bench-duration", "0.1",
+                 "--bench-seed", "200", "--bench-out", baseline],
+                cwd=directory, capture_output=True, text=True, timeout=600)
+            self.assertEqual(completed.returncode, 0, completed.stdout + completed.stderr)
+            with open(baseline, encoding="utf-8") as handle:
+                report = json.load(handle)
+        self.assertIn("bulk_ordered", report["workloads"])
+        self.assertIn("bulk_unordered", report["workloads"])
+        for name, result in report["workloads"].items():
+            self.assertFalse(result["failed"], f"{name}: {result['first_error']}")
+            self.assertEqual(result["errors"], 0, name)
+
+
+if __name__ == "__main__":
+    unittest.main()